@@ -1 +1,163 @@
 // App initialization code goes here
+
+// Completion of the annotation search fields, from the cards.complete endpoint
+document.querySelectorAll('input[data-complete-url]:not([data-complete-url=""])').forEach((input) => {
+  const datalist = document.createElement('datalist');
+  datalist.id = `${input.id}-completions`;
+  input.setAttribute('list', datalist.id);
+  input.setAttribute('autocomplete', 'off');
+  input.after(datalist);
+
+  let controller = null;
+  input.addEventListener('input', () => {
+    if (controller) {
+      controller.abort();
+    }
+    if (input.value.trim().length < 2) {
+      return;
+    }
+    controller = new AbortController();
+    const url = `${input.dataset.completeUrl}?q=${encodeURIComponent(input.value)}`;
+    fetch(url, { signal: controller.signal, credentials: 'same-origin' })
+      .then((response) => (response.ok ? response.json() : { completions: [] }))
+      .then((data) => {
+        datalist.replaceChildren(...data.completions.map((completion) => {
+          const option = document.createElement('option');
+          option.value = completion.label;
+          return option;
+        }));
+      })
+      .catch(() => {});
+  });
+});
+
+// Infinite scroll of the cards listings, from the cards.cards_page endpoint
+if ('IntersectionObserver' in window) {
+  const cardsObserver = new IntersectionObserver((entries) => {
+    entries.filter((entry) => entry.isIntersecting).forEach((entry) => {
+      const more = entry.target;
+      cardsObserver.unobserve(more);
+      fetch(more.dataset.nextUrl, { credentials: 'same-origin' })
+        .then((response) => {
+          if (!response.ok) {
+            throw new Error(response.statusText);
+          }
+          return response.text();
+        })
+        .then((html) => {
+          const listing = more.parentElement;
+          more.remove();
+          listing.insertAdjacentHTML('beforeend', html);
+          listing.querySelectorAll('.cards-more').forEach((next) => cardsObserver.observe(next));
+        })
+        // the "More cards" link is left as a fallback
+        .catch(() => {});
+    });
+  }, { rootMargin: '400px' });
+  document.querySelectorAll('.cards-more').forEach((more) => cardsObserver.observe(more));
+}
+
+// Options of the annotation selects, loaded from the cards.options endpoint
+// when the select is first focused. The last option loads the next page.
+const loadOptions = (select, url) => {
+  fetch(url, { credentials: 'same-origin' })
+    .then((response) => (response.ok ? response.json() : { options: [], next: null }))
+    .then((data) => {
+      const more = select.querySelector('option[data-next-url]');
+      if (more) {
+        more.remove();
+      }
+      const present = new Set(Array.from(select.options).map((option) => option.value));
+      data.options
+        .filter((option) => !present.has(String(option.id)))
+        .forEach((option) => select.add(new Option(option.label, option.id)));
+      if (data.next) {
+        const next = new Option('More...', '');
+        next.dataset.nextUrl = data.next;
+        select.add(next);
+      }
+    })
+    .catch(() => {});
+};
+
+document.querySelectorAll('select[data-options-url]').forEach((select) => {
+  let { value } = select;
+  select.addEventListener('focus', () => {
+    if (!select.dataset.loaded) {
+      select.dataset.loaded = 'true';
+      loadOptions(select, select.dataset.optionsUrl);
+    }
+  });
+  select.addEventListener('change', () => {
+    const option = select.options[select.selectedIndex];
+    if (option && option.dataset.nextUrl) {
+      select.value = value;
+      loadOptions(select, option.dataset.nextUrl);
+    } else {
+      ({ value } = select);
+    }
+  });
+});
+
+// Bioportal suggestions of the annotation search fields, streamed from the
+// cards.stream_suggestions endpoint: the choices of each ontology are shown as
+// soon as it answers. The form search is the fallback, e.g. when nothing is found.
+const streamLines = (response, onLine) => {
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = '';
+  const read = () => reader.read().then(({ done, value }) => {
+    buffer += decoder.decode(value || new Uint8Array(), { stream: !done });
+    const lines = buffer.split('\n');
+    buffer = lines.pop();
+    lines.filter((line) => line.trim()).forEach((line) => onLine(JSON.parse(line)));
+    return done ? null : read();
+  });
+  return read();
+};
+
+document.querySelectorAll('input[data-suggestions-url]').forEach((input) => {
+  const button = input.form && input.form.querySelector(`button[data-search-for="${input.id}"]`);
+  if (!button || !window.ReadableStream || !window.TextDecoder) {
+    return;
+  }
+  const search = (event) => {
+    const term = input.value.trim();
+    if (!term) {
+      return;
+    }
+    event.preventDefault();
+    button.removeEventListener('click', search);
+    const select = document.createElement('select');
+    select.name = input.name.replace(/search$/, 'select_new');
+    select.className = 'form-select';
+    const status = new Option('Searching...', '');
+    select.add(status);
+    input.replaceWith(select);
+    button.title = 'add term';
+
+    const url = new URL(input.dataset.suggestionsUrl, window.location.href);
+    url.searchParams.set('search_term', term);
+    fetch(url, { credentials: 'same-origin' })
+      .then((response) => {
+        if (!response.ok) {
+          throw new Error(response.statusText);
+        }
+        return streamLines(response, (data) => {
+          data.choices.forEach(([termId, label]) => select.add(new Option(label, termId)));
+        });
+      })
+      .then(() => {
+        if (select.options.length === 1) {
+          throw new Error('No suggestions');
+        }
+        status.remove();
+      })
+      .catch(() => {
+        select.replaceWith(input);
+        button.title = 'search';
+        button.click();
+      });
+  };
+  button.addEventListener('click', search);
+});
@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+"""Throughput of concurrent password checks, inline and in the hashing pool
+
+Runs concurrent logins as greenlets, as in the gevent workers of
+gunicorn, each checking a bcrypt password hash. A ticker greenlet
+measures how long the other greenlets of the process are held: with
+inline hashing, every check holds the whole process.
+
+Usage::
+
+    python benchmarks/logins.py --logins 64 --concurrency 16 --rounds 13
+"""
+from gevent import monkey
+
+monkey.patch_all()
+
+import argparse  # noqa: E402
+import time  # noqa: E402
+
+import gevent  # noqa: E402
+from flask_bcrypt import Bcrypt  # noqa: E402
+
+from cataloger.passwords import PasswordHasher  # noqa: E402
+
+
+def ticker(stalls, interval=0.01):
+    """Records how late each tick of interval seconds is"""
+    while True:
+        start = time.perf_counter()
+        gevent.sleep(interval)
+        stalls.append(time.perf_counter() - start - interval)
+
+
+def measure(hasher, pw_hash, logins, concurrency):
+    """The logins per second, and the longest stall of the other greenlets"""
+    stalls = []
+    tick = gevent.spawn(ticker, stalls)
+    gevent.sleep(0.05)
+    pending = iter(range(logins))
+
+    def login():
+        for _ in pending:
+            assert hasher.check(pw_hash, "myprecious")
+
+    start = time.perf_counter()
+    gevent.joinall([gevent.spawn(login) for _ in range(concurrency)])
+    duration = time.perf_counter() - start
+    # let the ticker record the last stall
+    gevent.sleep(0.05)
+    tick.kill()
+    return logins / duration, max(stalls, default=0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--logins", type=int, default=64)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--rounds", type=int, default=13, help="bcrypt log rounds")
+    parser.add_argument("--workers", type=int, default=2, help="hashing threads")
+    args = parser.parse_args()
+
+    bcrypt = Bcrypt()
+    bcrypt._log_rounds = args.rounds
+    pw_hash = bcrypt.generate_password_hash("myprecious")
+
+    print(f"\n{'hashing':<20}{'logins/s':>10}{'max stall (ms)':>16}")
+    for name, workers in (("inline", 0), (f"{args.workers} threads", args.workers)):
+        hasher = PasswordHasher(bcrypt, workers=workers)
+        rate, stall = measure(hasher, pw_hash, args.logins, args.concurrency)
+        hasher.close()
+        print(f"{name:<20}{rate:>10.1f}{stall * 1000:>16.1f}")
+
+
+if __name__ == "__main__":
+    main()
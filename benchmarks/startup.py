@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+"""Wall time and imported modules of the app startup
+
+Starts fresh interpreters that import the app factory and call
+``create_app()``, as each gunicorn worker, ``flask`` command and test
+run does, and reports the median time and the number of modules
+imported. With ``--imports``, the slowest imports of a last run are
+listed, from ``python -X importtime``.
+
+Usage::
+
+    python benchmarks/startup.py --repeat 10 --imports 15
+    AUTH_METHOD=OMERO python benchmarks/startup.py
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+
+snippet = """
+import json, sys, time
+start = time.perf_counter()
+before = len(sys.modules)
+from cataloger.app import create_app
+imported = time.perf_counter()
+create_app()
+created = time.perf_counter()
+print(json.dumps({
+    "import": imported - start,
+    "create_app": created - imported,
+    "modules": len(sys.modules) - before,
+}))
+"""
+
+
+def child_env():
+    env = dict(os.environ)
+    env.setdefault("DATABASE_URL", "sqlite://")
+    env.setdefault("SECRET_KEY", "benchmark")
+    env.setdefault("SEND_FILE_MAX_AGE_DEFAULT", "0")
+    env["PYTHONPATH"] = os.pathsep.join(
+        filter(None, [os.path.abspath(ROOT), env.get("PYTHONPATH")])
+    )
+    return env
+
+
+def run_once(env):
+    """The timings of a startup in a new interpreter"""
+    out = subprocess.run(
+        [sys.executable, "-c", snippet],
+        env=env,
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def slowest_imports(env, count):
+    """The (cumulative µs, package) of the slowest imported packages"""
+    err = subprocess.run(
+        [
+            sys.executable,
+            "-X",
+            "importtime",
+            "-c",
+            "from cataloger.app import create_app",
+        ],
+        env=env,
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stderr
+    prefix = len("import time:")
+    imports = []
+    for line in err.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[prefix:].split("|")
+        name = name.strip()
+        # the packages, rather than each of their modules
+        if "." not in name and not name.startswith("_"):
+            imports.append((int(cumulative), name))
+    return sorted(imports, reverse=True)[:count]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--imports", type=int, default=0, help="slowest imports")
+    args = parser.parse_args()
+
+    env = child_env()
+    runs = [run_once(env) for _ in range(args.repeat)]
+    print(f"AUTH_METHOD={env.get('AUTH_METHOD', 'LOCAL')}, {args.repeat} runs")
+    print(f"\n{'step':<20}{'median (ms)':>12}{'max (ms)':>10}")
+    for step in ("import", "create_app"):
+        times = [run[step] * 1000 for run in runs]
+        print(f"{step:<20}{statistics.median(times):>12.1f}{max(times):>10.1f}")
+    print(f"{'modules imported':<20}{runs[-1]['modules']:>12}")
+
+    if args.imports:
+        print(f"\n{'import':<40}{'cumulative (ms)':>16}")
+        for cumulative, name in slowest_imports(env, args.imports):
+            print(f"{name:<40}{cumulative / 1000:>16.1f}")
+
+
+if __name__ == "__main__":
+    main()
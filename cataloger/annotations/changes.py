@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+"""Feeds of the changed cards and annotations, for incremental sync
+
+Each feed lists the records of a kind in the order of their last change,
+by (updated_at, id), and is read page by page with the cursor of the
+last record read. Clients keep the last cursor, and ask for the changes
+since then.
+
+The time of a change is set when the record is flushed, before its
+transaction is committed, so a slow transaction can commit changes
+older than the ones already read. Records changed less than
+``CHANGES_LAG`` seconds ago are left for the next requests, and once
+a feed is read to its end, its cursor is moved ``CHANGES_WINDOW``
+seconds back, so that the next requests read the last changes again.
+Clients skip the records whose (id, version) they already have, or
+the deletions whose id they already have.
+
+Deleted records are listed in the "deletions" feed.
+"""
+import datetime as dt
+
+from flask import current_app
+
+from cataloger.annotations.models import (
+    Card,
+    Deletion,
+    Gene,
+    GeneMod,
+    Marker,
+    Method,
+    Organism,
+    Process,
+    Project,
+    Sample,
+)
+from cataloger.database import parse_cursor
+
+# the model and the change time column of each feed
+feeds = {
+    "cards": (Card, Card.updated_at),
+    "deletions": (Deletion, Deletion.deleted_at),
+}
+feeds.update(
+    (kls.__tablename__, (kls, kls.updated_at))
+    for kls in (Project, Organism, Process, Sample, Method, Marker, Gene, GeneMod)
+)
+
+
+def changes(kind, group_id, since=None, limit=100, lag=None, window=None):
+    """The records of a feed changed since a cursor
+
+    Args:
+        kind (str): the feed, one of `feeds`
+        group_id (int): the group of the records
+        since (str): the cursor of the last record read, if any
+        limit (int): maximum number of records
+        lag (int): seconds during which changes are not listed,
+            ``CHANGES_LAG`` by default
+        window (int): seconds of changes read again after the end of
+            the feed, ``CHANGES_WINDOW`` by default
+
+    Returns:
+        the records, the cursor of the last one (since if there is
+        none), and whether there are more
+
+    Raises:
+        KeyError: if kind is unknown
+        ValueError: if the cursor is invalid, or group_id is None
+    """
+    kls, column = feeds[kind]
+    if group_id is None:
+        raise ValueError("No group to list the changes of")
+    if lag is None:
+        lag = current_app.config.get("CHANGES_LAG", 5)
+    if window is None:
+        window = current_app.config.get("CHANGES_WINDOW", 300)
+    query = kls.query.filter(
+        kls.group_id == group_id,
+        column <= dt.datetime.utcnow() - dt.timedelta(seconds=lag),
+    )
+    if since:
+        at, record_id = parse_cursor(since)
+        query = query.filter((column > at) | ((column == at) & (kls.id > record_id)))
+    records = query.order_by(column, kls.id).limit(limit + 1).all()
+    more = len(records) > limit
+    records = records[:limit]
+    cursor = records[-1].change_cursor if records else since
+    if records and window and not more:
+        # the changes committed late are found by the next requests
+        at = getattr(records[-1], column.key) - dt.timedelta(seconds=window)
+        cursor = f"{at.isoformat()}_0"
+    return records, cursor, more
+
+
+def as_json(record):
+    """The JSON serializable contents of a changed record"""
+    if isinstance(record, Card):
+        data = record.as_dict(accessed=False)
+        data.update(
+            id=record.id,
+            created=record.created_at,
+            version=record.version,
+            updated=record.updated_at,
+        )
+    else:
+        data = {
+            column.key: getattr(record, column.key)
+            for column in record.__table__.columns
+        }
+    return {
+        key: value.isoformat() if isinstance(value, dt.datetime) else value
+        for key, value in data.items()
+    }
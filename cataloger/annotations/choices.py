@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+"""Cached choices of the card forms
+
+The (id, label) pairs of the annotations and tags of a group rarely
+change, so they are kept in the shared ``flask_caching`` backend instead
+of being queried again each time a card form is built. The choices of
+the groups with new, renamed, moved or deleted annotations or tags are
+invalidated once committed.
+"""
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from cataloger.database import db
+from cataloger.extensions import cache
+
+
+class Choices:
+    """Per group and per class cache of (id, label) pairs
+
+    Pairs are sorted by label then id, and expire after ``timeout``
+    seconds, in case a writer did not invalidate them.
+
+    Args:
+        backend (flask_caching.Cache): the shared cache
+        timeout (int): time to live of the choices in seconds
+    """
+
+    prefix = "choices/"
+
+    def __init__(self, backend=None, timeout=3600):
+        self.backend = backend
+        self.timeout = timeout
+
+    def init_app(self, app):
+        """Reads the cache settings from the app configuration"""
+        self.timeout = app.config.get("CHOICES_TIMEOUT", self.timeout)
+
+    def key(self, kls, group_id):
+        return f"{self.prefix}{kls.__tablename__}/{group_id}"
+
+    def get(self, kls, group_id):
+        """The sorted (id, label) pairs of the kls instances of a group"""
+        key = self.key(kls, group_id)
+        pairs = self.backend.get(key)
+        if pairs is None:
+            query = db.session.query(kls.id, kls.label).filter_by(group_id=group_id)
+            pairs = sorted(
+                ((id_, label) for id_, label in query), key=lambda p: (p[1], p[0])
+            )
+            self.backend.set(key, pairs, timeout=self.timeout)
+        return pairs
+
+    def labels(self, kls, group_id):
+        """The {id: label} mapping of the kls instances of a group"""
+        return dict(self.get(kls, group_id))
+
+    def invalidate(self, kls, group_id):
+        """Forgets the choices of kls for a group, after a write"""
+        self.backend.delete(self.key(kls, group_id))
+
+    def invalidate_on_commit(self, session, kls, group_id):
+        """Forgets the choices of kls for a group once session is committed
+
+        For the rows written without the ORM, e.g. bulk inserts.
+        """
+        session.info.setdefault("choices", set()).add(self.key(kls, group_id))
+
+
+choices = Choices(cache)
+
+
+def _has_choices(instance):
+    return hasattr(instance, "label") and hasattr(instance, "group_id")
+
+
+def _changed_groups(instance, deleted):
+    """The groups whose choices include instance, if it changed"""
+    if not _has_choices(instance):
+        return set()
+    groups = {instance.group_id}
+    if deleted:
+        return groups
+    attrs = inspect(instance).attrs
+    changed = attrs.label.history.has_changes()
+    if attrs.group_id.history.has_changes():
+        changed = True
+        groups.update(attrs.group_id.history.deleted)
+    # before the flush, group_id is not yet set from a new group
+    if "group" in attrs.keys() and attrs.group.history.has_changes():
+        changed = True
+        groups.update(group.id for group in attrs.group.history.added if group)
+    return groups - {None} if changed else set()
+
+
+@event.listens_for(Session, "before_flush")
+def _collect_choices(session, flush_context, instances):
+    keys = {
+        choices.key(type(instance), group_id)
+        for instances_, deleted in ((session.dirty, False), (session.deleted, True))
+        for instance in instances_
+        for group_id in _changed_groups(instance, deleted)
+    }
+    if keys:
+        session.info.setdefault("choices", set()).update(keys)
+
+
+# new instances are collected once flushed, when their group_id is set and
+# the tags of the new cards are created
+@event.listens_for(Session, "after_flush")
+def _collect_new_choices(session, flush_context):
+    keys = {
+        choices.key(type(instance), instance.group_id)
+        for instance in session.new
+        if _has_choices(instance) and instance.group_id is not None
+    }
+    if keys:
+        session.info.setdefault("choices", set()).update(keys)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_choices(session):
+    # delete_many stops at the first key that is not cached
+    for key in session.info.pop("choices", ()):
+        choices.backend.delete(key)
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_choices(session):
+    session.info.pop("choices", None)
@@ -0,0 +1,201 @@
+# -*- coding: utf-8 -*-
+"""In memory completion of annotation terms
+
+Labels are kept sorted for prefix lookups, and indexed by trigrams to
+also match misspelled or partial words.
+"""
+import bisect
+import threading
+import time
+from collections import Counter, defaultdict
+
+from cataloger.annotations.terms import normalize
+from cataloger.database import db
+
+
+def trigrams(text):
+    """The set of three characters sequences of a normalized text"""
+    padded = f"  {text} "
+    return {"".join(chars) for chars in zip(padded, padded[1:], padded[2:])}
+
+
+class TermIndex:
+    """Prefix and trigram index over a set of labels
+
+    Args:
+        maxsize (int): if set, the oldest labels are dropped when
+            more than maxsize labels are indexed
+        min_similarity (float): minimum trigram similarity of the
+            fuzzy matches
+    """
+
+    def __init__(self, maxsize=None, min_similarity=0.5):
+        self.maxsize = maxsize
+        self.min_similarity = min_similarity
+        self._entries = {}
+        self._sorted = []
+        self._trigrams = defaultdict(set)
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def add(self, key, label, **data):
+        """Indexes label, data is returned along with the label in searches"""
+        norm = normalize(label)
+        with self._lock:
+            self.discard(key)
+            self._entries[key] = (label, norm, data)
+            bisect.insort(self._sorted, (norm, key))
+            for trigram in trigrams(norm):
+                self._trigrams[trigram].add(key)
+            if self.maxsize and len(self._entries) > self.maxsize:
+                self.discard(next(iter(self._entries)))
+
+    def discard(self, key):
+        """Removes key from the index, if present"""
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is None:
+                return
+            _, norm, _ = entry
+            i = bisect.bisect_left(self._sorted, (norm, key))
+            if i < len(self._sorted) and self._sorted[i] == (norm, key):
+                del self._sorted[i]
+            for trigram in trigrams(norm):
+                keys = self._trigrams[trigram]
+                keys.discard(key)
+                if not keys:
+                    del self._trigrams[trigram]
+
+    def search(self, text, limit=10):
+        """Ranked completions of text
+
+        Labels starting with text come first, shortest first, then labels
+        sharing trigrams with text, most similar first.
+
+        Returns:
+            a list of dictionaries with "id" and "label" keys, plus
+            the data given when the labels were added
+        """
+        norm = normalize(text)
+        if not norm:
+            return []
+        with self._lock:
+            ranks = self._prefix_ranks(norm, limit)
+            if len(ranks) < limit and len(norm) > 2:
+                ranks.update(self._similarity_ranks(norm, exclude=ranks))
+            best = sorted(ranks, key=ranks.get)[:limit]
+            return [self._result(key) for key in best]
+
+    def _prefix_ranks(self, norm, limit):
+        # looking further than limit, so the shortest labels can be picked
+        ranks = {}
+        i = bisect.bisect_left(self._sorted, (norm,))
+        while i < len(self._sorted) and len(ranks) < 10 * limit:
+            label, key = self._sorted[i]
+            if not label.startswith(norm):
+                break
+            ranks[key] = (0, len(label), label)
+            i += 1
+        return ranks
+
+    def _similarity_ranks(self, norm, exclude):
+        query = trigrams(norm)
+        counts = Counter()
+        for trigram in query:
+            counts.update(self._trigrams.get(trigram, ()))
+        ranks = {}
+        for key, count in counts.items():
+            if key in exclude:
+                continue
+            # the share of the text trigrams found in the label
+            similarity = count / len(query)
+            if similarity >= self.min_similarity:
+                label = self._entries[key][1]
+                ranks[key] = (1, -similarity, len(label), label)
+        return ranks
+
+    def _result(self, key):
+        label, _, data = self._entries[key]
+        result = {"id": key, "label": label}
+        result.update(data)
+        return result
+
+
+class Completions:
+    """Completion indices of the annotation labels of each group
+
+    The labels of an annotation class are loaded from the database at
+    first use, then kept up to date by `add_annotation`. As annotations
+    can be created by other workers, indices are reloaded after ``ttl``
+    seconds.
+
+    Ontology terms found by searches are also indexed per annotation
+    class, up to ``max_terms`` terms.
+    """
+
+    def __init__(self, ttl=300, max_terms=10000):
+        self.ttl = ttl
+        self.max_terms = max_terms
+        self._indices = {}
+        self._terms = {}
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.ttl = app.config.get("COMPLETION_TTL", self.ttl)
+        self.max_terms = app.config.get("COMPLETION_MAX_TERMS", self.max_terms)
+        self.clear()
+
+    def clear(self):
+        with self._lock:
+            self._indices = {}
+            self._terms = {}
+
+    def index(self, kls, group_id):
+        """The index of the kls labels for a group"""
+        key = (kls.__tablename__, group_id)
+        entry = self._indices.get(key)
+        if entry is not None and time.monotonic() - entry[0] < self.ttl:
+            return entry[1]
+
+        index = TermIndex()
+        labels = db.session.query(kls.id, kls.label).filter_by(group_id=group_id)
+        for id_, label in labels:
+            index.add(id_, label, source="local")
+        with self._lock:
+            self._indices[key] = (time.monotonic(), index)
+        return index
+
+    def terms(self, kls):
+        """The index of the ontology terms found for kls"""
+        with self._lock:
+            if kls.__tablename__ not in self._terms:
+                self._terms[kls.__tablename__] = TermIndex(maxsize=self.max_terms)
+            return self._terms[kls.__tablename__]
+
+    def add_annotation(self, annotation):
+        """Adds a newly created annotation to its group index, if loaded"""
+        entry = self._indices.get((annotation.__tablename__, annotation.group_id))
+        if entry is not None:
+            entry[1].add(annotation.id, annotation.label, source="local")
+
+    def add_terms(self, kls, suggestions):
+        """Adds bioportal search results to the kls terms index"""
+        index = self.terms(kls)
+        for term_id, term in suggestions.items():
+            ontology = term.get("links", {}).get("ontology", "").split("/")[-1]
+            index.add(term_id, term["prefLabel"], source="ontology", ontology=ontology)
+
+    def complete(self, kls, group_id, text, limit=10):
+        """Completions of text, the group annotations first"""
+        found = self.index(kls, group_id).search(text, limit)
+        if len(found) < limit:
+            labels = {result["label"] for result in found}
+            for result in self.terms(kls).search(text, limit):
+                if result["label"] not in labels:
+                    found.append(result)
+        return found[:limit]
+
+
+completions = Completions()
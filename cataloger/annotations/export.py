@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+"""Bulk export of cards
+
+Cards are written one at a time to a zip or tar archive, and the archive
+is produced as a stream of chunks, so exports of any size can be served
+or saved without temporary files and with a constant memory use.
+"""
+import calendar
+import io
+import re
+import tarfile
+import zipfile
+
+from cataloger.annotations.models import Card, Project, Tag
+
+# extension and writer of each card format
+formats = {
+    "toml": ("toml", lambda card: "# omero annotation file\n" + card.as_toml()),
+    "csv": ("csv", Card.as_csv),
+    "markdown": ("md", Card.as_markdown),
+}
+
+archives = {
+    "zip": "application/zip",
+    "tar": "application/gzip",
+}
+
+
+def select_cards(
+    user=None,
+    group=None,
+    project=None,
+    tag=None,
+    since=None,
+    until=None,
+    group_id=None,
+):
+    """Query of the cards matching all the given filters
+
+    Args:
+        user (str): the username of the cards owner
+        group (str): the name of the cards group
+        project (str): the label of the cards project
+        tag (str): a tag of the cards comment, with or without "#"
+        since (datetime): earliest creation date
+        until (datetime): latest creation date
+        group_id (int): the id of the cards group
+    """
+    criterion = []
+    if group_id is not None:
+        criterion.append(Card.group_id == group_id)
+    if user:
+        criterion.append(Card.user.has(username=user))
+    if group:
+        criterion.append(Card.group.has(groupname=group))
+    if project:
+        criterion.append(Card.project.has(Project.label == project))
+    if tag:
+        criterion.append(Card.hashtags.any(Tag.label == tag.lstrip("#")))
+    if since:
+        criterion.append(Card.created_at >= since)
+    if until:
+        criterion.append(Card.created_at <= until)
+    return Card.listing(*criterion)
+
+
+def iter_cards(query, batch_size=500):
+    """Iterates over the cards of query, batch_size cards at a time
+
+    Cards of the previous batches are no longer referenced, and are
+    released by the session.
+    """
+    cursor = None
+    while True:
+        cards, cursor = Card.page(query, after=cursor, per_page=batch_size)
+        yield from cards
+        if cursor is None:
+            return
+
+
+def card_name(card, fmt):
+    """The file name of a card in an archive"""
+    slug = re.sub(r"[^\w.-]+", "_", card.title).strip("_") or "card"
+    return f"{card.id}_{slug}.{formats[fmt][0]}"
+
+
+class _Chunks(io.RawIOBase):
+    """A write only, non seekable file, emptied by `pop`"""
+
+    def __init__(self):
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def pop(self):
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def iter_archive(cards, archive="zip", fmt="toml"):
+    """Yields the bytes of an archive of the cards, one card at a time
+
+    Args:
+        cards: an iterable of cards, e.g. from `iter_cards`
+        archive (str): "zip", or "tar" for a gzipped tarball
+        fmt (str): the format of the cards, one of `formats`
+    """
+    if archive not in archives:
+        raise ValueError(f"Unknown archive format {archive}")
+    if fmt not in formats:
+        raise ValueError(f"Unknown card format {fmt}")
+    write = formats[fmt][1]
+    out = _Chunks()
+
+    if archive == "zip":
+        with zipfile.ZipFile(out, mode="w", compression=zipfile.ZIP_DEFLATED) as zf:
+            for card in cards:
+                info = zipfile.ZipInfo(
+                    card_name(card, fmt), card.created_at.timetuple()[:6]
+                )
+                info.compress_type = zipfile.ZIP_DEFLATED
+                zf.writestr(info, write(card))
+                yield out.pop()
+    else:
+        with tarfile.open(fileobj=out, mode="w|gz") as tf:
+            for card in cards:
+                data = write(card).encode("utf-8")
+                info = tarfile.TarInfo(card_name(card, fmt))
+                info.size = len(data)
+                info.mtime = calendar.timegm(card.created_at.timetuple())
+                tf.addfile(info, io.BytesIO(data))
+                yield out.pop()
+    yield out.pop()
@@ -1,4 +1,5 @@
 import logging
+from collections import defaultdict
 
 
 from flask_wtf import FlaskForm
@@ -9,6 +10,7 @@ from wtforms import (
     FieldList,
     FormField,
     TextAreaField,
+    MultipleFileField,
 )
 from wtforms.widgets import TextArea
 from wtforms.validators import DataRequired, Length
@@ -22,9 +24,11 @@ from cataloger.annotations.models import (
     Gene,
     Method,
     Project,
-    get_gene_mod,
+    get_gene_mods,
     Tag,
 )
+from cataloger.annotations.choices import choices
+from cataloger.database import db
 
 log = logging.getLogger(__name__)
 
@@ -66,6 +70,8 @@ class AnnotationForm(FlaskForm):
             "style": "text-overflow: ellipsis; width: 100% !important",
         },
         coerce=int,
+        # the other options are loaded by the browser
+        validate_choice=False,
     )
     add = SubmitField("+", render_kw={"class": "btn btn-light"})
     new = StringField("Enter new term")
@@ -87,16 +93,10 @@ class AnnotationFields(FormField):
 
     @property
     def choices(self):
-        log.debug(
-            "Accessing choices property for AnnotationField of %s", self.kls.__name__
-        )
         return self.select.choices
 
     @choices.setter
     def choices(self, choices):
-        log.debug(
-            "Setting choices property  for AnnotationField of %s", self.kls.__name__
-        )
         self.select.choices = choices
 
     @property
@@ -116,12 +116,8 @@ class GeneModForm(FlaskForm):
 
         super().__init__(*args, **kwargs)
 
-        self.select_marker.choices = [(0, "-")] + [
-            (p.id, p.label) for p in Marker.query.all()
-        ]
-        self.select_gene.choices = [(0, "-")] + [
-            (p.id, p.label) for p in Gene.query.all()
-        ]
+        self.select_marker.choices = [(0, "-")]
+        self.select_gene.choices = [(0, "-")]
 
 
 class NewCardForm(FlaskForm):
@@ -152,7 +148,8 @@ class NewCardForm(FlaskForm):
             "samples": self.select_sample,
             "methods": self.select_method,
         }
-        self._tags = (tag.label for tag in Tag.query.all())
+        # set by update_choices
+        self._tags = ()
 
     @property
     def tags(self):
@@ -166,25 +163,48 @@ class NewCardForm(FlaskForm):
             )
         return self._selectors
 
-    def update_choices(self, **filter_by_kwargs):
-        self._tags = (tag.label for tag in Tag.query.filter_by(**filter_by_kwargs))
+    def update_choices(self, group_id=None):
+        """Sets the choices of the selectors to their current value
 
-        for selector in self.selectors.values():
-            selector.choices = [(0, "-")] + [
-                (instance.id, instance.label)
-                for instance in selector.kls.query.filter_by(**filter_by_kwargs)
-            ]
+        The other annotations are fetched by the browser from the
+        cards.options endpoint, so the form size does not depend
+        on the number of annotations. Labels are looked up in the
+        cached choices of the group.
+        """
+        self._tags = (label for _, label in choices.get(Tag, group_id))
 
-    def create_card(self, current_user):
+        selected = defaultdict(set)
+        for selector in self.selectors.values():
+            if selector.data:
+                selected[selector.kls].add(selector.data)
+        labels = {}
+        for kls, ids in selected.items():
+            known = choices.labels(kls, group_id)
+            labels[kls] = {id_: known[id_] for id_ in ids if id_ in known}
+            # e.g. annotations of another group in a cloned card
+            missing = ids - labels[kls].keys()
+            if missing:
+                labels[kls].update(
+                    db.session.query(kls.id, kls.label).filter(kls.id.in_(missing))
+                )
 
-        gene_mods = []
-        for entry in self.select_gene_mods.entries:
+        for selector in self.selectors.values():
+            selector.choices = [(0, "-")]
+            label = labels.get(selector.kls, {}).get(selector.data)
+            if label is not None:
+                selector.choices.insert(0, (selector.data, label))
+
+    def gene_mods(self):
+        """The gene mods of the channels, created with the card"""
+        pairs = [
+            (entry.select_gene.data, entry.select_marker.data)
+            for entry in self.select_gene_mods.entries
+        ]
+        return [gm for gm in get_gene_mods(pairs, commit=False) if gm]
 
-            gm = get_gene_mod(entry.select_gene.data, entry.select_marker.data)
-            if gm:
-                gene_mods.append(gm)
+    def create_card(self, current_user):
 
-        gene_mods = [gm for gm in gene_mods if gm]
+        gene_mods = self.gene_mods()
         title = self.title.data if self.title.data else "Card"
         organism_id = self.select_organism.data if self.select_organism.data else None
         sample_id = self.select_sample.data if self.select_sample.data else None
@@ -218,11 +238,7 @@ class EditCardForm(NewCardForm):
         if card_id is None:
             card_id = self.card_id
         card = Card.query.filter_by(id=card_id).first()
-        gene_mods = []
-        for entry in self.select_gene_mods.entries:
-            gm = get_gene_mod(entry.select_gene.data, entry.select_marker.data)
-            if gm and gm.label:
-                gene_mods.append(gm)
+        gene_mods = self.gene_mods()
 
         organism_id = self.select_organism.data if self.select_organism.data else None
         sample_id = self.select_sample.data if self.select_sample.data else None
@@ -239,11 +255,6 @@ class EditCardForm(NewCardForm):
         )
         card.save()
         log.info("saved card %d", card.id)
-        existing_tags = {t.label for t in Tag.query.filter_by(group_id=card.group_id)}
-        new_tags = card.tags - existing_tags
-        for tag in new_tags:
-            Tag(label=tag, group_id=card.group_id).save()
-            log.info("saved tag  %s", tag)
         return card.id
 
     def reload_card(self, card_id=None):
@@ -318,3 +329,10 @@ class EditCardForm(NewCardForm):
                 entry.select_marker.choices.insert(0, (0, "-"))
 
         return card
+
+
+class ImportCardsForm(FlaskForm):
+    """Upload of card files, or of zip and tar archives of card files"""
+
+    files = MultipleFileField("Card files (TOML, CSV, zip or tar archives)")
+    submit = SubmitField("Import")
@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+"""Cached HTML of the cards
+
+The cards listings render ``annotations/card_item.html`` for each card.
+The rendered fragments are kept in the shared ``flask_caching`` backend,
+under a key made of the card id and version and of the versions of the
+annotations it shows, so they are only rendered again after the card or
+one of its annotations changes.
+"""
+import hashlib
+
+from flask import current_app, render_template
+from markupsafe import Markup
+
+from cataloger.extensions import cache
+
+template = "annotations/card_item.html"
+
+
+class FragmentCache:
+    """Per card and per version cache of rendered cards
+
+    Hits and misses are counted in each worker process, see `stats`.
+
+    Args:
+        backend (flask_caching.Cache): the shared cache
+        timeout (int): time to live of the fragments in seconds
+    """
+
+    prefix = "fragments/card/"
+
+    def __init__(self, backend=None, timeout=24 * 3600):
+        self.backend = backend
+        self.timeout = timeout
+        self.hits = 0
+        self.misses = 0
+        self._digest = None
+
+    def init_app(self, app):
+        """Reads the cache settings from the app configuration"""
+        self.timeout = app.config.get("CARD_FRAGMENT_TIMEOUT", self.timeout)
+
+    @property
+    def digest(self):
+        """Digest of the card template source, so fragments follow its changes"""
+        if self._digest is None:
+            env = current_app.jinja_env
+            source, _, _ = env.loader.get_source(env, template)
+            self._digest = hashlib.sha1(source.encode()).hexdigest()[:8]
+        return self._digest
+
+    def key(self, card):
+        """The key of the card fragment, following the card and its annotations"""
+        annotations = [
+            card.project,
+            card.organism,
+            card.sample,
+            card.process,
+            card.method,
+            *card.gene_mods,
+        ]
+        versions = ",".join(
+            f"{annotation.id}.{annotation.version}"
+            for annotation in annotations
+            if annotation is not None
+        )
+        digest = hashlib.sha1(versions.encode()).hexdigest()[:8]
+        return f"{self.prefix}{self.digest}/{card.id}/{card.version}/{digest}"
+
+    def render(self, cards):
+        """The HTML of the cards, rendering only the ones not in cache"""
+        keys = [self.key(card) for card in cards]
+        fragments = self.backend.get_many(*keys) if keys else []
+        missing = {}
+        for i, (card, fragment) in enumerate(zip(cards, fragments)):
+            if fragment is None:
+                fragments[i] = missing[keys[i]] = render_template(template, card=card)
+        self.hits += len(cards) - len(missing)
+        self.misses += len(missing)
+        if missing:
+            self.backend.set_many(missing, timeout=self.timeout)
+        return [Markup(fragment) for fragment in fragments]
+
+    def stats(self):
+        """The hits and misses counts of this process, and the hit rate"""
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else None,
+        }
+
+
+card_fragments = FragmentCache(cache)
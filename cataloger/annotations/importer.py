@@ -0,0 +1,292 @@
+# -*- coding: utf-8 -*-
+"""Bulk import of cards
+
+Cards are read from the TOML and CSV files produced by `Card.as_toml`
+and `Card.as_csv`, or from zip and tar archives of such files, e.g.
+made by the ``export-cards`` command. A TOML file can also hold many
+cards, as a ``[[cards]]`` array of tables.
+
+Annotations are looked up by label in the importing user group, with
+a query per annotation class and per chunk of cards, and created when
+missing. Cards are inserted in a transaction per chunk, so the chunks
+read before an error in a file stay imported.
+"""
+import io
+import logging
+import os
+import re
+import tarfile
+import zipfile
+
+import toml
+
+from cataloger.annotations.completion import completions
+from cataloger.annotations.models import (
+    Card,
+    Gene,
+    GeneMod,
+    Marker,
+    Method,
+    Organism,
+    Process,
+    Project,
+    Sample,
+    get_gene_mods,
+)
+from cataloger.database import db
+
+log = logging.getLogger(__name__)
+
+# the annotations of a card record
+card_annotations = {
+    "project": Project,
+    "organism": Organism,
+    "sample": Sample,
+    "method": Method,
+    "process": Process,
+}
+
+_channel = re.compile(r"channel_(\d+)$")
+
+
+class CardImportError(ValueError):
+    """Raised when a card file can not be read
+
+    Attributes:
+        imported (int): the number of cards of the file imported
+            before the error, by `import_cards`
+    """
+
+    imported = 0
+
+
+def _channels(kv_pairs):
+    channels = sorted(
+        (int(match.group(1)), value)
+        for key, value in kv_pairs.items()
+        for match in [_channel.match(key)]
+        if match
+    )
+    return [value for _, value in channels]
+
+
+def parse_toml(text):
+    """Iterates over the card records of a TOML file
+
+    Records are dictionaries with "title", "comment", "channels" and
+    annotation labels keys.
+    """
+    data = toml.loads(text)
+    for card in data.get("cards", [data]):
+        kv_pairs = card.get("kv_pairs", {})
+        record = {
+            "title": card.get("title"),
+            "comment": card.get("comment"),
+            "channels": _channels(kv_pairs),
+            "project": card.get("project"),
+        }
+        for key in ("organism", "sample", "method", "process"):
+            record[key] = kv_pairs.get(key)
+        yield record
+
+
+def parse_csv(text):
+    """Iterates over the card record of a CSV file"""
+    header = []
+    comment = []
+    kv_pairs = {}
+    for line in text.splitlines():
+        key, _, value = line.partition(",")
+        if key in card_annotations or _channel.match(key):
+            kv_pairs[key] = value
+        elif line.startswith("# ") and len(header) < 4:
+            header.append(line[2:])
+        else:
+            comment.append(line[2:] if line.startswith("# ") else line)
+    if not header:
+        raise CardImportError("Missing title")
+    project = header[3] if len(header) > 3 else ""
+    project = project.split("for project ", 1)[-1]
+    yield {
+        "title": header[0],
+        "comment": "\n".join(comment).strip() or None,
+        "channels": _channels(kv_pairs),
+        "project": project or None,
+        "organism": kv_pairs.get("organism"),
+        "sample": kv_pairs.get("sample"),
+        "method": kv_pairs.get("method"),
+        "process": kv_pairs.get("process"),
+    }
+
+
+parsers = {
+    "toml": parse_toml,
+    "csv": parse_csv,
+}
+
+
+def _format(name):
+    ext = os.path.splitext(name)[1].lstrip(".").lower()
+    return ext if ext in parsers else None
+
+
+def _iter_zip(stream):
+    with zipfile.ZipFile(stream) as zf:
+        for member in zf.namelist():
+            if _format(member):
+                yield from iter_records(member, io.BytesIO(zf.read(member)))
+
+
+def _iter_tar(stream):
+    with tarfile.open(fileobj=stream, mode="r:*") as tf:
+        for member in tf:
+            if member.isfile() and _format(member.name):
+                yield from iter_records(member.name, tf.extractfile(member))
+
+
+def iter_records(name, stream):
+    """Iterates over the card records of a file or archive
+
+    Args:
+        name (str): the file name, whose extension gives its format
+        stream: a binary file object
+
+    Raises:
+        CardImportError: if the file can not be read
+    """
+    lower = name.lower()
+    try:
+        if lower.endswith(".zip"):
+            yield from _iter_zip(stream)
+        elif lower.endswith((".tar", ".tar.gz", ".tgz")):
+            yield from _iter_tar(stream)
+        elif _format(name):
+            text = stream.read().decode("utf-8")
+            yield from parsers[_format(name)](text)
+        else:
+            raise CardImportError(f"Unknown format of {name}")
+    except (toml.TomlDecodeError, zipfile.BadZipFile, tarfile.TarError) as e:
+        raise CardImportError(f"Could not read {name}: {e}") from e
+    except UnicodeDecodeError as e:
+        raise CardImportError(f"{name} is not UTF-8 text") from e
+
+
+def _resolve(kls, labels, user, created):
+    """The {label: id} mapping of the labels of the user group
+
+    Missing annotations are created, and appended to created.
+    """
+    labels = {label for label in labels if label}
+    if not labels:
+        return {}
+    query = db.session.query(kls.label, kls.id).filter(
+        kls.group_id == user.group_id, kls.label.in_(labels)
+    )
+    ids = dict(query)
+    new = [
+        kls(label=label, user_id=user.id, group_id=user.group_id)
+        for label in labels - ids.keys()
+    ]
+    if new:
+        db.session.add_all(new)
+        db.session.flush()
+        ids.update((instance.label, instance.id) for instance in new)
+        created.extend(new)
+    return ids
+
+
+def _resolve_gene_mods(labels, user, created):
+    """The {label: GeneMod} mapping of the channel labels
+
+    Labels are the "gene-marker" labels of `get_gene_mod`. Gene mods
+    not found by label are found or created from their gene and marker,
+    with `get_gene_mods`.
+    """
+    labels = {label for label in labels if label}
+    if not labels:
+        return {}
+    gene_mods = {
+        gene_mod.label: gene_mod
+        for gene_mod in GeneMod.query.filter(
+            GeneMod.group_id == user.group_id, GeneMod.label.in_(labels)
+        )
+    }
+    # gene labels may contain dashes, marker labels less often
+    pairs = {label: label.rpartition("-")[::2] for label in labels - gene_mods.keys()}
+    if not pairs:
+        return gene_mods
+    genes = _resolve(Gene, (gene for gene, _ in pairs.values()), user, created)
+    markers = _resolve(Marker, (marker for _, marker in pairs.values()), user, created)
+    found = get_gene_mods(
+        [(genes.get(gene), markers.get(marker)) for gene, marker in pairs.values()],
+        commit=False,
+    )
+    gene_mods.update(zip(pairs, found))
+    return gene_mods
+
+
+def _import_chunk(records, user):
+    created = []
+    ids = {
+        key: _resolve(kls, (record[key] for record in records), user, created)
+        for key, kls in card_annotations.items()
+    }
+    gene_mods = _resolve_gene_mods(
+        (label for record in records for label in record["channels"]), user, created
+    )
+    cards = [
+        Card(
+            title=record["title"] or "Card",
+            comment=record["comment"],
+            user_id=user.id,
+            group_id=user.group_id,
+            gene_mods=[
+                gene_mods[label]
+                for label in record["channels"]
+                if gene_mods.get(label) is not None
+            ],
+            **{f"{key}_id": ids[key].get(record[key]) for key in card_annotations},
+        )
+        for record in records
+    ]
+    db.session.add_all(cards)
+    db.session.add_all(created)
+    db.session.commit()
+
+    for instance in created:
+        completions.add_annotation(instance)
+    return len(cards)
+
+
+def import_cards(records, user, chunk_size=1000):
+    """Creates the cards of the records for user
+
+    Args:
+        records: an iterable of card records, e.g. from `iter_records`
+        user (User): the owner of the cards, in whose group the
+            annotations are looked up
+        chunk_size (int): number of cards per transaction
+
+    Returns:
+        the number of cards created
+
+    Raises:
+        CardImportError: if the records can not be read, with the
+            number of cards of the chunks imported before
+    """
+    count = 0
+    chunk = []
+    try:
+        for record in records:
+            chunk.append(record)
+            if len(chunk) == chunk_size:
+                count += _import_chunk(chunk, user)
+                chunk = []
+    except CardImportError as e:
+        e.imported = count
+        log.info("Imported %d cards for %s before: %s", count, user.username, e)
+        raise
+    if chunk:
+        count += _import_chunk(chunk, user)
+    log.info("Imported %d cards for %s", count, user.username)
+    return count
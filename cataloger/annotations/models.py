@@ -3,12 +3,21 @@
 import datetime as dt
 import toml
 import logging
+from functools import lru_cache
 
+from flask import g, has_app_context
+from markupsafe import escape
+from sqlalchemy import event
+from sqlalchemy.ext.declarative import declared_attr
+from sqlalchemy.orm import Session
 
+from cataloger.annotations.choices import choices
 from cataloger.database import (
     Column,
     PkModel,
+    VersionedMixin,
     db,
+    parse_cursor,
     reference_col,
     relationship,
 )
@@ -23,6 +32,16 @@ gene_mod_card = db.Table(
     db.Model.metadata,
     Column("gene_mod_id", db.Integer, db.ForeignKey("gene_mods.id")),
     Column("card_id", db.Integer, db.ForeignKey("cards.id")),
+    db.Index("ix_gene_mode_card_card_id", "card_id"),
+    db.Index("ix_gene_mode_card_gene_mod_id", "gene_mod_id"),
+)
+
+tag_card = db.Table(
+    "tag_card",
+    db.Model.metadata,
+    Column("card_id", db.Integer, db.ForeignKey("cards.id"), primary_key=True),
+    Column("tag_id", db.Integer, db.ForeignKey("tags.id"), primary_key=True),
+    db.Index("ix_tag_card_tag_id", "tag_id"),
 )
 
 
@@ -33,9 +52,49 @@ class Tag(PkModel):
     label = Column(db.String(128), nullable=False)
     group_id = reference_col("groups", nullable=True)
     group = relationship("Group", backref=__tablename__)
+    __table_args__ = (db.Index("ix_tags_group_id_label", "group_id", "label"),)
+
+    @classmethod
+    def counts(cls, group_id):
+        """The (label, number of cards) pairs of the group tags, most used first"""
+        count = db.func.count(tag_card.c.card_id)
+        return (
+            db.session.query(cls.label, count)
+            .join(tag_card, tag_card.c.tag_id == cls.id)
+            .filter(cls.group_id == group_id)
+            .group_by(cls.id, cls.label)
+            .order_by(count.desc(), cls.label)
+            .all()
+        )
+
+
+# comment lines rendered as headers
+comment_sections = (
+    "Observed Process",
+    "Experimental Conditions",
+    "Additional Information",
+)
 
 
-class Card(PkModel):
+@lru_cache(maxsize=1024)
+def render_comment(comment):
+    """The HTML of a card comment, with section headers and bold #tags
+
+    The comment text is escaped.
+    """
+    lines = []
+    for line in str(escape(comment or "")).split("\n"):
+        if line.startswith(comment_sections):
+            lines.append(f"""<h5 style="margin-top: 1rem;"> {line} </h5>""")
+        else:
+            words = line.split(" ")
+            lines.append(
+                " ".join(f"<b>{w}</b>" if w.startswith("#") else w for w in words)
+            )
+    return "\n".join(lines)
+
+
+class Card(VersionedMixin, PkModel):
     """A card is a collection of annotations
 
     This card can latter be used as key / value annotation tool
@@ -58,9 +117,85 @@ class Card(PkModel):
     process = relationship("Process", backref=__tablename__)
     method_id = reference_col("methods", nullable=True)
     method = relationship("Method", backref=__tablename__)
-    created_at = Column(db.DateTime, nullable=True, default=dt.datetime.utcnow)
+    created_at = Column(db.DateTime, nullable=False, default=dt.datetime.utcnow)
     gene_mods = relationship("GeneMod", secondary=gene_mod_card)
+    # the tags of the comment, set when the card is flushed
+    hashtags = relationship(
+        "Tag", secondary=tag_card, order_by="Tag.label", backref="cards"
+    )
     comment = Column(db.String, nullable=True)
+    # the comment rendered by render_comment, set when the card is flushed
+    comment_html = Column(db.Text, nullable=True)
+    # in the order of the listings
+    __table_args__ = (
+        db.Index("ix_cards_user_id_created_at_id", "user_id", "created_at", "id"),
+        db.Index("ix_cards_group_id_created_at_id", "group_id", "created_at", "id"),
+        # in the order of the changes feed
+        db.Index("ix_cards_group_id_updated_at_id", "group_id", "updated_at", "id"),
+    )
+
+    @classmethod
+    def listing(cls, *criterion, **filter_by_kwargs):
+        """Query of the cards to display, filtered by criterion and filter_by_kwargs
+
+        The annotations shown on the cards are loaded along with them,
+        and the channels in a single additional query, so the number of
+        statements does not grow with the number of cards.
+        """
+        return (
+            cls.query.filter(*criterion)
+            .filter_by(**filter_by_kwargs)
+            .options(
+                db.joinedload(cls.user),
+                db.joinedload(cls.group),
+                db.joinedload(cls.project),
+                db.joinedload(cls.organism),
+                db.joinedload(cls.sample),
+                db.joinedload(cls.process),
+                db.joinedload(cls.method),
+                db.selectinload(cls.gene_mods),
+                db.selectinload(cls.hashtags),
+            )
+        )
+
+    @classmethod
+    def page(cls, query, after=None, per_page=24):
+        """A page of the cards of query, the most recent first
+
+        Pages are delimited by the creation date and id of their last
+        card rather than by an offset, so any page costs the same.
+
+        Args:
+            query: a query of cards, such as returned by `listing`
+            after (str): the `cursor` of the last card of the previous page
+            per_page (int): the maximum number of cards of the page
+
+        Returns:
+            the cards of the page, and the cursor of the next page,
+            or None for the last page
+
+        Raises:
+            ValueError: if after is not a valid cursor
+        """
+        query = query.order_by(cls.created_at.desc(), cls.id.desc())
+        if after:
+            query = query.filter(
+                db.tuple_(cls.created_at, cls.id) < cls.parse_cursor(after)
+            )
+        cards = query.limit(per_page + 1).all()
+        if len(cards) > per_page:
+            return cards[:per_page], cards[per_page - 1].cursor
+        return cards, None
+
+    @property
+    def cursor(self):
+        """The position of the card in the listings"""
+        return f"{self.created_at.isoformat()}_{self.id}"
+
+    @staticmethod
+    def parse_cursor(cursor):
+        """The (created_at, id) pair encoded in cursor"""
+        return parse_cursor(cursor)
 
     def as_csv(self):
         """Writes the key - value pairs of the cards as CSV"""
@@ -79,13 +214,22 @@ class Card(PkModel):
         lines += [f"channel_{i},{gm.label}" for i, gm in enumerate(self.gene_mods)]
         return "\n".join(lines)
 
+    @staticmethod
+    def parse_tags(comment):
+        """The set of the #tags of a comment, without the "#" """
+        words = comment.split() if comment else []
+        return {w.lstrip("#")[:128] for w in words if w.startswith("#")} - {""}
+
     @property
     def tags(self):
-        _tags = [w.lstrip("#") for w in self.comment.split() if w.startswith("#")]
-        return set(_tags)
+        """The labels of the card tags, in alphabetical order"""
+        return [tag.label for tag in self.hashtags]
 
-    def as_dict(self):
+    def as_dict(self, accessed=True):
+        """The card contents, with the access date if accessed is True
 
+        Without the access date, the contents only change with the card.
+        """
         kv_pairs = {}
         if self.organism:
             kv_pairs["organism"] = self.organism.label
@@ -94,7 +238,7 @@ class Card(PkModel):
         if self.method:
             kv_pairs["method"] = self.method.label
         if self.process:
-            kv_pairs["process"] = self.method.label
+            kv_pairs["process"] = self.process.label
 
         kv_pairs.update(
             {f"channel_{i}": gm.label for i, gm in enumerate(self.gene_mods)}
@@ -109,13 +253,14 @@ class Card(PkModel):
             "comment": self.comment,
             "kv_pairs": kv_pairs,
             "tags": self.tags,
-            "accessed": str(dt.datetime.utcnow()),
         }
+        if accessed:
+            card_dict["accessed"] = str(dt.datetime.utcnow())
         return card_dict
 
-    def as_toml(self):
+    def as_toml(self, accessed=True):
         """Output the card contents as toml"""
-        return toml.dumps(self.as_dict())
+        return toml.dumps(self.as_dict(accessed=accessed))
 
     def as_markdown(self):
         """Writes the card contents as markdown"""
@@ -137,23 +282,10 @@ class Card(PkModel):
 
     @property
     def html_comment(self):
-
-        lines = []
-        for line in self.comment.split("\n"):
-            if (
-                line.startswith("Observed Process")
-                or line.startswith("Experimental Conditions")
-                or line.startswith("Additional Information")
-            ):
-                lines.append(f"""<h5 style="margin-top: 1rem;"> {line} </h5>""")
-            else:
-                line = " ".join(
-                    [f"<b>{w}</b>" if w.startswith("#") else w for w in line.split(" ")]
-                )
-                lines.append(line)
-
-        html = "\n".join(lines)
-        return html
+        """The comment as HTML, rendered when the comment was saved"""
+        if self.comment_html is None:
+            return render_comment(self.comment)
+        return self.comment_html
 
 
 class Ontology(PkModel):
@@ -165,7 +297,45 @@ class Ontology(PkModel):
     bioportal_id = Column(db.String(128), nullable=False)
 
 
-class Annotation(PkModel):
+class OntologyTerm(PkModel):
+    """A term from a local copy of one of bioportal ontologies
+
+    There is a row per name of the term, its preferred label or one of its
+    synonyms, so terms can be looked up by any of their names.
+    """
+
+    __tablename__ = "ontology_terms"
+    ontology_id = reference_col("ontologies", nullable=False)
+    ontology = relationship("Ontology", backref=__tablename__)
+    bioportal_id = Column(db.String(256), nullable=False)
+    label = Column(db.String(256), nullable=False)
+    name = Column(db.String(256), nullable=False)
+    search_name = Column(db.String(256), nullable=False)
+    definition = Column(db.Text, nullable=True)
+    __table_args__ = (
+        db.Index(
+            "ix_ontology_terms_ontology_id_search_name",
+            "ontology_id",
+            "search_name",
+            postgresql_ops={"search_name": "varchar_pattern_ops"},
+        ),
+    )
+
+    def as_bioportal(self):
+        """The term as found in bioportal search results"""
+        term = {
+            "@id": self.bioportal_id,
+            "prefLabel": self.label,
+            "links": {"ontology": self.ontology.bioportal_id},
+        }
+        if self.definition:
+            term["definition"] = [self.definition]
+        if self.name != self.label:
+            term["synonym"] = [self.name]
+        return term
+
+
+class Annotation(VersionedMixin, PkModel):
     """An abstract annotation class
 
     An annotation corresponds to an entity from one of
@@ -174,12 +344,25 @@ class Annotation(PkModel):
     """
 
     __abstract__ = True
-    label = Column(db.String(128), nullable=False)
+    label = Column(db.String(128), nullable=False, index=True)
     created_at = Column(db.DateTime, nullable=False, default=dt.datetime.utcnow)
     bioportal_id = Column(db.String(128), nullable=True)
     __icon__ = "fa-search"
     __label__ = "Abstract annotation"
 
+    @declared_attr
+    def __table_args__(cls):  # noqa: N805
+        # the choices of the forms are the annotations of a group
+        return (
+            db.Index(f"ix_{cls.__tablename__}_group_id_label", "group_id", "label"),
+            db.Index(
+                f"ix_{cls.__tablename__}_group_id_updated_at_id",
+                "group_id",
+                "updated_at",
+                "id",
+            ),
+        )
+
     @classmethod
     def help(cls):
         return cls.__doc__.split("\n")[0]
@@ -358,47 +541,227 @@ class GeneMod(Annotation):
     marker_id = reference_col("markers", nullable=True)
     marker = relationship("Marker", backref=__tablename__)
 
+    __table_args__ = (
+        db.Index("ix_gene_mods_group_id_label", "group_id", "label"),
+        db.Index("ix_gene_mods_group_id_updated_at_id", "group_id", "updated_at", "id"),
+        db.UniqueConstraint(
+            "gene_id", "marker_id", name="uq_gene_mods_gene_id_marker_id"
+        ),
+        # NULLs are distinct for the constraint above
+        db.Index(
+            "uq_gene_mods_gene_id",
+            "gene_id",
+            unique=True,
+            postgresql_where=db.text("marker_id IS NULL"),
+            sqlite_where=db.text("marker_id IS NULL"),
+        ),
+        db.Index(
+            "uq_gene_mods_marker_id",
+            "marker_id",
+            unique=True,
+            postgresql_where=db.text("gene_id IS NULL"),
+            sqlite_where=db.text("gene_id IS NULL"),
+        ),
+    )
+
+
+def _annotation_id(value):
+    """The integer id of a form value, None for the "-" choice"""
+    if isinstance(value, str):
+        value = int(value) if value.isdigit() else None
+    return value or None
+
+
+def _gene_mod_filter(keys):
+    """The filter of the gene mods of the (gene_id, marker_id) keys"""
+    pairs = [key for key in keys if all(key)]
+    genes = [gene_id for gene_id, marker_id in keys if marker_id is None]
+    markers = [marker_id for gene_id, marker_id in keys if gene_id is None]
+    conditions = []
+    if pairs:
+        conditions.append(db.tuple_(GeneMod.gene_id, GeneMod.marker_id).in_(pairs))
+    if genes:
+        conditions.append(
+            db.and_(GeneMod.marker_id.is_(None), GeneMod.gene_id.in_(genes))
+        )
+    if markers:
+        conditions.append(
+            db.and_(GeneMod.gene_id.is_(None), GeneMod.marker_id.in_(markers))
+        )
+    return db.or_(*conditions)
+
+
+def _insert_ignore(table):
+    """An insert into table skipping the rows violating a unique constraint"""
+    dialect = db.engine.dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        return table.insert()
+    return insert(table).on_conflict_do_nothing()
+
+
+def get_gene_mods(pairs, commit=True):
+    """Retrieves the GeneMods of (gene_id, marker_id) pairs, or creates them
+
+    All the pairs are looked up in one query, and the missing gene mods
+    are inserted in one statement, skipping the ones concurrently
+    inserted by another request, as the gene and marker pair is unique.
+    Gene mods are memoized for the current request.
+
+    Returns:
+        the list of the GeneMods of the pairs, with None for the pairs
+        without any gene or marker
+    """
+    keys = [(_annotation_id(gene), _annotation_id(marker)) for gene, marker in pairs]
+    found = g.setdefault("gene_mods", {}) if has_app_context() else {}
+
+    missing = {key for key in keys if any(key) and key not in found}
+    if missing:
+        found.update(
+            ((gm.gene_id, gm.marker_id), gm)
+            for gm in GeneMod.query.filter(_gene_mod_filter(missing))
+        )
+        missing -= found.keys()
+    if missing:
+        genes = Gene.query.filter(Gene.id.in_({gene for gene, _ in missing}))
+        genes = {gene.id: gene for gene in genes}
+        markers = Marker.query.filter(Marker.id.in_({mark for _, mark in missing}))
+        markers = {marker.id: marker for marker in markers}
+        # pairs with an unknown gene or marker id are looked up without it
+        aliases = {}
+        for gene_id, marker_id in missing:
+            gene, marker = genes.get(gene_id), markers.get(marker_id)
+            if gene or marker:
+                key = (gene_id if gene else None, marker_id if marker else None)
+                aliases[gene_id, marker_id] = key
+        if aliases.keys() != set(aliases.values()):
+            found.update(
+                ((gm.gene_id, gm.marker_id), gm)
+                for gm in GeneMod.query.filter(_gene_mod_filter(aliases.values()))
+            )
+        rows = []
+        for gene_id, marker_id in set(aliases.values()) - found.keys():
+            gene, marker = genes.get(gene_id), markers.get(marker_id)
+            gene_label, gene_ref = (gene.label, gene.bioportal_id) if gene else ("", "")
+            marker_label, marker_ref = (
+                (marker.label, marker.bioportal_id) if marker else ("", "")
+            )
+            owner = gene or marker
+            rows.append(
+                {
+                    "label": f"{gene_label}-{marker_label}",
+                    "bioportal_id": f"{gene_ref}-{marker_ref}",
+                    "gene_id": gene_id,
+                    "marker_id": marker_id,
+                    "user_id": owner.user_id,
+                    "group_id": owner.group_id,
+                }
+            )
+        if rows:
+            db.session.execute(_insert_ignore(GeneMod.__table__), rows)
+            # the inserted rows, or the concurrently inserted ones
+            found.update(
+                ((gm.gene_id, gm.marker_id), gm)
+                for gm in GeneMod.query.filter(_gene_mod_filter(aliases.values()))
+            )
+            for group_id in {row["group_id"] for row in rows}:
+                choices.invalidate_on_commit(db.session, GeneMod, group_id)
+            if commit:
+                db.session.commit()
+            log.info("Created %d gene mods", len(rows))
+        found.update(
+            (key, found[alias]) for key, alias in aliases.items() if alias in found
+        )
+
+    return [found.get(key) for key in keys]
+
 
 def get_gene_mod(gene_id, marker_id):
     """Retrieves a GeneMod model if the gene / marker pair already exists,
     or creates a new one
     """
+    return get_gene_mods([(gene_id, marker_id)])[0]
+
+
+class Deletion(PkModel):
+    """The deletion of a card or an annotation, for the changes feeds"""
+
+    __tablename__ = "deletions"
+    kind = Column(db.String(64), nullable=False)
+    row_id = Column(db.Integer, nullable=False)
+    group_id = reference_col("groups", nullable=True)
+    deleted_at = Column(db.DateTime, nullable=False, default=dt.datetime.utcnow)
+    __table_args__ = (
+        db.Index("ix_deletions_group_id_deleted_at_id", "group_id", "deleted_at", "id"),
+    )
 
-    if gene_id in ("None", None):
-        gene_id = 0
-
-    if marker_id in ("None", None):
-        marker_id = 0
-
-    gene_mod = GeneMod.query.filter_by(gene_id=gene_id, marker_id=marker_id).first()
-    if gene_mod:
-        log.info("Found gene_mod for gene %s and marker %s", gene_id, marker_id)
-        return gene_mod
-
-    gene = Gene.get_by_id(gene_id)
-    marker = Marker.get_by_id(marker_id)
-    if not (gene or marker):
-        return None
-
-    gene_label = gene.label if gene else ""
-    gene_id = gene.bioportal_id if gene else ""
-    marker_label = marker.label if marker else ""
-    marker_id = marker.bioportal_id if marker else ""
-    user_id = gene.user_id if gene else marker.user_id
-    group_id = gene.group_id if gene else marker.group_id
-
-    label = f"{gene_label}-{marker_label}"
-    bioportal_id = f"{gene_id}-{marker_id}"
-    gene_mod = GeneMod(
-        label=label,
-        bioportal_id=bioportal_id,
-        user_id=user_id,
-        group_id=group_id,
+    @property
+    def change_cursor(self):
+        """The position of the deletion in the changes feed"""
+        return f"{self.deleted_at.isoformat()}_{self.id}"
+
+
+@event.listens_for(Session, "before_flush")
+def _record_deletions(session, flush_context, instances):
+    session.add_all(
+        Deletion(
+            kind=instance.__tablename__,
+            row_id=instance.id,
+            group_id=getattr(instance, "group_id", None),
+        )
+        for instance in session.deleted
+        if isinstance(instance, VersionedMixin)
     )
-    if gene:
-        gene_mod.update(gene=gene, gene_id=gene_id, commit=False)
-    if marker:
-        gene_mod.update(marker=marker, marker_id=marker_id, commit=False)
 
-    gene_mod.save()
-    return gene_mod
+
+def _comment_changed(card):
+    """Whether the comment or the group of a card was changed"""
+    attrs = db.inspect(card).attrs
+    return attrs.comment.history.has_changes() or attrs.group_id.history.has_changes()
+
+
+@event.listens_for(Session, "before_flush")
+def _process_comments(session, flush_context, instances):
+    """Renders the comments of the new and edited cards, and links their tags
+
+    Missing tags are created, with one query per group of the cards.
+    """
+    cards = [
+        card
+        for card in session.new | session.dirty
+        if isinstance(card, Card) and (card in session.new or _comment_changed(card))
+    ]
+    groups = {}
+    for card in cards:
+        card.comment_html = render_comment(card.comment)
+        groups.setdefault(_group_key(card), {})[card] = Card.parse_tags(card.comment)
+
+    with session.no_autoflush:
+        for group, card_tags in groups.items():
+            labels = set().union(*card_tags.values())
+            # the tags of a new group are all new
+            new_group = isinstance(group, PkModel)
+            owner = {"group": group} if new_group else {"group_id": group}
+            tags = {}
+            if labels and not new_group:
+                query = Tag.query.filter(
+                    Tag.group_id == group, Tag.label.in_(labels)
+                ).order_by(Tag.id.desc())
+                # the oldest of the duplicated tags
+                tags = {tag.label: tag for tag in query}
+            new = [Tag(label=label, **owner) for label in labels - tags.keys()]
+            if new:
+                session.add_all(new)
+                tags.update((tag.label, tag) for tag in new)
+            for card, labels_ in card_tags.items():
+                card.hashtags = [tags[label] for label in sorted(labels_)]
+
+
+def _group_key(card):
+    """The group id of a card, or its group if it is not flushed yet"""
+    if card.group_id is not None or card.group is None:
+        return card.group_id
+    return card.group.id if card.group.id is not None else card.group
@@ -0,0 +1,250 @@
+# -*- coding: utf-8 -*-
+"""Full text search of the cards
+
+Cards are indexed in the ``card_search`` table by their title, comment
+(with its tags) and the labels of their annotations and channels. Under
+PostgreSQL, the table holds a weighted ``tsvector`` with a GIN index,
+under SQLite it is an FTS5 virtual table. The index is updated in the
+same transaction as the cards, whenever they are flushed. Annotations
+are seldom renamed, and cards are not indexed again when they are: the
+``reindex-cards`` command rebuilds the whole index.
+"""
+import logging
+import re
+
+from sqlalchemy import DDL, event
+from sqlalchemy.orm import Session
+
+from cataloger.annotations.models import (
+    Card,
+    GeneMod,
+    Method,
+    Organism,
+    Process,
+    Project,
+    Sample,
+    gene_mod_card,
+)
+from cataloger.database import db
+
+log = logging.getLogger(__name__)
+
+# the annotations whose labels are indexed with the card comment
+indexed_annotations = (Project, Organism, Sample, Process, Method)
+
+# words, without the "#" of tags or the "-" of gene mods
+_word = re.compile(r"[^\W_]+")
+
+# (create, drop) statements of the index table
+ddl = {
+    "postgresql": (
+        (
+            "CREATE TABLE card_search ("
+            "card_id INTEGER PRIMARY KEY REFERENCES cards (id) ON DELETE CASCADE, "
+            "document TSVECTOR NOT NULL)",
+            "CREATE INDEX ix_card_search_document ON card_search USING gin (document)",
+        ),
+        ("DROP TABLE IF EXISTS card_search",),
+    ),
+    "sqlite": (
+        (
+            "CREATE VIRTUAL TABLE card_search USING fts5("
+            "title, body, tokenize = 'unicode61 remove_diacritics 2')",
+        ),
+        ("DROP TABLE IF EXISTS card_search",),
+    ),
+}
+
+for dialect, (create, drop) in ddl.items():
+    for statement in create:
+        event.listen(
+            db.metadata, "after_create", DDL(statement).execute_if(dialect=dialect)
+        )
+    for statement in drop:
+        event.listen(
+            db.metadata, "before_drop", DDL(statement).execute_if(dialect=dialect)
+        )
+
+
+class PostgresIndex:
+    """Cards documents as tsvectors, the title weighing more"""
+
+    upsert = (
+        "INSERT INTO card_search (card_id, document) VALUES (:id, "
+        "setweight(to_tsvector('simple', :title), 'A') || "
+        "setweight(to_tsvector('simple', :body), 'B')) "
+        "ON CONFLICT (card_id) DO UPDATE SET document = excluded.document",
+    )
+    delete = "DELETE FROM card_search WHERE card_id = :id"
+    match = (
+        "SELECT s.card_id FROM card_search s "
+        "JOIN cards c ON c.id = s.card_id, to_tsquery('simple', :query) q "
+        "WHERE s.document @@ q {scope} "
+        "ORDER BY ts_rank(s.document, q) DESC, s.card_id DESC "
+        "LIMIT :limit OFFSET :offset"
+    )
+
+    @staticmethod
+    def query(words):
+        return " & ".join(f"{word}:*" for word in words)
+
+
+class SqliteIndex:
+    """Cards documents in an FTS5 table, whose rowids are the cards ids"""
+
+    upsert = (
+        "DELETE FROM card_search WHERE rowid = :id",
+        "INSERT INTO card_search (rowid, title, body) VALUES (:id, :title, :body)",
+    )
+    delete = "DELETE FROM card_search WHERE rowid = :id"
+    match = (
+        "SELECT card_search.rowid FROM card_search "
+        "JOIN cards c ON c.id = card_search.rowid "
+        "WHERE card_search MATCH :query {scope} "
+        "ORDER BY bm25(card_search, 10.0, 1.0), card_search.rowid DESC "
+        "LIMIT :limit OFFSET :offset"
+    )
+
+    @staticmethod
+    def query(words):
+        return " ".join(f'"{word}"*' for word in words)
+
+
+indexes = {
+    "postgresql": PostgresIndex,
+    "sqlite": SqliteIndex,
+}
+
+
+def get_index(connection):
+    """The index of the connection database, None if not supported"""
+    return indexes.get(connection.dialect.name)
+
+
+def documents(connection, card_ids):
+    """The {"id", "title", "body"} rows of the index for the cards
+
+    Rows are read from the database with two queries, so they are up
+    to date with the flushed cards and channels.
+    """
+    query = db.select(
+        Card.id,
+        Card.title,
+        Card.comment,
+        *(kls.label for kls in indexed_annotations),
+    ).select_from(Card.__table__)
+    for kls in indexed_annotations:
+        query = query.outerjoin(
+            kls, getattr(Card, f"{kls.__name__.lower()}_id") == kls.id
+        )
+    rows = {}
+    for card_id, title, comment, *labels in connection.execute(
+        query.where(Card.id.in_(card_ids))
+    ):
+        body = [comment or ""] + [label for label in labels if label]
+        rows[card_id] = {"id": card_id, "title": title, "body": body}
+    channels = (
+        db.select(gene_mod_card.c.card_id, GeneMod.label)
+        .join(GeneMod, GeneMod.id == gene_mod_card.c.gene_mod_id)
+        .where(gene_mod_card.c.card_id.in_(card_ids))
+    )
+    for card_id, label in connection.execute(channels):
+        rows[card_id]["body"].append(label)
+    for row in rows.values():
+        row["body"] = " ".join(row["body"])
+    return list(rows.values())
+
+
+def update_index(connection, card_ids=(), deleted_ids=()):
+    """Indexes the cards of card_ids, and removes the deleted ones"""
+    index = get_index(connection)
+    if index is None:
+        return
+    if deleted_ids:
+        connection.execute(db.text(index.delete), [{"id": id_} for id_ in deleted_ids])
+    if card_ids:
+        rows = documents(connection, card_ids)
+        for statement in index.upsert:
+            connection.execute(db.text(statement), rows)
+
+
+@event.listens_for(Session, "after_flush")
+def _index_flushed_cards(session, flush_context):
+    card_ids = {
+        instance.id
+        for instance in session.new | session.dirty
+        if isinstance(instance, Card)
+    }
+    deleted_ids = {
+        instance.id for instance in session.deleted if isinstance(instance, Card)
+    }
+    if card_ids or deleted_ids:
+        update_index(session.connection(), card_ids - deleted_ids, deleted_ids)
+
+
+def reindex(batch_size=500):
+    """Rebuilds the index of all the cards
+
+    Returns:
+        the number of cards indexed
+    """
+    connection = db.session.connection()
+    connection.execute(db.text("DELETE FROM card_search"))
+    count = 0
+    last_id = 0
+    while True:
+        card_ids = [
+            id_
+            for id_, in db.session.query(Card.id)
+            .filter(Card.id > last_id)
+            .order_by(Card.id)
+            .limit(batch_size)
+        ]
+        if not card_ids:
+            break
+        update_index(connection, card_ids)
+        count += len(card_ids)
+        last_id = card_ids[-1]
+    db.session.commit()
+    log.info("Indexed %d cards", count)
+    return count
+
+
+def search_cards(text, group_id=None, page=1, per_page=24, all_groups=False):
+    """The cards matching all the words of text, the best matches first
+
+    Words match the words of the cards starting with them, in the
+    title, the comment or the annotation labels.
+
+    Args:
+        text (str): the search text
+        group_id (int): the group whose cards are searched
+        page (int): the page of results, starting at 1
+        all_groups (bool): search the cards of every group instead
+
+    Returns:
+        the cards of the page, and whether there are more
+
+    Raises:
+        ValueError: without group_id, unless all_groups is set
+    """
+    if group_id is None and not all_groups:
+        raise ValueError("No group to search, and all_groups is not set")
+    words = _word.findall(text.lower())
+    connection = db.session.connection()
+    index = get_index(connection)
+    if not words or index is None:
+        return [], False
+    scope = "" if all_groups else "AND c.group_id = :group_id"
+    params = {
+        "query": index.query(words),
+        "group_id": group_id,
+        "limit": per_page + 1,
+        "offset": (page - 1) * per_page,
+    }
+    statement = db.text(index.match.format(scope=scope))
+    card_ids = [id_ for id_, in connection.execute(statement, params)]
+    more = len(card_ids) > per_page
+    card_ids = card_ids[:per_page]
+    cards = {card.id: card for card in Card.listing(Card.id.in_(card_ids))}
+    return [cards[id_] for id_ in card_ids if id_ in cards], more
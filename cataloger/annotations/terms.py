@@ -0,0 +1,234 @@
+# -*- coding: utf-8 -*-
+"""Local index of ontology terms
+
+Ontologies can be downloaded from bioportal as OBO, OWL or CSV files,
+and loaded with the ``flask ingest-ontology`` command. Searches are then
+answered from the database instead of the bioportal service.
+"""
+import csv
+import logging
+import os
+import re
+from xml.etree import ElementTree
+
+from cataloger.annotations.models import Ontology, OntologyTerm
+from cataloger.database import db
+
+log = logging.getLogger(__name__)
+
+BIOPORTAL_ONTOLOGIES = "http://data.bioontology.org/ontologies/"
+OBO_PURL = "http://purl.obolibrary.org/obo/"
+
+RDF = "{http://www.w3.org/1999/02/22-rdf-syntax-ns#}"
+RDFS = "{http://www.w3.org/2000/01/rdf-schema#}"
+OWL = "{http://www.w3.org/2002/07/owl#}"
+SKOS = "{http://www.w3.org/2004/02/skos/core#}"
+OBO = "{http://purl.obolibrary.org/obo/}"
+OBO_IN_OWL = "{http://www.geneontology.org/formats/oboInOwl#}"
+
+OWL_LABELS = (RDFS + "label", SKOS + "prefLabel")
+OWL_DEFINITIONS = (OBO + "IAO_0000115", SKOS + "definition")
+OWL_SYNONYMS = tuple(
+    OBO_IN_OWL + tag
+    for tag in ("hasExactSynonym", "hasRelatedSynonym", "hasNarrowSynonym")
+) + (SKOS + "altLabel",)
+
+_quoted = re.compile(r'"((?:[^"\\]|\\.)*)"')
+
+
+def _unquote(value):
+    match = _quoted.match(value)
+    return match.group(1).replace('\\"', '"') if match else None
+
+
+def normalize(text):
+    """Case and white space insensitive version of text, used for searches"""
+    return " ".join(text.lower().split())
+
+
+def _read_obo_tag(term, tag, value):
+    """Stores the value of an OBO tag in term"""
+    if tag == "id":
+        term["id"] = OBO_PURL + value.replace(":", "_", 1)
+    elif tag == "name":
+        term["label"] = value
+    elif tag == "def":
+        term["definition"] = _unquote(value) or value
+    elif tag == "synonym" and _unquote(value):
+        term["synonyms"].append(_unquote(value))
+    elif tag == "is_obsolete" and value == "true":
+        term["obsolete"] = True
+
+
+def parse_obo(path):
+    """Iterates over the terms of an OBO file
+
+    Yields dictionaries with "id", "label", "definition" and "synonyms" keys
+    """
+    term = None
+    with open(path, encoding="utf-8") as fh:
+        for line in fh:
+            line = line.strip()
+            if line.startswith("["):
+                if term:
+                    yield term
+                term = {"synonyms": []} if line == "[Term]" else None
+            elif term is not None and ":" in line:
+                tag, value = line.split(":", 1)
+                _read_obo_tag(term, tag, value.strip())
+    if term:
+        yield term
+
+
+def parse_owl(path):
+    """Iterates over the classes of an OWL (RDF/XML) file
+
+    The file is parsed incrementally, so large ontologies do not need
+    to fit in memory.
+    """
+    depth = 0
+    for event, elem in ElementTree.iterparse(path, events=("start", "end")):
+        if event == "start":
+            depth += 1
+            continue
+        depth -= 1
+        # only top level, named classes
+        if depth != 1:
+            continue
+        if elem.tag == OWL + "Class" and elem.get(RDF + "about"):
+            term = {"id": elem.get(RDF + "about"), "synonyms": []}
+            for child in elem:
+                if child.tag in OWL_LABELS and "label" not in term:
+                    term["label"] = child.text
+                elif child.tag in OWL_DEFINITIONS and "definition" not in term:
+                    term["definition"] = child.text
+                elif child.tag in OWL_SYNONYMS and child.text:
+                    term["synonyms"].append(child.text)
+                elif child.tag == OWL + "deprecated" and child.text == "true":
+                    term["obsolete"] = True
+            yield term
+        elem.clear()
+
+
+def parse_csv(path):
+    """Iterates over the rows of a bioportal CSV download"""
+    with open(path, newline="", encoding="utf-8") as fh:
+        for row in csv.DictReader(fh):
+            synonyms = row.get("Synonyms") or ""
+            yield {
+                "id": row.get("Class ID"),
+                "label": row.get("Preferred Label"),
+                "definition": (row.get("Definitions") or "").split("|")[0],
+                "synonyms": [s for s in synonyms.split("|") if s],
+                "obsolete": (row.get("Obsolete") or "").lower() == "true",
+            }
+
+
+parsers = {
+    "obo": parse_obo,
+    "owl": parse_owl,
+    "csv": parse_csv,
+}
+
+
+def ingest(acronym, path, fmt=None, name=None, chunk_size=5000):
+    """Loads the terms of an ontology file in the database
+
+    Terms previously loaded for this ontology are replaced.
+
+    Args:
+        acronym (str): the bioportal acronym of the ontology, e.g. "GO"
+        path (str): the ontology file
+        fmt (str): one of "obo", "owl" or "csv", guessed from the file
+            extension by default
+        name (str): the ontology full name
+
+    Returns:
+        the number of names indexed
+    """
+    if fmt is None:
+        fmt = os.path.splitext(path)[1].lstrip(".").lower()
+    if fmt not in parsers:
+        raise ValueError(f"Unknown ontology format {fmt}")
+
+    ontology = Ontology.query.filter_by(acronym=acronym).first()
+    if ontology is None:
+        ontology = Ontology.create(
+            acronym=acronym,
+            name=name or acronym,
+            bioportal_id=BIOPORTAL_ONTOLOGIES + acronym,
+        )
+    OntologyTerm.query.filter_by(ontology_id=ontology.id).delete()
+
+    count = 0
+    rows = []
+    for term in parsers[fmt](path):
+        if term.get("obsolete") or not (term.get("id") and term.get("label")):
+            continue
+        names = {term["label"]}
+        names.update(term["synonyms"])
+        for name_ in names:
+            rows.append(
+                {
+                    "ontology_id": ontology.id,
+                    "bioportal_id": term["id"][:256],
+                    "label": term["label"][:256],
+                    "name": name_[:256],
+                    "search_name": normalize(name_)[:256],
+                    "definition": term.get("definition") or None,
+                }
+            )
+        if len(rows) >= chunk_size:
+            db.session.bulk_insert_mappings(OntologyTerm, rows)
+            count += len(rows)
+            rows = []
+    if rows:
+        db.session.bulk_insert_mappings(OntologyTerm, rows)
+        count += len(rows)
+    db.session.commit()
+    log.info("Indexed %d names from %s", count, acronym)
+    return count
+
+
+def search_terms(search_text, acronyms, limit=50):
+    """Looks up the terms whose names start with search_text
+
+    Returns:
+        a {term_id: term} dictionary, in the format of
+        bioportal search results, with the shortest names first
+    """
+    prefix = normalize(search_text or "")
+    if not prefix:
+        return {}
+    query = (
+        OntologyTerm.query.join(Ontology)
+        .filter(Ontology.acronym.in_(acronyms))
+        .filter(_startswith(OntologyTerm.search_name, prefix))
+        .order_by(db.func.length(OntologyTerm.search_name), OntologyTerm.name)
+        .options(db.contains_eager(OntologyTerm.ontology))
+        .limit(limit)
+    )
+    suggestions = {}
+    for term in query:
+        suggestions.setdefault(term.bioportal_id, term.as_bioportal())
+    return suggestions
+
+
+def ingested(acronyms):
+    """The acronyms of the ontologies having terms in the local index"""
+    has_terms = db.exists().where(OntologyTerm.ontology_id == Ontology.id)
+    query = db.session.query(Ontology.acronym).filter(
+        Ontology.acronym.in_(acronyms), has_terms
+    )
+    return {acronym for acronym, in query}
+
+
+def _startswith(column, prefix):
+    """A prefix filter on column able to use its index"""
+    if db.engine.dialect.name == "postgresql":
+        # the index is built with the varchar_pattern_ops operator class
+        return column.startswith(prefix, autoescape=True)
+    # the other databases do not use indices for LIKE by default,
+    # but do for a range of binary strings
+    upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+    return db.and_(column >= prefix, column < upper)
@@ -1,9 +1,14 @@
 # -*- coding: utf-8 -*-
 """annotation views."""
-import os
-import requests
-import tempfile
+import hashlib
+import io
+import json
 import logging
+from concurrent.futures import (
+    as_completed,
+    CancelledError,
+    TimeoutError as FuturesTimeout,
+)
 from datetime import datetime
 
 from flask import (
@@ -15,11 +20,26 @@ from flask import (
     url_for,
     send_file,
     current_app,
+    stream_with_context,
+    abort,
+    jsonify,
+    Response,
 )
 
 from flask_login import login_required, current_user
 
-from cataloger.annotations.forms import NewCardForm, EditCardForm
+from cataloger.annotations import changes, export, importer, search
+from cataloger.annotations.completion import completions
+from cataloger.annotations.forms import NewCardForm, EditCardForm, ImportCardsForm
+from cataloger.annotations.fragments import card_fragments
+from cataloger.annotations.terms import ingested, search_terms
+from cataloger.bioportal import (
+    BioPortalError,
+    BioPortalUnavailableError,
+    InvalidSearchError,
+)
+from cataloger.database import db
+from cataloger.extensions import bioportal, bioportal_cache, suggestion_store
 
 from cataloger.annotations.models import (
     Card,
@@ -39,19 +59,6 @@ from cataloger.utils import get_url_prefix
 
 log = logging.getLogger(__name__)
 
-# https://bioportal.bioontology.org/help#Getting_an_API_key
-
-BIOPORTAL_API_KEY = os.environ.get("BIOPORTAL_API_KEY")
-if not BIOPORTAL_API_KEY:
-    raise ValueError(
-        """
-To use this service, you need an API key provided
-by bioportal here: https://bioportal.bioontology.org/help#Getting_an_API_key,
-this key should then be stored as the environement variable BIOPORTAL_API_KEY
-"""
-    )
-
-
 classes = {
     "organisms": Organism,
     "processes": Process,
@@ -61,6 +68,8 @@ classes = {
     "methods": Method,
 }
 
+# the classes of the annotations selectors
+option_classes = dict(classes, projects=Project)
 
 blueprint = Blueprint(
     "cards",
@@ -98,32 +107,109 @@ def new_project(form):
     return project
 
 
-def search_bioportal(search_text, **other_params):
-    """Searches the bioontology database for the term search_text"""
+def _search_bioportal(search_text, **other_params):
+    """Cached search of the bioontology database, does not need a request
 
+    Raises:
+        BioPortalError: if the search failed
+    """
     params = {
-        "apikey": BIOPORTAL_API_KEY,
         "q": search_text,
         "suggest": False,
     }
     params.update(other_params)
-    response = requests.get(f"http://data.bioontology.org/search", params=params).json()
-    if "errors" in response:
-        flash(f'Invalid search, response["errors"]')
-        return {}
+    key = bioportal_cache.make_key(**params)
+    suggestions = bioportal_cache.get(key)
+    if suggestions is not None:
+        log.debug("Cached bioportal results for %s", search_text)
+        return suggestions
+
+    response = bioportal.search(**params)
+    suggestions = {term["@id"]: term for term in response["collection"]}
+    bioportal_cache.set(key, suggestions)
+    return suggestions
+
 
-    return {term["@id"]: term for term in response["collection"]}
+def search_bioportal(search_text, **other_params):
+    """Searches the bioontology database for the term search_text
+
+    Results are cached, see `cataloger.bioportal.SearchCache`
+    """
+    try:
+        return _search_bioportal(search_text, **other_params)
+    except BioPortalUnavailableError as e:
+        log.warning("Bioportal search for %s failed: %s", search_text, e)
+        flash("The bioportal service is not available, please retry later", "warning")
+    except InvalidSearchError as e:
+        flash(f"Invalid search, {e}")
+    return {}
+
+
+def iter_bioportal(search_text, ontologies_, deadline=None):
+    """Searches each of the ontologies concurrently
+
+    Yields an (ontology, suggestions) pair as soon as each ontology
+    answers. Ontologies that did not answer after deadline seconds
+    or that failed, e.g. with an unexpected response, are skipped.
+    """
+    if deadline is None:
+        deadline = current_app.config.get("BIOPORTAL_FANOUT_DEADLINE", 5)
+    app = current_app._get_current_object()
+
+    def search(ontology):
+        with app.app_context():
+            return _search_bioportal(search_text, ontologies=ontology)
+
+    futures = {bioportal.executor.submit(search, o): o for o in ontologies_}
+    try:
+        for future in as_completed(futures, timeout=deadline):
+            ontology = futures[future]
+            try:
+                yield ontology, future.result()
+            except BioPortalError as e:
+                log.info("No results from %s for %s: %s", ontology, search_text, e)
+            except CancelledError:
+                log.info(
+                    "Bioportal search of %s in %s cancelled", search_text, ontology
+                )
+    except FuturesTimeout:
+        pending = [o for f, o in futures.items() if not f.done()]
+        log.info("Bioportal search for %s timed out in %s", search_text, pending)
+    finally:
+        for future in futures:
+            future.cancel()
 
 
 def annotation_choices(kls, search_term=None):
+    """Searches terms for the annotation class kls
+
+    The ontologies of the local index are searched there, and the
+    other ones in bioportal. Local terms come first.
+    """
     if search_term is None:
         search_term = request.args.get("search_term")
 
-    suggestions = search_bioportal(search_term, ontologies=",".join(ontologies[kls]))
+    local = ingested(ontologies[kls])
+    remote = [acronym for acronym in ontologies[kls] if acronym not in local]
+    suggestions = search_terms(search_term, local) if local else {}
+    found = {}
+    if not remote:
+        log.debug("Searched %s in the local ontologies", search_term)
+    elif current_app.config.get("BIOPORTAL_FANOUT"):
+        for _, results in iter_bioportal(search_term, remote):
+            found.update(results)
+    else:
+        found = search_bioportal(search_term, ontologies=",".join(remote))
+    for term_id, term in found.items():
+        suggestions.setdefault(term_id, term)
+
+    completions.add_terms(kls, suggestions)
+    return suggestions, _choices(suggestions)
 
+
+def _choices(suggestions):
     uniq = {_format_label(term): term_id for term_id, term in suggestions.items()}
-    choices = [(v, k) for k, v in uniq.items()]
-    return suggestions, choices
+    return [(v, k) for k, v in uniq.items()]
 
 
 def new_annotation(kls, term, card_id=None):
@@ -144,6 +230,7 @@ def new_annotation(kls, term, card_id=None):
             group_id=current_user.group_id,
         )
         new.save()
+        completions.add_annotation(new)
         flash(f"Term {term['prefLabel']} registered", "success")
         return new
 
@@ -172,6 +259,7 @@ def new_annotation(kls, term, card_id=None):
     flash(f"Term {term['prefLabel']} registered", "success")
 
     new.save()
+    completions.add_annotation(new)
     return new
 
 
@@ -191,25 +279,262 @@ def _format_label(term, show_definition=False, nwords=8):
         return f"{label} \t ({ontology})"
 
 
+# the full page listing the cards of each scope
+listings = {
+    "user": "user.cards",
+    "group": "cards.cards",
+}
+
+
+def card_page(scope):
+    """The page of the cards of scope after the ``after`` request argument
+
+    Returns:
+        the cards, and the cursor of the next page or None
+    """
+    if scope == "user":
+        cards_ = Card.listing(user_id=current_user.id)
+    elif scope == "group":
+        cards_ = Card.listing(Card.group_id == current_user.group_id)
+    else:
+        cards_ = Card.listing()
+    try:
+        return Card.page(
+            cards_,
+            after=request.args.get("after"),
+            per_page=current_app.config.get("CARDS_PER_PAGE", 24),
+        )
+    except ValueError:
+        abort(400)
+
+
+def render_cards(scope, template="annotations/cards.html"):
+    """Renders a page of the cards of scope, with links to the next one"""
+    cards_, cursor = card_page(scope)
+    next_url = more_url = None
+    if cursor:
+        next_url = url_for("cards.cards_page", scope=scope, after=cursor)
+        more_url = url_for(listings[scope], after=cursor)
+    return render_template(
+        template,
+        cards=cards_,
+        fragments=card_fragments.render(cards_),
+        next_url=next_url,
+        more_url=more_url,
+    )
+
+
 @blueprint.route("/")
 @login_required
 def cards(scope="group"):
     """List cards"""
-    if scope == "user":
-        user_id = current_user.id
-        cards_ = Card.query.filter_by(user_id=user_id)
-    elif scope == "group":
-        cards_ = Card.query.filter(Card.group_id == current_user.group_id)
-    else:
-        cards_ = Card.query.all()
-    return render_template("annotations/cards.html", cards=cards_)
+    return render_cards(scope)
+
+
+@blueprint.route("/page/<scope>")
+@login_required
+def cards_page(scope):
+    """The next page of cards, as an HTML fragment or as JSON
+
+    The cards are rendered as in the cards listings, ending with
+    a link to the next page if any. With ``format=json``, the cards
+    are returned as dictionaries, along with the url of the next page.
+    """
+    if scope not in listings:
+        abort(404)
+    if request.args.get("format") != "json":
+        return render_cards(scope, template="annotations/card_page.html")
+
+    cards_, cursor = card_page(scope)
+    next_url = None
+    if cursor:
+        next_url = url_for("cards.cards_page", scope=scope, after=cursor, format="json")
+    return jsonify(
+        {"cards": [changes.as_json(card) for card in cards_], "next": next_url}
+    )
+
+
+@blueprint.route("/search")
+@login_required
+def search_cards():
+    """Cards of the user group matching the ``q`` request argument
+
+    Cards are ranked by relevance, and paginated by the ``page``
+    argument. With ``partial=1``, only the cards are rendered, as
+    the pages of the cards listings. Users without a group find
+    no cards.
+    """
+    text = request.args.get("q", "")
+    page = request.args.get("page", 1, type=int)
+    if page < 1:
+        abort(400)
+    cards_, more = [], False
+    if current_user.group_id is not None:
+        cards_, more = search.search_cards(
+            text,
+            group_id=current_user.group_id,
+            page=page,
+            per_page=current_app.config.get("CARDS_PER_PAGE", 24),
+        )
+    next_url = more_url = None
+    if more:
+        next_url = url_for("cards.search_cards", q=text, page=page + 1, partial=1)
+        more_url = url_for("cards.search_cards", q=text, page=page + 1)
+    template = "annotations/search_cards.html"
+    if request.args.get("partial"):
+        template = "annotations/card_page.html"
+    return render_template(
+        template,
+        cards=cards_,
+        fragments=card_fragments.render(cards_),
+        next_url=next_url,
+        more_url=more_url,
+        q=text,
+    )
+
+
+@blueprint.route("/fragments/stats")
+@login_required
+def fragment_stats():
+    """The hits and misses of the rendered cards cache in this process"""
+    return jsonify(card_fragments.stats())
+
+
+@blueprint.route("/changes/<kind>")
+@login_required
+def list_changes(kind):
+    """The cards or annotations of the user group changed since a cursor
+
+    The ``since`` argument is the cursor returned by the previous
+    request, and ``limit`` the maximum number of changes. Deleted
+    records are listed by the "deletions" feed. Users without a group
+    have no changes.
+    """
+    if kind not in changes.feeds:
+        abort(404)
+    limit = min(request.args.get("limit", 100, type=int), 1000)
+    if limit < 1:
+        abort(400)
+    since = request.args.get("since")
+    records, cursor, more = [], since, False
+    if current_user.group_id is not None:
+        try:
+            records, cursor, more = changes.changes(
+                kind, group_id=current_user.group_id, since=since, limit=limit
+            )
+        except ValueError:
+            abort(400)
+    return jsonify(
+        {
+            "changes": [changes.as_json(record) for record in records],
+            "cursor": cursor,
+            "more": more,
+        }
+    )
+
+
+@blueprint.route("/suggestions/<kind>")
+@login_required
+def stream_suggestions(kind):
+    """Streams the bioportal suggestions for an annotation class
+
+    Each ontology is searched concurrently, and each line of the response
+    is a JSON object holding the ``[term_id, label]`` choices of an ontology,
+    sent as soon as it answers. The suggestions found so far are stored
+    before each line, so that a choice can be registered while slower
+    ontologies are still searched.
+    """
+    kls = classes.get(kind)
+    search_term = request.args.get("search_term")
+    if kls is None or not search_term:
+        abort(404)
+    key = request.args.get("key", kind)
+    namespace = suggestion_store.namespace()
+
+    def generate():
+        suggestions = {}
+        for ontology, found in iter_bioportal(search_term, ontologies[kls]):
+            found = {k: v for k, v in found.items() if k not in suggestions}
+            suggestions.update(found)
+            completions.add_terms(kls, found)
+            stored = suggestion_store.put(key, suggestions, namespace=namespace)
+            found = {k: v for k, v in found.items() if k in stored}
+            yield json.dumps({"ontology": ontology, "choices": _choices(found)}) + "\n"
+
+    return Response(stream_with_context(generate()), mimetype="application/x-ndjson")
+
+
+@blueprint.route("/complete/<kind>")
+@login_required
+def complete(kind):
+    """Ranked completions of the text q among the kind annotations, as JSON
+
+    The group annotations come first, then the ontology terms recently
+    found by searches.
+    """
+    kls = classes.get(kind)
+    if kls is None:
+        abort(404)
+    limit = min(request.args.get("limit", 10, type=int), 50)
+    found = completions.complete(
+        kls, current_user.group_id, request.args.get("q", ""), limit=limit
+    )
+    return jsonify(completions=found)
+
+
+@blueprint.route("/options/<kind>")
+@login_required
+def options(kind):
+    """A page of the kind annotations of the user group, as JSON
+
+    Options are sorted by label, and can be filtered by the beginning
+    of their label with the ``q`` argument. The ``next`` url of the
+    response points to the next page, or is null for the last one.
+    """
+    kls = option_classes.get(kind)
+    if kls is None:
+        abort(404)
+    limit = min(request.args.get("limit", 50, type=int), 200)
+    query = db.session.query(kls.id, kls.label).filter(
+        kls.group_id == current_user.group_id
+    )
+    prefix = request.args.get("q", "").strip().lower()
+    if prefix:
+        query = query.filter(
+            db.func.lower(kls.label).startswith(prefix, autoescape=True)
+        )
+    after = request.args.get("after")
+    if after:
+        # the id and label of the last option of the previous page
+        after_id, _, after_label = after.partition(":")
+        if not after_id.isdigit():
+            abort(400)
+        query = query.filter(
+            db.tuple_(kls.label, kls.id) > (after_label, int(after_id))
+        )
+
+    pairs = query.order_by(kls.label, kls.id).limit(limit + 1).all()
+    next_url = None
+    if len(pairs) > limit:
+        pairs = pairs[:limit]
+        last_id, last_label = pairs[-1]
+        next_url = url_for(
+            "cards.options",
+            kind=kind,
+            q=prefix or None,
+            limit=limit,
+            after=f"{last_id}:{last_label}",
+        )
+    return jsonify(
+        options=[{"id": id_, "label": label} for id_, label in pairs], next=next_url
+    )
 
 
 def search_annotation(form, key, selector, card=None):
 
     search_term = selector.search.data
     log.info("searching for %s", search_term)
-    suggestions, choices = annotation_choices(selector.kls, search_term=search_term)
+    suggestions, _ = annotation_choices(selector.kls, search_term=search_term)
 
     if not suggestions:
         flash(
@@ -224,9 +549,10 @@ def search_annotation(form, key, selector, card=None):
             )
         return render_template("annotations/new_card.html", form=form)
 
-    current_app.suggestions = suggestions
+    # only the stored terms can be chosen
+    suggestions = suggestion_store.put(key, suggestions)
     form.update_choices(group_id=current_user.group_id)
-    selector.select_new.choices = choices
+    selector.select_new.choices = _choices(suggestions)
     if card:
         return render_template(
             "annotations/edit_card.html", form=form, new=key, card_id=card.id
@@ -241,23 +567,15 @@ def add_annotation(form, key, selector, card=None):
         term = {"prefLabel": selector.new.data, "@id": "local term"}
 
     else:
-        if not hasattr(current_app, "suggestions"):
+        term = suggestion_store.get(key, selector.select_new.data)
+        if term is None:
+            log.info("Suggestion %s expired or not found", selector.select_new.data)
             if card:
                 return redirect(
                     url_for("cards.edit_card", card_id=form.card_id, search=key)
                 )
             return render_template("annotations/new_card.html", form=form, search=key)
-        try:
-            term = current_app.suggestions[selector.select_new.data]
-        except KeyError:
-            log.error(
-                "Suggestion %s not found in suggestions %s",
-                term,
-                list(current_app.suggestions.keys()),
-            )
-            if card:
-                return redirect(url_for("cards.edit_card", card_id=form.card_id))
-            return render_template("annotations/new_card.html", form=form, search=key)
+        suggestion_store.discard(key)
 
     new = new_annotation(selector.kls, term)
 
@@ -425,20 +743,106 @@ def delete_card(card_id):
 )
 @login_required
 def download_card(card_id):
-    card = Card.query.filter_by(id=card_id).first()
-    card.update(user_id=current_user.id)
-    _, tmp_toml = tempfile.mkstemp(suffix=".toml")
-    with open(tmp_toml, "w") as fh:
-        fh.write("# omero annotation file\n")
-        fh.write(card.as_toml())
-        fh.seek(0)
+    """Downloads the card as a TOML annotation file
+
+    The file is built in memory, without the access date so it only
+    changes with the card, and its digest is sent as a strong ETag:
+    clients sending it back in If-None-Match get a 304 Not Modified
+    response while the card is unchanged.
+    """
+    card = Card.listing(id=card_id).first_or_404()
+    data = ("# omero annotation file\n" + card.as_toml(accessed=False)).encode()
     return send_file(
-        tmp_toml,
+        io.BytesIO(data),
+        mimetype="application/toml",
         as_attachment=True,
-        attachment_filename=f'{card.title.replace(" ", "_")}.toml',
+        download_name=f'{card.title.replace(" ", "_")}.toml',
+        etag=hashlib.sha1(data).hexdigest(),
+        max_age=0,
     )
 
 
+@blueprint.route("/export", methods=["GET"])
+@login_required
+def export_cards():
+    """Streams an archive of the cards matching the request filters
+
+    The ``user``, ``group``, ``project`` and ``tag`` arguments select
+    the cards by username, group name, project label or comment tag,
+    ``since`` and ``until`` by creation date (ISO 8601). Only the cards
+    of the user group are exported, except for admins filtering by
+    user or group. ``archive`` is "zip" or "tar", and ``format`` the
+    format of the cards, "toml", "csv" or "markdown".
+    """
+    archive = request.args.get("archive", "zip")
+    fmt = request.args.get("format", "toml")
+    if archive not in export.archives or fmt not in export.formats:
+        abort(400)
+    filters = {
+        key: request.args.get(key) for key in ("user", "group", "project", "tag")
+    }
+    if not (current_user.is_admin and (filters["user"] or filters["group"])):
+        filters["group_id"] = _export_group_id(filters)
+    try:
+        for key in ("since", "until"):
+            value = request.args.get(key)
+            filters[key] = datetime.fromisoformat(value) if value else None
+    except ValueError:
+        abort(400)
+
+    cards_ = export.iter_cards(export.select_cards(**filters))
+    extension = "zip" if archive == "zip" else "tar.gz"
+    return Response(
+        stream_with_context(export.iter_archive(cards_, archive=archive, fmt=fmt)),
+        mimetype=export.archives[archive],
+        headers={"Content-Disposition": f"attachment; filename=cards.{extension}"},
+    )
+
+
+def _export_group_id(filters):
+    """The user group id, if the user and group filters are in this group
+
+    Aborts with 403 otherwise.
+    """
+    group_id = current_user.group_id
+    if group_id is None:
+        abort(403)
+    if filters["group"] and filters["group"] != current_user.groupname:
+        abort(403)
+    if filters["user"]:
+        # imported here, as the user views import these views
+        from cataloger.user.models import User
+
+        member = User.query.filter_by(username=filters["user"], group_id=group_id)
+        if not db.session.query(member.exists()).scalar():
+            abort(403)
+    return group_id
+
+
+@blueprint.route("/import", methods=["GET", "POST"])
+@login_required
+def import_cards():
+    """Creates cards from uploaded TOML or CSV files, or archives of them"""
+    form = ImportCardsForm()
+    if form.validate_on_submit():
+        count = 0
+        for upload in request.files.getlist(form.files.name):
+            if not upload.filename:
+                continue
+            try:
+                records = importer.iter_records(upload.filename, upload.stream)
+                count += importer.import_cards(records, current_user)
+            except importer.CardImportError as e:
+                count += e.imported
+                flash(
+                    f"{e}, {e.imported} cards of {upload.filename} imported before",
+                    "warning",
+                )
+        flash(f"Imported {count} cards", "success")
+        return redirect(url_for("user.cards"))
+    return render_template("annotations/import_cards.html", form=form)
+
+
 @blueprint.route(
     "/clone/<card_id>",
     methods=["GET"],
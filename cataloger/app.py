@@ -1,25 +1,27 @@
 # -*- coding: utf-8 -*-
 """The app module, containing the app factory function."""
-import logging
-import sys
-
-logging.basicConfig(level=logging.DEBUG)
-
 from flask import Flask, render_template
 
 from cataloger import commands, public, user, annotations
+from cataloger.annotations.choices import choices
+from cataloger.annotations.fragments import card_fragments
+from cataloger.annotations.completion import completions
 from cataloger.extensions import (
+    auth_backend,
     bcrypt,
+    bioportal,
+    bioportal_cache,
     cache,
     csrf_protect,
     db,
-    debug_toolbar,
     flask_static_digest,
     login_manager,
-    ldap_manager,
-    omero_manager,
     migrate,
+    passwords,
+    suggestion_store,
 )
+from cataloger.logs import configure_logging
+from cataloger.user.cache import user_cache
 
 
 def create_app(config_object="cataloger.settings"):
@@ -29,32 +31,35 @@ def create_app(config_object="cataloger.settings"):
     """
     app = Flask(__name__.split(".")[0])
     app.config.from_object(config_object)
+    configure_logger(app)
     register_extensions(app)
     register_blueprints(app)
     register_errorhandlers(app)
     register_shellcontext(app)
     register_commands(app)
-    configure_logger(app)
     return app
 
 
 def register_extensions(app):
     """Register Flask extensions."""
     bcrypt.init_app(app)
+    passwords.init_app(app)
     cache.init_app(app)
+    bioportal_cache.init_app(app)
+    bioportal.init_app(app)
+    completions.init_app(app)
+    choices.init_app(app)
+    card_fragments.init_app(app)
+    user_cache.init_app(app)
+    suggestion_store.init_app(app)
     db.init_app(app)
     csrf_protect.init_app(app)
     login_manager.init_app(app)
-    try:
-        ldap_manager.init_app(app)
-    except Exception:
-        print("No LDAP")
-    try:
-        omero_manager.init_app(app)
-    except Exception:
-        print("No OMERO")
-
-    debug_toolbar.init_app(app)
+    auth_backend.init_app(app)
+    if app.config.get("DEBUG_TB_ENABLED"):
+        from flask_debugtoolbar import DebugToolbarExtension
+
+        DebugToolbarExtension(app)
     migrate.init_app(app, db)
     flask_static_digest.init_app(app)
 
@@ -93,10 +98,12 @@ def register_commands(app):
     """Register Click commands."""
     app.cli.add_command(commands.test)
     app.cli.add_command(commands.lint)
+    app.cli.add_command(commands.ingest_ontology)
+    app.cli.add_command(commands.export_cards)
+    app.cli.add_command(commands.import_cards)
+    app.cli.add_command(commands.reindex_cards)
 
 
 def configure_logger(app):
     """Configure loggers."""
-    handler = logging.StreamHandler(sys.stdout)
-    if not app.logger.handlers:
-        app.logger.addHandler(handler)
+    configure_logging(app.config)
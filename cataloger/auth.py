@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+"""The external authentication backend of the app
+
+Only the backend of ``AUTH_METHOD`` is imported, when the app is
+initialized, so that the app and the CLI do not pay for the imports of
+the other ones. Without a backend ("LOCAL"), users log in with their
+local password only.
+"""
+import importlib
+
+# module and login manager class of each backend
+backends = {
+    "LDAP": ("flask_ldap3_login", "LDAP3LoginManager"),
+    "OMERO": ("cataloger.omero_login", "OmeroLoginManager"),
+}
+
+
+class AuthBackend:
+    """The login manager of the configured authentication method
+
+    Callbacks saving the users of each method are registered with
+    `save_user`, and passed to the manager when it is created.
+    """
+
+    def __init__(self, app=None):
+        self.method = "LOCAL"
+        self.manager = None
+        self._statuses = None
+        self._save_user = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Creates the login manager of the app ``AUTH_METHOD``"""
+        self.method = app.config.get("AUTH_METHOD", "LOCAL")
+        self.manager = None
+        if self.method not in backends:
+            return
+        module_name, class_name = backends[self.method]
+        module = importlib.import_module(module_name)
+        self._statuses = module.AuthenticationResponseStatus
+        self.manager = getattr(module, class_name)()
+        if self.method in self._save_user:
+            self.manager.save_user(self._save_user[self.method])
+        self.manager.init_app(app)
+
+    def save_user(self, method):
+        """Decorator registering the callback saving the users of method"""
+
+        def decorator(callback):
+            self._save_user[method] = callback
+            if self.manager is not None and self.method == method:
+                self.manager.save_user(callback)
+            return callback
+
+        return decorator
+
+    def authenticate(self, username, password):
+        """Whether the backend accepts the credentials, False without backend"""
+        if self.manager is None:
+            return False
+        response = self.manager.authenticate(username, password)
+        return response.status == self._statuses.success
@@ -0,0 +1,425 @@
+"""Access to the bioportal ontology search service
+
+See https://data.bioontology.org/documentation for the API
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+import requests
+from flask import session
+from flask_login import current_user
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+log = logging.getLogger(__name__)
+
+
+class SearchCache:
+    """Cache for bioportal search results
+
+    Search results are stored in the application ``flask_caching``
+    backend, which is shared by all the workers when configured with a
+    filesystem, redis or memcached ``CACHE_TYPE``. A small least
+    recently used store is kept in front of it in each process, so
+    repeated lookups do not even need to reach the backend.
+
+    Each entry expires ``timeout`` seconds after the remote search was
+    performed, in both levels of the cache.
+
+    Args:
+        backend (flask_caching.Cache): the shared cache
+        timeout (int): time to live of an entry in seconds
+        maxsize (int): maximum number of entries in the local store
+    """
+
+    prefix = "bioportal/search/"
+
+    def __init__(self, backend=None, timeout=86400, maxsize=256):
+        self.backend = backend
+        self.timeout = timeout
+        self.maxsize = maxsize
+        self._local = OrderedDict()
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        """Reads the cache settings from the app configuration"""
+        self.timeout = app.config.get("BIOPORTAL_CACHE_TIMEOUT", self.timeout)
+        self.maxsize = app.config.get("BIOPORTAL_CACHE_SIZE", self.maxsize)
+        self.clear()
+
+    @staticmethod
+    def make_key(q, **params):
+        """Builds a cache key from the search parameters
+
+        The search text is case and whitespace normalized, and the
+        ontologies list is sorted, so equivalent searches share an entry.
+        """
+        params = dict(params)
+        params.pop("apikey", None)
+        params["q"] = " ".join(str(q).lower().split())
+        ontologies = params.get("ontologies")
+        if ontologies:
+            if isinstance(ontologies, str):
+                ontologies = ontologies.split(",")
+            params["ontologies"] = ",".join(
+                sorted({o.strip().upper() for o in ontologies if o.strip()})
+            )
+        raw = json.dumps(params, sort_keys=True, default=str)
+        return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        """Returns the cached value for key, or None if it is absent or expired"""
+        now = time.time()
+        with self._lock:
+            entry = self._local.get(key)
+            if entry is not None:
+                expires, value = entry
+                if expires > now:
+                    self._local.move_to_end(key)
+                    return value
+                del self._local[key]
+
+        if self.backend is None:
+            return None
+        entry = self.backend.get(self.prefix + key)
+        if entry is None:
+            return None
+        expires, value = entry
+        if expires <= now:
+            return None
+        self._remember(key, expires, value)
+        return value
+
+    def set(self, key, value):
+        """Stores value in both the local and shared caches"""
+        expires = time.time() + self.timeout
+        self._remember(key, expires, value)
+        if self.backend is not None:
+            self.backend.set(self.prefix + key, (expires, value), timeout=self.timeout)
+
+    def clear(self):
+        """Empties the local store"""
+        with self._lock:
+            self._local.clear()
+
+    def _remember(self, key, expires, value):
+        with self._lock:
+            self._local[key] = (expires, value)
+            self._local.move_to_end(key)
+            while len(self._local) > self.maxsize:
+                self._local.popitem(last=False)
+
+
+class SuggestionStore:
+    """Search results presented to a user, waiting for a term to be chosen
+
+    The search and the registration of the chosen term happen in two
+    requests, that can be served by different workers, so results are
+    kept in the shared ``flask_caching`` backend. They are stored per user
+    session and per search key (e.g. the form selector), for ``timeout``
+    seconds, and only the ``max_terms`` first terms of a search are kept.
+
+    Args:
+        backend (flask_caching.Cache): the shared cache
+        timeout (int): time to live of the suggestions in seconds
+        max_terms (int): maximum number of terms stored per search
+    """
+
+    prefix = "bioportal/suggestions/"
+
+    def __init__(self, backend=None, timeout=1800, max_terms=100):
+        self.backend = backend
+        self.timeout = timeout
+        self.max_terms = max_terms
+
+    def init_app(self, app):
+        """Reads the store settings from the app configuration"""
+        self.timeout = app.config.get("SUGGESTIONS_TIMEOUT", self.timeout)
+        self.max_terms = app.config.get("SUGGESTIONS_MAX_TERMS", self.max_terms)
+
+    def namespace(self):
+        """The current user session namespace
+
+        Must be called before the response headers are sent, as it
+        can modify the session.
+        """
+        if "suggestions" not in session:
+            session["suggestions"] = uuid.uuid4().hex
+        return f"{self.prefix}{current_user.get_id()}/{session['suggestions']}/"
+
+    def put(self, key, suggestions, namespace=None):
+        """Stores the {term_id: term} suggestions of the search key
+
+        Returns:
+            the stored suggestions, the ones to present to the user
+        """
+        terms = dict(islice(suggestions.items(), self.max_terms))
+        namespace = namespace or self.namespace()
+        self.backend.set(namespace + key, terms, timeout=self.timeout)
+        return terms
+
+    def get(self, key, term_id):
+        """Returns the term_id suggestion of the search key, or None"""
+        terms = self.backend.get(self.namespace() + key) or {}
+        return terms.get(term_id)
+
+    def discard(self, key):
+        """Forgets the suggestions of the search key"""
+        self.backend.delete(self.namespace() + key)
+
+
+class BioPortalError(Exception):
+    """Base class for bioportal errors"""
+
+
+class BioPortalUnavailableError(BioPortalError):
+    """Raised when the bioportal service can not be reached"""
+
+
+class MissingApiKeyError(BioPortalUnavailableError):
+    """Raised when no BIOPORTAL_API_KEY is configured"""
+
+    def __init__(self):
+        super().__init__(
+            "To use this service, you need an API key provided by bioportal here: "
+            "https://bioportal.bioontology.org/help#Getting_an_API_key, "
+            "this key should then be stored as the environment variable "
+            "BIOPORTAL_API_KEY"
+        )
+
+
+class InvalidSearchError(BioPortalError):
+    """Raised when bioportal rejects a search"""
+
+
+class CircuitBreaker:
+    """Stops calling a failing service for a while
+
+    After ``failure_threshold`` consecutive failures the circuit opens
+    and calls fail fast. Once ``reset_timeout`` seconds have passed, a
+    single trial call is let through: the circuit closes again if it
+    succeeds, and re-opens otherwise.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    def allow(self):
+        """Returns True if a call can be attempted"""
+        with self._lock:
+            state = self.state
+            if state == "half-open":
+                # let one trial call through and keep the others waiting
+                self.opened_at = time.monotonic()
+                return True
+            return state == "closed"
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.failures >= self.failure_threshold:
+                if self.opened_at is None:
+                    log.warning("Opening the bioportal circuit breaker")
+                self.opened_at = time.monotonic()
+
+
+class BioPortalClient:
+    """A bioportal REST API client
+
+    Requests go through a single pooled, keep-alive ``requests.Session``
+    per worker process, with connect / read timeouts and a bounded
+    number of retries with exponential backoff. A `CircuitBreaker` makes
+    calls fail fast with `BioPortalUnavailableError` while the service is down.
+
+    Configuration keys, with their defaults:
+
+    - BIOPORTAL_URL: "https://data.bioontology.org"
+    - BIOPORTAL_API_KEY: None
+    - BIOPORTAL_CONNECT_TIMEOUT: 3.05 (seconds)
+    - BIOPORTAL_READ_TIMEOUT: 10 (seconds)
+    - BIOPORTAL_RETRIES: 2
+    - BIOPORTAL_BACKOFF: 0.3 (seconds)
+    - BIOPORTAL_POOL_SIZE: 10
+    - BIOPORTAL_BREAKER_THRESHOLD: 5 (consecutive failures)
+    - BIOPORTAL_BREAKER_TIMEOUT: 30 (seconds)
+    - BIOPORTAL_FANOUT_WORKERS: 8 (concurrent searches per worker)
+    """
+
+    retry_statuses = (429, 500, 502, 503, 504)
+
+    def __init__(self, app=None):
+        self.config = {}
+        self.breaker = CircuitBreaker()
+        self._session = None
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Configures this client with the given app, and attaches it
+        to the app as ``app.bioportal_client``.
+        """
+        app.bioportal_client = self
+        self.init_config(app.config)
+
+    def init_config(self, config):
+        """Configures this client with a configuration dictionary
+
+        Args:
+            config (dict): A dictionary with configuration keys
+        """
+        self.config.update(config)
+        self.config.setdefault("BIOPORTAL_URL", "https://data.bioontology.org")
+        self.config.setdefault("BIOPORTAL_API_KEY", None)
+        self.config.setdefault("BIOPORTAL_CONNECT_TIMEOUT", 3.05)
+        self.config.setdefault("BIOPORTAL_READ_TIMEOUT", 10)
+        self.config.setdefault("BIOPORTAL_RETRIES", 2)
+        self.config.setdefault("BIOPORTAL_BACKOFF", 0.3)
+        self.config.setdefault("BIOPORTAL_POOL_SIZE", 10)
+        self.config.setdefault("BIOPORTAL_BREAKER_THRESHOLD", 5)
+        self.config.setdefault("BIOPORTAL_BREAKER_TIMEOUT", 30)
+        self.config.setdefault("BIOPORTAL_FANOUT_WORKERS", 8)
+        self.breaker = CircuitBreaker(
+            failure_threshold=self.config["BIOPORTAL_BREAKER_THRESHOLD"],
+            reset_timeout=self.config["BIOPORTAL_BREAKER_TIMEOUT"],
+        )
+        self.close()
+
+    @property
+    def session(self):
+        """The http session of the current process
+
+        Sessions are not shared across a fork, so a new one is created
+        in each worker.
+        """
+        with self._lock:
+            self._check_pid()
+            if self._session is None:
+                self._session = self._make_session()
+            return self._session
+
+    @property
+    def executor(self):
+        """The pool running concurrent searches in the current process
+
+        Under a gevent worker, the pool threads are greenlets.
+        """
+        with self._lock:
+            self._check_pid()
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.config["BIOPORTAL_FANOUT_WORKERS"],
+                    thread_name_prefix="bioportal",
+                )
+            return self._executor
+
+    def _check_pid(self):
+        if self._pid != os.getpid():
+            self._session = None
+            self._executor = None
+            self._pid = os.getpid()
+
+    def _make_session(self):
+        retries = Retry(
+            total=self.config["BIOPORTAL_RETRIES"],
+            backoff_factor=self.config["BIOPORTAL_BACKOFF"],
+            status_forcelist=self.retry_statuses,
+            raise_on_status=False,
+        )
+        pool_size = self.config["BIOPORTAL_POOL_SIZE"]
+        adapter = HTTPAdapter(
+            pool_connections=1, pool_maxsize=pool_size, max_retries=retries
+        )
+        session = requests.Session()
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        session.headers["Accept"] = "application/json"
+        api_key = self.config["BIOPORTAL_API_KEY"]
+        if api_key:
+            session.headers["Authorization"] = f"apikey token={api_key}"
+        return session
+
+    def close(self):
+        """Closes the pooled connections and threads"""
+        with self._lock:
+            if self._session is not None:
+                self._session.close()
+            if self._executor is not None:
+                self._executor.shutdown(wait=False)
+            self._session = None
+            self._executor = None
+
+    def get(self, path, **params):
+        """Gets the JSON document at path
+
+        Raises:
+            MissingApiKeyError: if no API key is configured
+            BioPortalUnavailableError: if the service is down or could
+                not be reached in time
+        """
+        if not self.config["BIOPORTAL_API_KEY"]:
+            raise MissingApiKeyError()
+        if not self.breaker.allow():
+            raise BioPortalUnavailableError(
+                "Bioportal is unavailable, not retrying yet"
+            )
+
+        url = self.config["BIOPORTAL_URL"].rstrip("/") + "/" + path.lstrip("/")
+        timeout = (
+            self.config["BIOPORTAL_CONNECT_TIMEOUT"],
+            self.config["BIOPORTAL_READ_TIMEOUT"],
+        )
+        try:
+            response = self.session.get(url, params=params, timeout=timeout)
+        except requests.RequestException as e:
+            self.breaker.record_failure()
+            raise BioPortalUnavailableError(f"Bioportal request failed: {e}") from e
+
+        if response.status_code in self.retry_statuses:
+            self.breaker.record_failure()
+            raise BioPortalUnavailableError(
+                f"Bioportal responded with status {response.status_code}"
+            )
+        self.breaker.record_success()
+        try:
+            return response.json()
+        except ValueError as e:
+            raise BioPortalUnavailableError("Invalid response from bioportal") from e
+
+    def search(self, q, **params):
+        """Searches the bioportal ontologies for the term q
+
+        Raises:
+            InvalidSearchError: if bioportal reports errors with the search
+        """
+        response = self.get("search", q=q, **params)
+        if "errors" in response:
+            raise InvalidSearchError(", ".join(map(str, response["errors"])))
+        return response
@@ -5,6 +5,7 @@ from glob import glob
 from subprocess import call
 
 import click
+from flask.cli import with_appcontext
 
 HERE = os.path.abspath(os.path.dirname(__file__))
 PROJECT_ROOT = os.path.join(HERE, os.pardir)
@@ -63,3 +64,109 @@ def lint(fix_imports, check):
         execute_tool("Fixing import order", "isort", *isort_args)
     execute_tool("Formatting style", "black", *black_args)
     execute_tool("Checking code style", "flake8")
+
+
+@click.command("ingest-ontology")
+@click.argument("acronym")
+@click.argument("path", type=click.Path(exists=True, dir_okay=False))
+@click.option(
+    "-f",
+    "--format",
+    "fmt",
+    type=click.Choice(["obo", "owl", "csv"]),
+    default=None,
+    help="The file format, guessed from its extension by default",
+)
+@click.option("-n", "--name", default=None, help="The ontology full name")
+@with_appcontext
+def ingest_ontology(acronym, path, fmt, name):
+    """Load an ontology file in the local terms index.
+
+    ACRONYM is the bioportal acronym of the ontology, e.g. GO, and PATH
+    an OBO, OWL or CSV file downloaded from bioportal.
+    """
+    from cataloger.annotations.terms import ingest
+    from cataloger.annotations.views import ontologies
+
+    known = {acr for acronyms in ontologies.values() for acr in acronyms}
+    if acronym not in known:
+        click.echo(f"Warning: {acronym} is not searched for any annotation")
+    count = ingest(acronym, path, fmt=fmt, name=name)
+    click.echo(f"Indexed {count} terms names from {acronym}")
+
+
+@click.command("export-cards")
+@click.argument("output", type=click.File("wb"))
+@click.option("-u", "--user", default=None, help="Username of the cards owner")
+@click.option("-g", "--group", default=None, help="Name of the cards group")
+@click.option("-p", "--project", default=None, help="Label of the cards project")
+@click.option("-t", "--tag", default=None, help="A tag of the cards")
+@click.option("--since", type=click.DateTime(), default=None)
+@click.option("--until", type=click.DateTime(), default=None)
+@click.option("-a", "--archive", type=click.Choice(["zip", "tar"]), default="zip")
+@click.option(
+    "-f",
+    "--format",
+    "fmt",
+    type=click.Choice(["toml", "csv", "markdown"]),
+    default="toml",
+    help="The format of the cards",
+)
+@with_appcontext
+def export_cards(output, user, group, project, tag, since, until, archive, fmt):
+    """Export the cards matching the filters to an archive.
+
+    OUTPUT is the archive file, or - for the standard output.
+    """
+    from cataloger.annotations import export
+
+    query = export.select_cards(
+        user=user, group=group, project=project, tag=tag, since=since, until=until
+    )
+    for chunk in export.iter_archive(
+        export.iter_cards(query), archive=archive, fmt=fmt
+    ):
+        output.write(chunk)
+
+
+@click.command("import-cards")
+@click.argument("username")
+@click.argument("paths", nargs=-1, type=click.Path(exists=True, dir_okay=False))
+@click.option(
+    "-c", "--chunk-size", default=1000, help="Number of cards per transaction"
+)
+@with_appcontext
+def import_cards(username, paths, chunk_size):
+    """Import cards from TOML or CSV files, or zip and tar archives of them.
+
+    USERNAME is the owner of the new cards, and PATHS the files to import.
+    """
+    from cataloger.annotations import importer
+    from cataloger.user.models import User
+
+    user = User.query.filter_by(username=username).first()
+    if user is None:
+        raise click.BadParameter(f"Unknown user {username}", param_hint="USERNAME")
+    count = 0
+    for path in paths:
+        with open(path, "rb") as stream:
+            try:
+                records = importer.iter_records(path, stream)
+                count += importer.import_cards(records, user, chunk_size=chunk_size)
+            except importer.CardImportError as e:
+                count += e.imported
+                raise click.ClickException(
+                    f"{e}, {e.imported} cards of {path} and "
+                    f"{count} cards in all imported before"
+                )
+    click.echo(f"Imported {count} cards for {username}")
+
+
+@click.command("reindex-cards")
+@with_appcontext
+def reindex_cards():
+    """Rebuild the full text index of the cards."""
+    from cataloger.annotations.search import reindex
+
+    count = reindex()
+    click.echo(f"Indexed {count} cards")
@@ -1,5 +1,10 @@
 # -*- coding: utf-8 -*-
 """Database module, including the SQLAlchemy database object and DB-related utilities."""
+import datetime as dt
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
 from cataloger.extensions import db
 
 
@@ -61,6 +66,43 @@ class PkModel(Model):
         return None
 
 
+class VersionedMixin(object):
+    """Mixin that adds the time and number of the last change of a record
+
+    Both are updated when a changed record is flushed, e.g. by `update`
+    or `save`, and the (updated_at, id) pair positions the record in
+    the changes feeds.
+    """
+
+    updated_at = Column(db.DateTime, nullable=False, default=dt.datetime.utcnow)
+    version = Column(db.Integer, nullable=False, default=1)
+
+    @property
+    def change_cursor(self):
+        """The position of the record in the changes feeds"""
+        return f"{self.updated_at.isoformat()}_{self.id}"
+
+
+def parse_cursor(cursor):
+    """The (datetime, id) pair encoded in a "<iso datetime>_<id>" cursor
+
+    Raises:
+        ValueError: if the cursor is invalid
+    """
+    at, _, record_id = cursor.rpartition("_")
+    return dt.datetime.fromisoformat(at), int(record_id)
+
+
+@event.listens_for(Session, "before_flush")
+def _update_versions(session, flush_context, instances):
+    now = dt.datetime.utcnow()
+    for instance in session.dirty:
+        if isinstance(instance, VersionedMixin) and session.is_modified(instance):
+            # incremented by the database, in case of concurrent updates
+            instance.version = type(instance).version + 1
+            instance.updated_at = now
+
+
 def reference_col(
     tablename, nullable=False, pk_name="id", foreign_key_kwargs=None, column_kwargs=None
 ):
@@ -0,0 +1,201 @@
+# -*- coding: utf-8 -*-
+"""Logging configuration of the app
+
+Records are put on a queue by the handler of the root logger, and
+written to stdout by a `logging.handlers.QueueListener` thread, so
+requests do not wait for the output. Under gevent, the listener is a
+greenlet writing between the requests.
+
+Configuration keys, with their defaults:
+
+- LOG_LEVEL: "INFO", the level of the root logger
+- LOG_LEVELS: {}, levels per logger name, e.g. {"sqlalchemy.engine": "INFO"}
+- LOG_FORMAT: "text", or "json" for one JSON object per line
+- LOG_SAMPLE_LIMIT: 0, records of a message let through per interval,
+  0 to keep them all
+- LOG_SAMPLE_INTERVAL: 60 (seconds)
+- LOG_SAMPLE_LOGGERS: [], the sampled loggers, with their children,
+  e.g. ["werkzeug"], all of them if empty
+
+Sampling is off by default, and only applies below WARNING. The first
+record of a message let through after some were dropped tells how many
+were. The windows of the messages are forgotten once expired, or when
+there are too many of them, least recently used first.
+"""
+import atexit
+import copy
+import datetime as dt
+import json
+import logging
+import queue
+import sys
+import threading
+import time
+from collections import OrderedDict
+from logging.handlers import QueueHandler, QueueListener
+
+text_format = "%(asctime)s %(levelname)s %(name)s: %(message)s"
+
+
+class SamplingFilter(logging.Filter):
+    """Lets at most limit records of each message through per interval
+
+    Messages are told apart by their logger and format string, so the
+    records of a message differing only by their arguments are sampled
+    together. Only the records of loggers, or of their children, are
+    sampled if any are given. Expired windows without dropped records
+    are swept once per interval, and at most max_windows are kept.
+    """
+
+    def __init__(self, limit=10, interval=60, loggers=(), max_windows=1000):
+        super().__init__()
+        self.limit = limit
+        self.interval = interval
+        self.loggers = tuple(loggers)
+        self.max_windows = max_windows
+        self._windows = OrderedDict()
+        self._swept = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _sweep(self, now):
+        expired = [
+            key
+            for key, (start, _, dropped) in self._windows.items()
+            if now - start >= self.interval and not dropped
+        ]
+        for key in expired:
+            del self._windows[key]
+        self._swept = now
+
+    def filter(self, record):
+        if not self.limit or record.levelno >= logging.WARNING:
+            return True
+        if self.loggers and not any(
+            record.name == name or record.name.startswith(name + ".")
+            for name in self.loggers
+        ):
+            return True
+        key = (record.name, record.msg)
+        now = time.monotonic()
+        with self._lock:
+            if now - self._swept >= self.interval:
+                self._sweep(now)
+            start, count, dropped = self._windows.get(key, (now, 0, 0))
+            if now - start >= self.interval:
+                start, count = now, 0
+            if count >= self.limit:
+                self._windows[key] = (start, count, dropped + 1)
+                self._windows.move_to_end(key)
+                return False
+            self._windows[key] = (start, count + 1, 0)
+            self._windows.move_to_end(key)
+            if len(self._windows) > self.max_windows:
+                self._windows.popitem(last=False)
+        if dropped:
+            record.dropped = dropped
+        return True
+
+
+def _dropped(record):
+    dropped = getattr(record, "dropped", 0)
+    return f" ({dropped} similar messages dropped)" if dropped else ""
+
+
+class TextFormatter(logging.Formatter):
+    """The text format, with the number of dropped similar messages"""
+
+    def formatMessage(self, record):  # noqa: N802
+        return super().formatMessage(record) + _dropped(record)
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record"""
+
+    def format(self, record):
+        entry = {
+            "time": dt.datetime.utcfromtimestamp(record.created).isoformat() + "Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if getattr(record, "dropped", 0):
+            entry["dropped"] = record.dropped
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class RecordQueueHandler(QueueHandler):
+    """Queues the records with their message and traceback as text
+
+    Unlike `QueueHandler`, the traceback is kept apart from the message,
+    for the JSON format.
+    """
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = self.formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+formatters = {
+    "text": lambda: TextFormatter(text_format),
+    "json": JsonFormatter,
+}
+
+# the handler and listener of the current configuration
+_handler = None
+_listener = None
+
+
+def configure_logging(config, stream=None):
+    """Configures the root logger from the app configuration
+
+    Calling it again replaces the previous configuration, e.g. for
+    each app of the tests.
+
+    Args:
+        config (dict): the configuration, see the module keys
+        stream: the output, stdout by default
+    """
+    global _handler, _listener
+    root = logging.getLogger()
+    stop_logging()
+
+    output = logging.StreamHandler(stream or sys.stdout)
+    output.setFormatter(formatters[config.get("LOG_FORMAT", "text")]())
+    _handler = RecordQueueHandler(queue.SimpleQueue())
+    _handler.setFormatter(logging.Formatter())
+    _handler.addFilter(
+        SamplingFilter(
+            config.get("LOG_SAMPLE_LIMIT", 0),
+            config.get("LOG_SAMPLE_INTERVAL", 60),
+            config.get("LOG_SAMPLE_LOGGERS", ()),
+        )
+    )
+    _listener = QueueListener(_handler.queue, output, respect_handler_level=True)
+    _listener.start()
+    root.addHandler(_handler)
+
+    root.setLevel(str(config.get("LOG_LEVEL", "INFO")).upper())
+    for name, level in config.get("LOG_LEVELS", {}).items():
+        logging.getLogger(name).setLevel(str(level).upper())
+
+
+def stop_logging():
+    """Writes the queued records, and removes the queue handler"""
+    global _handler, _listener
+    if _handler is not None:
+        logging.getLogger().removeHandler(_handler)
+    if _listener is not None:
+        _listener.stop()
+    _handler = _listener = None
+
+
+atexit.register(stop_logging)
@@ -1,18 +1,31 @@
 """Use an omero server to authenticate user and gather group info
 
 This is heaviliy inspired by https://flask-ldap3-login.readthedocs.io/
+
+The Ice calls of a login block the calling thread, so they are run in a
+bounded pool of native threads, which under a gevent worker keeps the
+hub serving the other requests while a login waits for the server.
 """
+import hashlib
+import hmac
 import logging
+import os
+import threading
+import time
+from concurrent.futures import TimeoutError as FuturesTimeout
+from enum import Enum
 
+from cataloger.utils import native_executor
 
-import omero
-from flask_ldap3_login import AuthenticationResponseStatus
 
-from omero.gateway import BlitzGateway
-from enum import Enum
+log = logging.getLogger(__name__)
 
 
-log = logging.getLogger(__name__)
+class AuthenticationResponseStatus(Enum):
+    """The status of a login, as in flask-ldap3-login"""
+
+    fail = 0
+    success = 1
 
 
 class AuthenticationResponse:
@@ -37,11 +50,35 @@ class AuthenticationResponse:
 
 
 class OmeroLoginManager:
-    def __init__(self, app=None):
+    """Authenticates users against an omero server
+
+    Successful logins are remembered for ``OMERO_USER_INFO_TIMEOUT``
+    seconds, with a digest of the password, so that logging in again
+    with the same credentials does not open a new omero session.
+
+    Args:
+        app (flask.Flask): the app, if not initialized later
+        client_factory: called with host and port to make the omero
+            client, ``omero.client`` by default
+        gateway_factory: called with the client as ``client_obj`` to
+            make the connection, ``BlitzGateway`` by default
+    """
+
+    def __init__(self, app=None, client_factory=None, gateway_factory=None):
 
         self.app = app
         self.config = {}
+        self.client_factory = client_factory
+        self.gateway_factory = gateway_factory
         self._save_user = None
+        self._lock = threading.Lock()
+        self._executor = None
+        self._pid = None
+        # key of the password digests, kept in memory only
+        self._key = os.urandom(16)
+        self._user_infos = {}
+        # the errors of a failed login, with the Ice and omero ones once imported
+        self._login_errors = (OSError,)
         if app is not None:
             self.init_app(app)
 
@@ -67,30 +104,115 @@ class OmeroLoginManager:
         self.config.update(config)
         self.config.setdefault("OMERO_PORT", 4064)
         self.config.setdefault("OMERO_HOST", "localhost")
+        self.config.setdefault("OMERO_AUTH_WORKERS", 4)
+        self.config.setdefault("OMERO_AUTH_TIMEOUT", 20)
+        self.config.setdefault("OMERO_USER_INFO_TIMEOUT", 300)
         log.info(
             "Setting omero host to %s:%d",
             self.config["OMERO_HOST"],
             self.config["OMERO_PORT"],
         )
 
+    @property
+    def executor(self):
+        """The pool running the logins of the current process"""
+        with self._lock:
+            if self._pid != os.getpid():
+                self._executor = None
+                self._user_infos = {}
+                self._pid = os.getpid()
+            if self._executor is None:
+                self._executor = native_executor(
+                    self.config["OMERO_AUTH_WORKERS"], "omero"
+                )
+            return self._executor
+
+    def close(self):
+        """Shuts the login threads down"""
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False)
+            self._executor = None
+
+    def _digest(self, password):
+        return hmac.new(self._key, password.encode("utf-8"), hashlib.sha256).digest()
+
+    def _cached_user_info(self, username, password):
+        entry = self._user_infos.get(username)
+        if entry is None:
+            return None
+        expires, digest, info = entry
+        if expires < time.monotonic():
+            self._user_infos.pop(username, None)
+            return None
+        if not hmac.compare_digest(digest, self._digest(password)):
+            return None
+        return info
+
+    def _remember_user_info(self, username, password, info):
+        now = time.monotonic()
+        expires = now + self.config["OMERO_USER_INFO_TIMEOUT"]
+        self._user_infos = {
+            name: entry for name, entry in self._user_infos.items() if entry[0] > now
+        }
+        self._user_infos[username] = (expires, self._digest(password), info)
+
     def authenticate(self, username, password):
+        """Checks the credentials against the omero server
 
-        client = omero.client(
+        Returns:
+            AuthenticationResponse: with the user info if successful
+        """
+        info = self._cached_user_info(username, password)
+        if info is None:
+            future = self.executor.submit(self._fetch_user_info, username, password)
+            try:
+                info = future.result(timeout=self.config["OMERO_AUTH_TIMEOUT"])
+            except FuturesTimeout:
+                log.warning("Timed out logging %s in to OMERO", username)
+            except self._login_errors as e:
+                log.info("Could not log %s in to OMERO: %s", username, e)
+            if info is not None:
+                self._remember_user_info(username, password, info)
+
+        if info is None:
+            return AuthenticationResponse(
+                status=AuthenticationResponseStatus.fail, user_info={}
+            )
+        return AuthenticationResponse(
+            status=AuthenticationResponseStatus.success, user_info=info
+        )
+
+    def _fetch_user_info(self, username, password):
+        """The user info, or None, from a new omero session closed after use
+
+        Runs in the login threads.
+        """
+        client_factory, gateway_factory = self.client_factory, self.gateway_factory
+        if client_factory is None or gateway_factory is None:
+            # Ice takes long to import, only do it for the first login
+            import Ice
+            import omero
+            from omero.gateway import BlitzGateway
+
+            self._login_errors = (Ice.Exception, omero.ClientError, OSError)
+            client_factory = client_factory or omero.client
+            gateway_factory = gateway_factory or BlitzGateway
+        client = client_factory(
             host=self.config["OMERO_HOST"], port=self.config["OMERO_PORT"]
         )
-        session = client.createSession(username, password)
-        with BlitzGateway(client_obj=client) as conn:
-            if conn.isConnected():
+        try:
+            client.createSession(username, password)
+            conn = gateway_factory(client_obj=client)
+            try:
+                if not conn.isConnected():
+                    return None
                 log.info("succesfully connected to OMERO")
-                response = AuthenticationResponse(
-                    status=AuthenticationResponseStatus.success,
-                    user_info=self.get_user_info(conn),
-                )
-            else:
-                response = AuthenticationResponse(
-                    status=AuthenticationResponseStatus.fail, user_info={}
-                )
-        return response
+                return self.get_user_info(conn)
+            finally:
+                conn.close()
+        finally:
+            client.closeSession()
 
     def get_user_info(self, conn):
         user = conn.getUser()
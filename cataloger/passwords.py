@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+"""Hashing and checking of the local passwords
+
+bcrypt is CPU bound by design, and each hash takes hundreds of
+milliseconds at the production cost. Run inline in a gevent worker, it
+would hold every other request of the process for as long, so hashes
+are computed in a small pool of native threads instead, bcrypt
+releasing the GIL while it works.
+"""
+import os
+import threading
+
+from cataloger.utils import native_executor
+
+
+def hash_rounds(pw_hash):
+    """The cost (log rounds) of a bcrypt hash, e.g. 13 for "$2b$13$..." """
+    if isinstance(pw_hash, bytes):
+        pw_hash = pw_hash.decode("ascii")
+    return int(pw_hash.split("$")[2])
+
+
+class PasswordHasher:
+    """Runs the bcrypt calls of `flask_bcrypt` in a pool of threads
+
+    At most ``queue_size`` calls wait for the ``workers`` threads, later
+    callers wait for a free place, so that a burst of logins can not
+    pile up unbounded work. With no workers, calls run inline.
+
+    Args:
+        bcrypt (flask_bcrypt.Bcrypt): the configured extension
+        workers (int): number of hashing threads per process
+        queue_size (int): number of calls waiting for a thread
+    """
+
+    def __init__(self, bcrypt=None, workers=2, queue_size=32):
+        self.bcrypt = bcrypt
+        self.workers = workers
+        self.queue_size = queue_size
+        self._lock = threading.Lock()
+        self._executor = None
+        self._slots = None
+        self._pid = None
+
+    def init_app(self, app):
+        """Reads the pool settings from the app configuration"""
+        self.workers = app.config.get("PASSWORD_WORKERS", self.workers)
+        self.queue_size = app.config.get("PASSWORD_QUEUE_SIZE", self.queue_size)
+
+    @property
+    def rounds(self):
+        """The configured cost of the new hashes"""
+        return self.bcrypt._log_rounds
+
+    def _pool(self):
+        with self._lock:
+            if self._pid != os.getpid():
+                self._executor = None
+                self._pid = os.getpid()
+            if self._executor is None:
+                self._executor = native_executor(self.workers, "bcrypt")
+                self._slots = threading.BoundedSemaphore(self.workers + self.queue_size)
+            return self._executor, self._slots
+
+    def _run(self, func, *args):
+        if not self.workers:
+            return func(*args)
+        executor, slots = self._pool()
+        with slots:
+            return executor.submit(func, *args).result()
+
+    def close(self):
+        """Shuts the hashing threads down"""
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False)
+            self._executor = None
+
+    def hash(self, password):
+        """The bcrypt hash of password, at the configured cost"""
+        return self._run(self.bcrypt.generate_password_hash, password)
+
+    def check(self, pw_hash, password):
+        """Whether password matches the bcrypt hash"""
+        return self._run(self.bcrypt.check_password_hash, pw_hash, password)
+
+    def needs_rehash(self, pw_hash):
+        """Whether the hash cost differs from the configured one"""
+        return hash_rounds(pw_hash) != self.rounds
@@ -5,10 +5,9 @@ import logging
 from flask_wtf import FlaskForm
 from wtforms import PasswordField, StringField
 from wtforms.validators import DataRequired
-from flask_ldap3_login import AuthenticationResponseStatus
 
 from cataloger.user.models import User
-from cataloger.extensions import auth_manager
+from cataloger.extensions import auth_backend
 
 log = logging.getLogger(__name__)
 
@@ -36,17 +35,20 @@ class LoginForm(FlaskForm):
             self.username.errors.append("Unknown username")
             return False
 
-        if auth_manager is not None:
-            response = auth_manager.authenticate(self.username.data, self.password.data)
-            if response.status == AuthenticationResponseStatus.success:
-                log.info("Logged in through %s", auth_manager.__class__.__name__)
-                return True
+        if auth_backend.authenticate(self.username.data, self.password.data):
+            log.info("Logged in through %s", auth_backend.method)
+            return True
 
         # Fallback to local authentication
         if not self.user.check_password(self.password.data):
             self.password.errors.append("Invalid password")
             return False
 
+        if self.user.password_needs_rehash:
+            self.user.set_password(self.password.data)
+            self.user.save()
+            log.info("Hashed the password of %s again", self.user.username)
+
         if not self.user.active:
             self.username.errors.append("User not activated")
             return False
@@ -13,8 +13,9 @@ from flask import (
 )
 from flask_login import login_required, login_user, logout_user
 
-from cataloger.extensions import login_manager, ldap_manager, omero_manager
+from cataloger.extensions import auth_backend, login_manager
 from cataloger.public.forms import LoginForm
+from cataloger.user.cache import user_cache
 from cataloger.user.forms import RegisterForm, NewGroupForm
 from cataloger.user.models import User, Group
 from cataloger.utils import flash_errors, get_url_prefix
@@ -29,11 +30,11 @@ log = logging.getLogger(__name__)
 
 @login_manager.user_loader
 def load_user(user_id):
-    """Load user by ID."""
-    return User.get_by_id(int(user_id))
+    """Load user by ID, from the users cache."""
+    return user_cache.get(int(user_id))
 
 
-@omero_manager.save_user
+@auth_backend.save_user("OMERO")
 def save_user_omero(user_info):
 
     username = user_info["username"]
@@ -74,7 +75,7 @@ def save_user_omero(user_info):
     return user
 
 
-@ldap_manager.save_user
+@auth_backend.save_user("LDAP")
 def save_user_ldap(dn, username, user_info, memberships):
     """Saves a user that managed to log in with LDAP
 
@@ -129,11 +130,7 @@ def save_user_ldap(dn, username, user_info, memberships):
 def home():
     """Home page."""
     form = LoginForm(request.form)
-    current_app.logger.info("Hello from the home page!")
     # Handle logging in
-    current_app.logger.info("request root: %s", request.script_root)
-    current_app.logger.info("request path: %s", request.path)
-    current_app.logger.info("request method: %s", request.method)
     if request.method == "POST":
         if form.validate_on_submit():
             login_user(form.user)
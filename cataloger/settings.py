@@ -16,15 +16,60 @@ DEBUG = ENV == "development"
 SQLALCHEMY_DATABASE_URI = env.str("DATABASE_URL")
 SECRET_KEY = env.str("SECRET_KEY")
 SEND_FILE_MAX_AGE_DEFAULT = env.int("SEND_FILE_MAX_AGE_DEFAULT")
+# Logging, see cataloger.logs
+LOG_LEVEL = env.str("LOG_LEVEL", default="info").upper()
+# e.g. LOG_LEVELS=sqlalchemy.engine=info,cataloger.bioportal=debug
+LOG_LEVELS = env.dict("LOG_LEVELS", default={})
+LOG_FORMAT = env.str("LOG_FORMAT", default="text")  # or "json"
+# at most LOG_SAMPLE_LIMIT records of a message per interval, 0 to keep them all
+LOG_SAMPLE_LIMIT = env.int("LOG_SAMPLE_LIMIT", default=0)
+LOG_SAMPLE_INTERVAL = env.int("LOG_SAMPLE_INTERVAL", default=60)
+# e.g. LOG_SAMPLE_LOGGERS=werkzeug, all the loggers if empty
+LOG_SAMPLE_LOGGERS = env.list("LOG_SAMPLE_LOGGERS", default=[])
 BCRYPT_LOG_ROUNDS = env.int("BCRYPT_LOG_ROUNDS", default=13)
+# Passwords are hashed by PASSWORD_WORKERS threads, PASSWORD_QUEUE_SIZE calls waiting
+PASSWORD_WORKERS = env.int("PASSWORD_WORKERS", default=2)
+PASSWORD_QUEUE_SIZE = env.int("PASSWORD_QUEUE_SIZE", default=32)
 DEBUG_TB_ENABLED = DEBUG
 DEBUG_TB_INTERCEPT_REDIRECTS = False
-CACHE_TYPE = "simple"  # Can be "memcached", "redis", etc.
+CACHE_TYPE = env.str("CACHE_TYPE", default="simple")  # "filesystem", "redis", etc.
+CACHE_DIR = env.str("CACHE_DIR", default=None)  # for the filesystem cache
+CACHE_REDIS_URL = env.str("CACHE_REDIS_URL", default=None)
+CACHE_THRESHOLD = env.int("CACHE_THRESHOLD", default=5000)
+BIOPORTAL_API_KEY = env.str("BIOPORTAL_API_KEY", default=None)
+BIOPORTAL_URL = env.str("BIOPORTAL_URL", default="https://data.bioontology.org")
+BIOPORTAL_CONNECT_TIMEOUT = env.float("BIOPORTAL_CONNECT_TIMEOUT", default=3.05)
+BIOPORTAL_READ_TIMEOUT = env.float("BIOPORTAL_READ_TIMEOUT", default=10)
+BIOPORTAL_RETRIES = env.int("BIOPORTAL_RETRIES", default=2)
+# Search each ontology concurrently, waiting at most BIOPORTAL_FANOUT_DEADLINE seconds
+BIOPORTAL_FANOUT = env.bool("BIOPORTAL_FANOUT", default=False)
+BIOPORTAL_FANOUT_DEADLINE = env.float("BIOPORTAL_FANOUT_DEADLINE", default=5)
+# Bioportal search results time to live (in seconds) and per worker LRU size
+BIOPORTAL_CACHE_TIMEOUT = env.int("BIOPORTAL_CACHE_TIMEOUT", default=24 * 3600)
+BIOPORTAL_CACHE_SIZE = env.int("BIOPORTAL_CACHE_SIZE", default=256)
+# Search results presented to a user are kept SUGGESTIONS_TIMEOUT seconds,
+# up to SUGGESTIONS_MAX_TERMS terms per search
+SUGGESTIONS_TIMEOUT = env.int("SUGGESTIONS_TIMEOUT", default=1800)
+SUGGESTIONS_MAX_TERMS = env.int("SUGGESTIONS_MAX_TERMS", default=100)
+# Annotation labels completion indices are reloaded after COMPLETION_TTL seconds
+COMPLETION_TTL = env.int("COMPLETION_TTL", default=300)
+# Cached choices of the card forms expire after CHOICES_TIMEOUT seconds
+CHOICES_TIMEOUT = env.int("CHOICES_TIMEOUT", default=3600)
+# Rendered cards are kept in cache for CARD_FRAGMENT_TIMEOUT seconds
+CARD_FRAGMENT_TIMEOUT = env.int("CARD_FRAGMENT_TIMEOUT", default=24 * 3600)
+# Changes feeds leave out the changes of the last CHANGES_LAG seconds
+CHANGES_LAG = env.int("CHANGES_LAG", default=5)
+# and read again the changes of the last CHANGES_WINDOW seconds once read to the end
+CHANGES_WINDOW = env.int("CHANGES_WINDOW", default=300)
+# The identity of the logged in users is cached for USER_CACHE_TIMEOUT seconds
+USER_CACHE_TIMEOUT = env.int("USER_CACHE_TIMEOUT", default=300)
+# Number of cards per page of the cards listings
+CARDS_PER_PAGE = env.int("CARDS_PER_PAGE", default=24)
 SQLALCHEMY_TRACK_MODIFICATIONS = False
 APPLICATION_ROOT = "/"
 SCRIPT_NAME = "/"
 
-AUTH_METHOD = env.str("AUTH_METHOD")  # can be 'LDAP', 'OMERO'
+AUTH_METHOD = env.str("AUTH_METHOD", default="LOCAL")  # can be 'LDAP', 'OMERO'
 
 if AUTH_METHOD == "LDAP":
     LDAP_PORT = env.int("LDAP_PORT", 369)
@@ -47,3 +92,8 @@ if AUTH_METHOD == "LDAP":
 elif AUTH_METHOD == "OMERO":
     OMERO_HOST = env.str("OMERO_HOST", "localhost")
     OMERO_PORT = env.int("OMERO_PORT", 4064)
+    # Logins run in OMERO_AUTH_WORKERS threads, for at most OMERO_AUTH_TIMEOUT seconds
+    OMERO_AUTH_WORKERS = env.int("OMERO_AUTH_WORKERS", 4)
+    OMERO_AUTH_TIMEOUT = env.int("OMERO_AUTH_TIMEOUT", 20)
+    # Successful logins are remembered for OMERO_USER_INFO_TIMEOUT seconds
+    OMERO_USER_INFO_TIMEOUT = env.int("OMERO_USER_INFO_TIMEOUT", 300)
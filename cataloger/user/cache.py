@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+"""Cached identity of the logged in users
+
+The user loader of flask_login runs on each request of a logged in
+user. Instead of the `User` row and its group, it gets a `CachedUser`
+from the shared ``flask_caching`` backend, with the few attributes
+the views and templates need to identify the user. Entries are
+deleted once a change of their user is committed, and expire after
+``USER_CACHE_TIMEOUT`` seconds, e.g. after a group is renamed.
+"""
+from flask_login import UserMixin
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from cataloger.database import db
+from cataloger.extensions import cache
+from cataloger.user.models import Group, User
+
+
+class CachedUser(UserMixin):
+    """The identity of a user, as stored in the cache
+
+    The `Group` row is only loaded when the `group` is used.
+    """
+
+    fields = ("id", "username", "group_id", "groupname", "is_admin", "active")
+
+    def __init__(self, **kwargs):
+        for field in self.fields:
+            setattr(self, field, kwargs.get(field))
+
+    @property
+    def group(self):
+        """The Group row, or None"""
+        return Group.get_by_id(self.group_id) if self.group_id else None
+
+    def __repr__(self):
+        return f"<CachedUser({self.username!r})>"
+
+
+class UserCache:
+    """Per user id cache of `CachedUser`
+
+    Args:
+        backend (flask_caching.Cache): the shared cache
+        timeout (int): time to live of an entry in seconds
+    """
+
+    prefix = "users/"
+
+    def __init__(self, backend=None, timeout=300):
+        self.backend = backend
+        self.timeout = timeout
+
+    def init_app(self, app):
+        """Reads the cache settings from the app configuration"""
+        self.timeout = app.config.get("USER_CACHE_TIMEOUT", self.timeout)
+
+    def get(self, user_id):
+        """The CachedUser of user_id, None if there is no such user"""
+        key = f"{self.prefix}{user_id}"
+        data = self.backend.get(key)
+        if data is None:
+            row = (
+                db.session.query(
+                    User.id,
+                    User.username,
+                    User.group_id,
+                    Group.groupname,
+                    User.is_admin,
+                    User.active,
+                )
+                .outerjoin(Group, Group.id == User.group_id)
+                .filter(User.id == user_id)
+                .first()
+            )
+            if row is None:
+                return None
+            data = dict(zip(CachedUser.fields, row))
+            self.backend.set(key, data, timeout=self.timeout)
+        return CachedUser(**data)
+
+    def invalidate(self, *user_ids):
+        """Deletes the entries of the users"""
+        # delete_many stops at the first key that is not cached
+        for id_ in user_ids:
+            self.backend.delete(f"{self.prefix}{id_}")
+
+
+user_cache = UserCache(cache)
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_users(session, flush_context):
+    user_ids = {
+        instance.id
+        for instance in session.dirty | session.deleted
+        if isinstance(instance, User)
+    }
+    if user_ids:
+        session.info.setdefault("user_ids", set()).update(user_ids)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_users(session):
+    user_ids = session.info.pop("user_ids", None)
+    if user_ids:
+        user_cache.invalidate(*user_ids)
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_users(session):
+    session.info.pop("user_ids", None)
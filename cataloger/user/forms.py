@@ -16,7 +16,6 @@ from wtforms.validators import DataRequired, EqualTo, Length
 from flask import current_app
 
 from flask_login import current_user
-from flask_ldap3_login.forms import LDAPLoginForm
 
 from cataloger.omero_login import AuthenticationResponseStatus
 
@@ -167,10 +166,14 @@ env = Env()
 env.read_env()
 
 
-if env.str("AUTH_METHOD") == "OMERO":
+auth_method = env.str("AUTH_METHOD", default="LOCAL")
+
+if auth_method == "OMERO":
     RegisterForm = OmeroLoginForm
 
-elif env.str("AUTH_METHOD") == "LDAP":
+elif auth_method == "LDAP":
+    from flask_ldap3_login.forms import LDAPLoginForm
+
     RegisterForm = LDAPLoginForm
 else:
     RegisterForm = LocalRegisterForm
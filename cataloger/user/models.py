@@ -10,7 +10,7 @@ from cataloger.database import (
     reference_col,
     relationship,
 )
-from cataloger.extensions import bcrypt
+from cataloger.extensions import passwords
 
 
 class Role(PkModel):
@@ -56,17 +56,27 @@ class User(UserMixin, PkModel):
 
     def set_password(self, password):
         """Set password."""
-        self.password = bcrypt.generate_password_hash(password)
+        self.password = passwords.hash(password)
 
     def check_password(self, value):
         """Check password."""
-        return bcrypt.check_password_hash(self.password, value)
+        return passwords.check(self.password, value)
+
+    @property
+    def password_needs_rehash(self):
+        """Whether the password was hashed at another cost than the configured one"""
+        return self.password is not None and passwords.needs_rehash(self.password)
 
     @property
     def full_name(self):
         """Full user name."""
         return f"{self.first_name} {self.last_name}"
 
+    @property
+    def groupname(self):
+        """The name of the user group, or None, as `CachedUser.groupname`"""
+        return self.group.groupname if self.group else None
+
     def __repr__(self):
         """Represent instance as a unique string."""
         return f"<User({self.username!r})>"
@@ -76,7 +86,7 @@ class Group(PkModel):
     """A group of users"""
 
     __tablename__ = "groups"
-    groupname = Column(db.String(30), nullable=False)
+    groupname = Column(db.String(30), nullable=False, index=True)
     active = Column(db.Boolean(), default=False)
 
     def __init__(self, groupname, **kwargs):
@@ -3,7 +3,7 @@
 from flask import Blueprint, render_template, request, flash, url_for, redirect
 from flask_login import login_required, current_user
 
-from cataloger.annotations.models import Card
+from cataloger.annotations.views import render_cards
 from cataloger.utils import flash_errors, get_url_prefix
 from cataloger.user.models import User, Group
 from cataloger.user.forms import EditUserForm, CreateUserForm
@@ -17,10 +17,7 @@ blueprint = Blueprint(
 @login_required
 def cards():
     """List cards"""
-
-    user_id = current_user.id
-    cards = Card.query.filter_by(user_id=user_id)
-    return render_template("annotations/cards.html", cards=cards)
+    return render_cards("user")
 
 
 @blueprint.route("/edit_user/<username>", methods=["GET", "POST"])
@@ -29,7 +26,7 @@ def edit_user(username):
     """Edit user settings"""
     form = EditUserForm(request.form)
     if username == "me":
-        form.user = current_user
+        form.user = User.get_by_id(current_user.id)
         form.user.password = None
     elif current_user.id == 1:  # cheap is_admin test, FIXME
         form.user = User.query.filter_by(username=username).first()
@@ -1,5 +1,7 @@
 # -*- coding: utf-8 -*-
 """Helper utilities and decorators."""
+from concurrent.futures import ThreadPoolExecutor
+
 from flask import flash
 
 
@@ -12,3 +14,19 @@ def flash_errors(form, category="warning"):
     for field, errors in form.errors.items():
         for error in errors:
             flash(f"{getattr(form, field).label.text} - {error}", category)
+
+
+def native_executor(max_workers, name):
+    """A pool of native threads, even when threading is monkey patched
+
+    Under a gevent worker, waiting for the pool yields to the other
+    greenlets, while blocking or CPU bound calls run in the threads.
+    """
+    try:
+        from gevent import monkey
+        from gevent.threadpool import ThreadPoolExecutor as GeventExecutor
+    except ImportError:
+        monkey = None
+    if monkey is not None and monkey.is_module_patched("threading"):
+        return GeventExecutor(max_workers=max_workers)
+    return ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
@@ -0,0 +1,74 @@
+"""full text index of the cards
+
+Revision ID: f3c8d1e6a2b4
+Revises: e7f3a2b9c4d1
+Create Date: 2026-10-17 18:40:12.562093
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f3c8d1e6a2b4'
+down_revision = 'e7f3a2b9c4d1'
+branch_labels = None
+depends_on = None
+
+# the card_search table is not part of the models metadata, see
+# cataloger.annotations.search
+create = {
+    'postgresql': (
+        'CREATE TABLE card_search ('
+        'card_id INTEGER PRIMARY KEY REFERENCES cards (id) ON DELETE CASCADE, '
+        'document TSVECTOR NOT NULL)',
+        'CREATE INDEX ix_card_search_document ON card_search USING gin (document)',
+    ),
+    'sqlite': (
+        'CREATE VIRTUAL TABLE card_search USING fts5('
+        "title, body, tokenize = 'unicode61 remove_diacritics 2')",
+    ),
+}
+
+body = (
+    "COALESCE(c.comment, '')"
+    " || ' ' || COALESCE(p.label, '') || ' ' || COALESCE(o.label, '')"
+    " || ' ' || COALESCE(s.label, '') || ' ' || COALESCE(pr.label, '')"
+    " || ' ' || COALESCE(m.label, '') || ' ' || COALESCE(("
+    "SELECT {aggregate}(g.label, ' ') FROM gene_mode_card gc "
+    "JOIN gene_mods g ON g.id = gc.gene_mod_id WHERE gc.card_id = c.id), '')"
+)
+joins = (
+    'FROM cards c '
+    'LEFT JOIN projects p ON p.id = c.project_id '
+    'LEFT JOIN organisms o ON o.id = c.organism_id '
+    'LEFT JOIN samples s ON s.id = c.sample_id '
+    'LEFT JOIN processes pr ON pr.id = c.process_id '
+    'LEFT JOIN methods m ON m.id = c.method_id'
+)
+backfill = {
+    'postgresql': (
+        'INSERT INTO card_search (card_id, document) SELECT c.id, '
+        "setweight(to_tsvector('simple', c.title), 'A') || "
+        f"setweight(to_tsvector('simple', {body.format(aggregate='string_agg')}), 'B') "
+        f'{joins}'
+    ),
+    'sqlite': (
+        'INSERT INTO card_search (rowid, title, body) SELECT c.id, c.title, '
+        f"{body.format(aggregate='group_concat')} {joins}"
+    ),
+}
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect not in create:
+        return
+    for statement in create[dialect]:
+        op.execute(statement)
+    op.execute(backfill[dialect])
+
+
+def downgrade():
+    if op.get_bind().dialect.name in create:
+        op.execute('DROP TABLE IF EXISTS card_search')
@@ -1,10 +1,21 @@
 # -*- coding: utf-8 -*-
 """Factories to help in tests."""
-from factory import PostGenerationMethodCall, Sequence
+from factory import PostGenerationMethodCall, Sequence, SubFactory
 from factory.alchemy import SQLAlchemyModelFactory
 
+from cataloger.annotations.models import (
+    Card,
+    Gene,
+    GeneMod,
+    Marker,
+    Method,
+    Organism,
+    Process,
+    Project,
+    Sample,
+)
 from cataloger.database import db
-from cataloger.user.models import User
+from cataloger.user.models import Group, User
 
 
 class BaseFactory(SQLAlchemyModelFactory):
@@ -17,6 +28,18 @@ class BaseFactory(SQLAlchemyModelFactory):
         sqlalchemy_session = db.session
 
 
+class GroupFactory(BaseFactory):
+    """Group factory."""
+
+    groupname = Sequence(lambda n: f"group{n}")
+    active = True
+
+    class Meta:
+        """Factory configuration."""
+
+        model = Group
+
+
 class UserFactory(BaseFactory):
     """User factory."""
 
@@ -29,3 +52,111 @@ class UserFactory(BaseFactory):
         """Factory configuration."""
 
         model = User
+
+
+class AnnotationFactory(BaseFactory):
+    """Base annotation factory."""
+
+    label = Sequence(lambda n: f"term {n}")
+    bioportal_id = Sequence(lambda n: f"http://purl.obolibrary.org/obo/TERM_{n}")
+    user = SubFactory(UserFactory)
+    group = SubFactory(GroupFactory)
+
+    class Meta:
+        """Factory configuration."""
+
+        abstract = True
+
+
+class ProjectFactory(AnnotationFactory):
+    """Project factory."""
+
+    class Meta:
+        """Factory configuration."""
+
+        model = Project
+
+
+class OrganismFactory(AnnotationFactory):
+    """Organism factory."""
+
+    class Meta:
+        """Factory configuration."""
+
+        model = Organism
+
+
+class SampleFactory(AnnotationFactory):
+    """Sample factory."""
+
+    class Meta:
+        """Factory configuration."""
+
+        model = Sample
+
+
+class ProcessFactory(AnnotationFactory):
+    """Process factory."""
+
+    class Meta:
+        """Factory configuration."""
+
+        model = Process
+
+
+class MethodFactory(AnnotationFactory):
+    """Method factory."""
+
+    class Meta:
+        """Factory configuration."""
+
+        model = Method
+
+
+class GeneFactory(AnnotationFactory):
+    """Gene factory."""
+
+    class Meta:
+        """Factory configuration."""
+
+        model = Gene
+
+
+class MarkerFactory(AnnotationFactory):
+    """Marker factory."""
+
+    class Meta:
+        """Factory configuration."""
+
+        model = Marker
+
+
+class GeneModFactory(AnnotationFactory):
+    """Gene modification factory."""
+
+    gene = SubFactory(GeneFactory)
+    marker = SubFactory(MarkerFactory)
+
+    class Meta:
+        """Factory configuration."""
+
+        model = GeneMod
+
+
+class CardFactory(BaseFactory):
+    """Card factory."""
+
+    title = Sequence(lambda n: f"Card {n}")
+    comment = "Observed Process :\n\n#mitosis in the #embryo"
+    user = SubFactory(UserFactory)
+    group = SubFactory(GroupFactory)
+    project = SubFactory(ProjectFactory)
+    organism = SubFactory(OrganismFactory)
+    sample = SubFactory(SampleFactory)
+    process = SubFactory(ProcessFactory)
+    method = SubFactory(MethodFactory)
+
+    class Meta:
+        """Factory configuration."""
+
+        model = Card
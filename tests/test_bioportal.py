@@ -0,0 +1,282 @@
+# -*- coding: utf-8 -*-
+"""Bioportal access tests."""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from flask import url_for
+from flask_caching.backends.simplecache import SimpleCache
+
+from cataloger.annotations import views
+from cataloger.annotations.models import Sample
+from cataloger.annotations.views import iter_bioportal
+from cataloger.bioportal import (
+    BioPortalClient,
+    BioPortalUnavailableError,
+    InvalidSearchError,
+    MissingApiKeyError,
+    SearchCache,
+)
+from cataloger.extensions import bioportal, suggestion_store
+
+from .test_functional import log_in
+
+
+class TestSearchCache:
+    """Bioportal search results cache."""
+
+    def test_key_is_normalized(self):
+        """Equivalent searches share the same key."""
+        key = SearchCache.make_key(q="Drosophila  ", ontologies="GO,MESH")
+        assert key == SearchCache.make_key(q="drosophila", ontologies="mesh, GO")
+        assert key != SearchCache.make_key(q="drosophila", ontologies="GO")
+        assert key == SearchCache.make_key(
+            q="drosophila", ontologies="GO,MESH", apikey="secret"
+        )
+
+    def test_get_set(self):
+        """Stored results are returned."""
+        cache = SearchCache(SimpleCache())
+        assert cache.get("key") is None
+        cache.set("key", {"id": "term"})
+        assert cache.get("key") == {"id": "term"}
+
+    def test_shared_backend(self):
+        """Results stored by a worker are seen by another."""
+        backend = SimpleCache()
+        SearchCache(backend).set("key", {"id": "term"})
+        assert SearchCache(backend).get("key") == {"id": "term"}
+
+    def test_expiry(self):
+        """Entries expire after the timeout."""
+        cache = SearchCache(SimpleCache(), timeout=-1)
+        cache.set("key", {"id": "term"})
+        assert cache.get("key") is None
+
+    def test_lru_eviction(self):
+        """The least recently used entry is evicted first."""
+        cache = SearchCache(None, maxsize=2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+        assert cache.get("a") == 1
+        assert cache.get("b") is None
+        assert cache.get("c") == 3
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Answers like the bioportal search endpoint."""
+
+    statuses = []
+    delay = 0
+    requests = []
+    errors = None
+
+    def do_GET(self):  # noqa: N802
+        """Serve a search result, or the next queued error status."""
+        self.requests.append((self.path, self.headers.get("Authorization")))
+        time.sleep(self.delay)
+        status = self.statuses.pop(0) if self.statuses else 200
+        if self.errors:
+            body = json.dumps({"errors": self.errors})
+        else:
+            body = json.dumps({"collection": [{"@id": "term", "prefLabel": "GFP"}]})
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body.encode())
+
+    def log_message(self, *args):
+        """Keep quiet."""
+
+
+@pytest.fixture
+def stub_server():
+    """A local server standing for bioportal."""
+    StubHandler.statuses = []
+    StubHandler.delay = 0
+    StubHandler.requests = []
+    StubHandler.errors = None
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def client(stub_server):
+    """A bioportal client talking to the stub server."""
+    client = BioPortalClient()
+    client.init_config(
+        {
+            "BIOPORTAL_URL": "http://127.0.0.1:%d" % stub_server.server_port,
+            "BIOPORTAL_API_KEY": "secret",
+            "BIOPORTAL_READ_TIMEOUT": 0.5,
+            "BIOPORTAL_BACKOFF": 0,
+            "BIOPORTAL_BREAKER_THRESHOLD": 2,
+        }
+    )
+    yield client
+    client.close()
+
+
+class TestBioPortalClient:
+    """Bioportal http client."""
+
+    def test_search(self, client):
+        """Search results are returned."""
+        response = client.search("GFP", ontologies="GO")
+        assert response["collection"][0]["prefLabel"] == "GFP"
+        path, auth = StubHandler.requests[0]
+        assert path.startswith("/search?q=GFP")
+        assert auth == "apikey token=secret"
+
+    def test_invalid_search(self, client):
+        """Search errors are reported."""
+        StubHandler.errors = ["Unknown ontology"]
+        with pytest.raises(InvalidSearchError, match="Unknown ontology"):
+            client.search("GFP", ontologies="FOO")
+
+    def test_missing_api_key(self, client):
+        """Searches fail without an API key, before any request."""
+        client.config["BIOPORTAL_API_KEY"] = None
+        with pytest.raises(MissingApiKeyError, match="BIOPORTAL_API_KEY"):
+            client.search("GFP")
+        assert StubHandler.requests == []
+
+    def test_session_is_reused(self, client):
+        """The same session serves all requests."""
+        session = client.session
+        client.search("GFP")
+        client.search("RFP")
+        assert client.session is session
+
+    def test_retries(self, client):
+        """Transient errors are retried."""
+        StubHandler.statuses = [503, 502]
+        response = client.search("GFP")
+        assert response["collection"]
+        assert len(StubHandler.requests) == 3
+
+    def test_timeout(self, client):
+        """A hanging service does not hang the caller."""
+        client.config["BIOPORTAL_RETRIES"] = 0
+        client.close()
+        StubHandler.delay = 1
+        with pytest.raises(BioPortalUnavailableError):
+            client.search("GFP")
+
+    def test_circuit_breaker(self, client):
+        """Calls fail fast once the service is down."""
+        StubHandler.statuses = [503] * 6
+        for _ in range(2):
+            with pytest.raises(BioPortalUnavailableError):
+                client.search("GFP")
+        assert client.breaker.state == "open"
+        n_requests = len(StubHandler.requests)
+        with pytest.raises(BioPortalUnavailableError):
+            client.search("GFP")
+        assert len(StubHandler.requests) == n_requests
+
+    def test_circuit_breaker_recovers(self, client):
+        """The circuit closes when the service is back."""
+        client.breaker.reset_timeout = 0
+        for _ in range(2):
+            client.breaker.record_failure()
+        assert client.breaker.state == "half-open"
+        assert client.search("GFP")["collection"]
+        assert client.breaker.state == "closed"
+
+
+class TestFanOut:
+    """Concurrent search of each ontology."""
+
+    @staticmethod
+    def search(q, ontologies, **params):
+        """Fake bioportal search, slow for the SLOW ontology."""
+        if ontologies == "SLOW":
+            time.sleep(1)
+        if ontologies == "BAD":
+            raise InvalidSearchError("Unknown ontology")
+        if ontologies == "MALFORMED":
+            raise BioPortalUnavailableError("Invalid response from bioportal")
+        term = {
+            "@id": f"{ontologies}/{q}",
+            "prefLabel": q,
+            "links": {
+                "ontology": f"http://data.bioontology.org/ontologies/{ontologies}"
+            },
+        }
+        return {"collection": [term]}
+
+    def test_partial_results(self, app, monkeypatch):
+        """Results are yielded as they come, slow ontologies are skipped."""
+        monkeypatch.setattr(bioportal, "search", self.search)
+        found = dict(
+            iter_bioportal("fanout", ["GO", "SLOW", "BAD", "MALFORMED", "PR"], 0.5)
+        )
+        assert set(found) == {"GO", "PR"}
+        assert list(found["GO"]) == ["GO/fanout"]
+
+    def test_stream(self, user, testapp, monkeypatch):
+        """The choices of each ontology are streamed as JSON lines."""
+        monkeypatch.setattr(bioportal, "search", self.search)
+        monkeypatch.setitem(views.ontologies, Sample, ("GO", "MALFORMED", "PR"))
+        log_in(user, testapp)
+        url = url_for("cards.stream_suggestions", kind="samples", key="select_sample")
+        res = testapp.get(url, params={"search_term": "wing"})
+        assert res.content_type == "application/x-ndjson"
+        lines = [json.loads(line) for line in res.text.splitlines()]
+        assert sorted(line["ontology"] for line in lines) == ["GO", "PR"]
+        assert ["GO/wing", "wing \t (GO)"] in [
+            choice for line in lines for choice in line["choices"]
+        ]
+        testapp.get(url, status=404)
+        testapp.get("/cards/suggestions/users?search_term=wing", status=404)
+
+
+class TestSuggestionStore:
+    """Search results kept between requests."""
+
+    def test_put_get(self, app):
+        """A chosen term is found until discarded."""
+        suggestions = {f"term_{i}": {"prefLabel": str(i)} for i in range(200)}
+        suggestion_store.put("samples", suggestions)
+        assert suggestion_store.get("samples", "term_3") == {"prefLabel": "3"}
+        assert suggestion_store.get("samples", "term_150") is None
+        assert suggestion_store.get("methods", "term_3") is None
+        suggestion_store.discard("samples")
+        assert suggestion_store.get("samples", "term_3") is None
+
+    def test_search_choices(self, user, testapp, monkeypatch):
+        """Only the stored suggestions are presented, and can be chosen."""
+        terms = {
+            f"GO/{i}": {
+                "@id": f"GO/{i}",
+                "prefLabel": f"wing {i}",
+                "links": {"ontology": "http://data.bioontology.org/ontologies/GO"},
+            }
+            for i in range(150)
+        }
+        monkeypatch.setattr(views, "search_bioportal", lambda *a, **kw: terms)
+        monkeypatch.setattr(suggestion_store, "max_terms", 20)
+        log_in(user, testapp)
+        url = url_for("cards.new_card")
+        res = testapp.post(url, {"select_sample-search": "wing"})
+        options = res.html.select("select[name='select_sample-select_new'] option")
+        assert len(options) == 20
+        res = testapp.post(url, {"select_sample-select_new": options[-1]["value"]})
+        assert "Term wing 19 registered" in res
+
+    def test_sessions_are_isolated(self, app):
+        """Concurrent users do not see each other suggestions."""
+        suggestion_store.put("samples", {"term": {"prefLabel": "GFP"}})
+        with app.test_request_context():
+            assert suggestion_store.get("samples", "term") is None
+        assert suggestion_store.get("samples", "term") == {"prefLabel": "GFP"}
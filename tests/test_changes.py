@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+"""Changes feeds tests."""
+import datetime as dt
+
+import pytest
+from flask import url_for
+
+from cataloger.annotations.changes import changes
+from cataloger.annotations.models import Card, Deletion
+
+from .factories import CardFactory, GroupFactory, ProjectFactory
+from .test_functional import log_in
+
+
+@pytest.mark.usefixtures("db")
+class TestChanges:
+    """Changes feeds."""
+
+    def test_annotation_versions(self, db):
+        """Annotation versions change with the annotation."""
+        project = ProjectFactory()
+        db.session.commit()
+        assert project.version == 1
+        project.update(label="renamed")
+        assert project.version == 2
+        assert project.updated_at >= project.created_at
+        project.save()
+        assert project.version == 2
+
+    def test_feed(self, db):
+        """Changes are read page by page, in the order of the changes."""
+        group = GroupFactory()
+        cards = [CardFactory(title=f"Card {i}", group=group) for i in range(3)]
+        other = CardFactory()
+        db.session.commit()
+        found, cursor, more = changes("cards", group.id, limit=2, lag=0, window=0)
+        assert found == cards[:2]
+        assert more
+        found, cursor, more = changes(
+            "cards", group.id, cursor, limit=2, lag=0, window=0
+        )
+        assert found == cards[2:]
+        assert not more
+        assert changes("cards", other.group_id, lag=0)[0] == [other]
+
+        cards[0].update(title="Edited")
+        found, cursor, more = changes("cards", group.id, cursor, lag=0, window=0)
+        assert found == cards[:1]
+        found, same, more = changes("cards", group.id, cursor, lag=0, window=0)
+        assert found == [] and same == cursor
+
+        # recent changes wait for the lag
+        assert changes("cards", group.id, lag=60)[0] == []
+        with pytest.raises(ValueError):
+            changes("cards", group.id, since="yesterday")
+        with pytest.raises(ValueError):
+            changes("cards", None, lag=0)
+
+    def test_window(self, db):
+        """Changes committed late are read again after the end of the feed."""
+        group = GroupFactory()
+        first, last, late = (CardFactory(title=f"Card {i}") for i in range(3))
+        db.session.commit()
+        start = dt.datetime.utcnow() - dt.timedelta(seconds=600)
+
+        def change(card, seconds):
+            db.session.execute(
+                Card.__table__.update()
+                .where(Card.id == card.id)
+                .values(group_id=group.id, updated_at=start + dt.timedelta(0, seconds))
+            )
+            db.session.commit()
+
+        change(first, 0)
+        change(last, 100)
+        found, cursor, more = changes("cards", group.id, lag=0, window=60)
+        assert found == [first, last] and not more
+        _, end, _ = changes("cards", group.id, lag=0, window=0)
+        # flushed before the last card, committed after it was read
+        change(late, 50)
+        assert changes("cards", group.id, end, lag=0, window=0)[0] == []
+        found, cursor, more = changes("cards", group.id, cursor, lag=0, window=60)
+        assert found == [late, last] and not more
+        assert changes("cards", group.id, cursor, lag=0, window=60)[0] == found
+
+    def test_deletions(self, db):
+        """Deleted records are listed in the deletions feed."""
+        card = CardFactory()
+        db.session.commit()
+        card_id, group_id = card.id, card.group_id
+        card.delete()
+        (deletion,), _, _ = changes("deletions", group_id, lag=0)
+        assert isinstance(deletion, Deletion)
+        assert (deletion.kind, deletion.row_id) == ("cards", card_id)
+
+    def test_endpoint(self, user, testapp, app, db):
+        """The feeds are served as JSON for the user group."""
+        app.config["CHANGES_LAG"] = 0
+        app.config["CHANGES_WINDOW"] = 0
+        user.update(group=GroupFactory())
+        project = ProjectFactory(group=user.group)
+        card = CardFactory(
+            user=user, group=user.group, project=project, title="Synced card"
+        )
+        CardFactory(title="Other group")
+        db.session.commit()
+        log_in(user, testapp)
+        res = testapp.get(url_for("cards.list_changes", kind="cards"))
+        assert [c["title"] for c in res.json["changes"]] == ["Synced card"]
+        assert res.json["changes"][0]["version"] == card.version
+        assert res.json["cursor"] == card.change_cursor
+        assert not res.json["more"]
+
+        url = url_for("cards.list_changes", kind="cards", since=res.json["cursor"])
+        assert testapp.get(url).json["changes"] == []
+        res = testapp.get(url_for("cards.list_changes", kind="projects"))
+        assert [p["id"] for p in res.json["changes"]] == [project.id]
+        url = url_for("cards.list_changes", kind="cards", since="yesterday")
+        assert testapp.get(url, status=400)
+        assert testapp.get("/cards/changes/users", status=404)
+
+        user.update(group=None)
+        res = testapp.get(url_for("cards.list_changes", kind="cards"))
+        assert res.json == {"changes": [], "cursor": None, "more": False}
@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+"""Cached card form choices tests."""
+import pytest
+
+from cataloger.annotations.choices import choices
+from cataloger.annotations.forms import NewCardForm
+from cataloger.annotations.models import Sample, Tag
+
+from .factories import CardFactory, GroupFactory, SampleFactory
+
+
+@pytest.fixture
+def group(db):
+    """A group with a few samples."""
+    group = GroupFactory()
+    for label in ("mesoderm", "Cerebellum", "apical", "cortex"):
+        SampleFactory(label=label, group=group)
+    SampleFactory(label="elsewhere")
+    db.session.commit()
+    return group
+
+
+@pytest.mark.usefixtures("db")
+class TestChoices:
+    """Per group choices cache."""
+
+    def test_get(self, group):
+        """Choices of a group are sorted by label."""
+        labels = [label for _, label in choices.get(Sample, group.id)]
+        assert labels == ["Cerebellum", "apical", "cortex", "mesoderm"]
+
+    def test_cached_until_invalidated(self, group, db):
+        """Choices are read from the database once."""
+        choices.get(Sample, group.id)
+        # written without the ORM, so not invalidated on commit
+        db.session.execute(
+            Sample.__table__.insert(), {"label": "epithelium", "group_id": group.id}
+        )
+        db.session.commit()
+        assert "epithelium" not in choices.labels(Sample, group.id).values()
+        choices.invalidate(Sample, group.id)
+        assert "epithelium" in choices.labels(Sample, group.id).values()
+
+    def test_invalidated_on_inserts(self, group, db):
+        """New annotations and tags are invalidated on commit."""
+        choices.get(Sample, group.id)
+        choices.get(Tag, group.id)
+        SampleFactory(label="epithelium", group=group)
+        CardFactory(comment="#wing", group=group)
+        db.session.flush()
+        assert "epithelium" not in choices.labels(Sample, group.id).values()
+        db.session.commit()
+        assert "epithelium" in choices.labels(Sample, group.id).values()
+        assert "wing" in choices.labels(Tag, group.id).values()
+
+        other = GroupFactory()
+        choices.get(Sample, group.id)
+        SampleFactory(label="elsewhere", group=other)
+        db.session.rollback()
+        assert "elsewhere" not in choices.labels(Sample, group.id).values()
+
+    def test_invalidated_on_updates(self, group, db):
+        """Renamed, moved and deleted annotations are invalidated on commit."""
+        cortex, mesoderm = (
+            Sample.query.filter_by(label=label).first()
+            for label in ("cortex", "mesoderm")
+        )
+        choices.get(Sample, group.id)
+        cortex.label = "neocortex"
+        db.session.flush()
+        assert choices.labels(Sample, group.id)[cortex.id] == "cortex"
+        db.session.commit()
+        assert choices.labels(Sample, group.id)[cortex.id] == "neocortex"
+
+        other = GroupFactory()
+        db.session.commit()
+        choices.get(Sample, other.id)
+        mesoderm.update(group=other)
+        assert mesoderm.id not in choices.labels(Sample, group.id)
+        assert mesoderm.id in choices.labels(Sample, other.id)
+        mesoderm.delete()
+        assert mesoderm.id not in choices.labels(Sample, other.id)
+
+    def test_form_labels(self, group, app):
+        """The form selected values are labelled from the cache."""
+        cortex = Sample.query.filter_by(label="cortex").first()
+        choices.get(Sample, group.id)
+        cortex.update(label="neocortex")
+        with app.test_request_context(
+            method="POST", data={"select_sample-select": str(cortex.id)}
+        ):
+            form = NewCardForm()
+            form.update_choices(group_id=group.id)
+        assert form.select_sample.choices[0] == (cortex.id, "neocortex")
@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+"""Annotation completion tests."""
+import pytest
+from flask import url_for
+from flask_login import login_user
+
+from cataloger.annotations import views
+from cataloger.annotations.completion import TermIndex, completions
+from cataloger.annotations.models import Sample
+
+from .factories import GroupFactory, SampleFactory
+from .test_functional import log_in
+
+
+class TestTermIndex:
+    """Prefix and trigram index."""
+
+    def test_prefix(self):
+        """Labels starting with the text come first, shortest first."""
+        index = TermIndex()
+        index.add(1, "alpha-tubulin")
+        index.add(2, "Alpha-Actinin", source="local")
+        index.add(3, "alpha")
+        found = index.search("ALPHA", limit=2)
+        assert [r["id"] for r in found] == [3, 2]
+        assert found[1] == {"id": 2, "label": "Alpha-Actinin", "source": "local"}
+
+    def test_fuzzy(self):
+        """Misspelled or inner words are matched by trigrams."""
+        index = TermIndex()
+        index.add(1, "alpha-tubulin")
+        index.add(2, "myosin II")
+        index.add(3, "tubulin")
+        assert [r["id"] for r in index.search("tubuline")] == [3, 1]
+        assert [r["id"] for r in index.search("myosine")] == [2]
+
+    def test_incremental(self):
+        """Labels can be added, updated and removed."""
+        index = TermIndex()
+        index.add(1, "eGFP")
+        index.add(1, "mCherry")
+        assert not index.search("egfp")
+        assert index.search("mch")[0]["label"] == "mCherry"
+        index.discard(1)
+        assert not index.search("mch")
+        assert len(index) == 0
+
+    def test_maxsize(self):
+        """The oldest labels are dropped first."""
+        index = TermIndex(maxsize=2)
+        for i, label in enumerate(["GFP", "RFP", "YFP"]):
+            index.add(i, label)
+        assert not index.search("gfp")
+        assert len(index) == 2
+
+
+class TestCompleteEndpoint:
+    """Completions of the annotation search fields."""
+
+    @pytest.fixture
+    def samples(self, user, db):
+        """Samples of the user group, and of another group."""
+        user.group = GroupFactory()
+        samples = [
+            SampleFactory(label=label, group=user.group)
+            for label in ("wing disc", "wing")
+        ]
+        SampleFactory(label="wing elsewhere")
+        db.session.commit()
+        return samples
+
+    def complete(self, testapp, q, kind="samples"):
+        """The (label, source) completions of q."""
+        res = testapp.get(url_for("cards.complete", kind=kind, q=q))
+        return [(c["label"], c["source"]) for c in res.json["completions"]]
+
+    def test_complete(self, user, testapp, samples):
+        """The group annotations come first, then the ontology terms."""
+        term = {
+            "prefLabel": "wing vein",
+            "links": {"ontology": "http://data.bioontology.org/ontologies/FB-BT"},
+        }
+        completions.add_terms(Sample, {"FBbt_00004751": term})
+        log_in(user, testapp)
+        assert self.complete(testapp, "Wing") == [
+            ("wing", "local"),
+            ("wing disc", "local"),
+            ("wing vein", "ontology"),
+        ]
+        testapp.get(url_for("cards.complete", kind="users", q="w"), status=404)
+
+    def test_reload(self, user, testapp, samples, db, monkeypatch):
+        """Indices are reloaded once their time to live passed."""
+        log_in(user, testapp)
+        assert self.complete(testapp, "leg") == []
+        SampleFactory(label="leg disc", group=user.group)
+        db.session.commit()
+        assert self.complete(testapp, "leg") == []
+        monkeypatch.setattr(completions, "ttl", 0)
+        assert self.complete(testapp, "leg") == [("leg disc", "local")]
+
+    def test_new_annotation(self, user, testapp, samples, app):
+        """Registered terms are added to the loaded index of their group."""
+        log_in(user, testapp)
+        assert self.complete(testapp, "haltere") == []
+        term = {"prefLabel": "haltere disc", "@id": "FBbt_00001769"}
+        with app.test_request_context():
+            login_user(user)
+            views.new_annotation(Sample, term)
+        assert self.complete(testapp, "haltere") == [("haltere disc", "local")]
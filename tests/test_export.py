@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+"""Bulk card export tests."""
+import datetime as dt
+import io
+import tarfile
+import zipfile
+
+import pytest
+from flask import url_for
+
+from cataloger.annotations.export import iter_archive, iter_cards, select_cards
+
+from .factories import CardFactory, GroupFactory, UserFactory
+from .test_functional import log_in
+
+
+@pytest.fixture
+def cards(db):
+    """Cards of two groups, some tagged #mitosis."""
+    lab, other = GroupFactory(groupname="lab"), GroupFactory(groupname="other")
+    now = dt.datetime.utcnow()
+    cards = []
+    for i in range(7):
+        cards.append(
+            CardFactory(
+                title=f"Screen / plate {i}",
+                group=lab if i < 5 else other,
+                comment="#mitosis" if i % 2 else "#mitosiss",
+                created_at=now - dt.timedelta(days=i),
+            )
+        )
+    db.session.commit()
+    return cards
+
+
+def archived(**kwargs):
+    """The names in the zip archive of the selected cards."""
+    query = select_cards(**kwargs)
+    cards = iter_cards(query, batch_size=2)
+    data = b"".join(iter_archive(cards))
+    return zipfile.ZipFile(io.BytesIO(data)).namelist()
+
+
+@pytest.mark.usefixtures("db")
+class TestExport:
+    """Cards archives."""
+
+    def test_zip(self, cards):
+        """All the cards are in the archive."""
+        data = b"".join(iter_archive(iter_cards(select_cards(), batch_size=3)))
+        with zipfile.ZipFile(io.BytesIO(data)) as zf:
+            names = zf.namelist()
+            content = zf.read(names[0]).decode()
+        assert len(names) == len(cards)
+        assert names[0] == f"{cards[0].id}_Screen_plate_0.toml"
+        assert content.startswith("# omero annotation file")
+        assert 'title = "Screen / plate 0"' in content
+
+    def test_tar(self, cards):
+        """Cards can be archived as a gzipped tarball, in any format."""
+        chunks = iter_archive(iter_cards(select_cards()), archive="tar", fmt="csv")
+        data = b"".join(chunks)
+        with tarfile.open(fileobj=io.BytesIO(data), mode="r:gz") as tf:
+            members = tf.getmembers()
+            content = tf.extractfile(members[0]).read().decode()
+        assert len(members) == len(cards)
+        assert members[0].name.endswith(".csv")
+        assert content.startswith("# Screen / plate 0")
+
+    def test_chunks(self, cards):
+        """The archive is produced one card at a time."""
+        chunks = list(iter_archive(iter_cards(select_cards())))
+        assert len(chunks) == len(cards) + 1
+
+    def test_filters(self, cards):
+        """Cards are selected by group, tag and creation date."""
+        assert len(archived(group="lab")) == 5
+        assert len(archived(group="lab", tag="mitosis")) == 2
+        since = dt.datetime.utcnow() - dt.timedelta(days=2, hours=1)
+        assert len(archived(since=since)) == 3
+
+    def test_endpoint(self, cards, user, testapp, db):
+        """Archives of their group cards are served to logged in users."""
+        user.update(group=cards[0].group)
+        colleague = UserFactory(group=user.group)
+        CardFactory(user=colleague, group=user.group)
+        db.session.commit()
+        log_in(user, testapp)
+        res = testapp.get(url_for("cards.export_cards"))
+        assert res.content_type == "application/zip"
+        assert len(zipfile.ZipFile(io.BytesIO(res.body)).namelist()) == 6
+        res = testapp.get(url_for("cards.export_cards", user=colleague.username))
+        assert len(zipfile.ZipFile(io.BytesIO(res.body)).namelist()) == 1
+        # including the card of the colleague
+        res = testapp.get(url_for("cards.export_cards", group="lab", tag="mitosis"))
+        assert len(zipfile.ZipFile(io.BytesIO(res.body)).namelist()) == 3
+        testapp.get(url_for("cards.export_cards", archive="rar"), status=400)
+
+    def test_foreign_cards(self, cards, user, testapp):
+        """Other groups cards are only exported for admins."""
+        log_in(user, testapp)
+        # without a group
+        testapp.get(url_for("cards.export_cards"), status=403)
+        user.update(group=cards[0].group)
+        testapp.get(url_for("cards.export_cards", group="other"), status=403)
+        url = url_for("cards.export_cards", user=cards[-1].user.username)
+        testapp.get(url, status=403)
+
+        user.update(is_admin=True)
+        res = testapp.get(url_for("cards.export_cards", group="other"))
+        assert len(zipfile.ZipFile(io.BytesIO(res.body)).namelist()) == 2
+
+    def test_command(self, cards, app, tmp_path):
+        """Archives can be written by the export-cards command."""
+        path = tmp_path / "cards.zip"
+        runner = app.test_cli_runner()
+        result = runner.invoke(args=["export-cards", str(path), "--group", "lab"])
+        assert result.exit_code == 0, result.output
+        assert len(zipfile.ZipFile(path).namelist()) == 5
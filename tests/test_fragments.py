@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+"""Rendered cards cache tests."""
+import pytest
+from flask import url_for
+
+from cataloger.annotations.fragments import card_fragments
+
+from .factories import CardFactory, GeneModFactory
+from .test_functional import log_in
+
+
+def counts():
+    return card_fragments.hits, card_fragments.misses
+
+
+@pytest.mark.usefixtures("db")
+class TestFragments:
+    """Rendered cards."""
+
+    def test_versions(self, db):
+        """Card versions change with the card."""
+        card = CardFactory()
+        db.session.commit()
+        assert card.version == 1
+        card.update(comment="#mitosis")
+        assert card.version == 2
+        card.update(gene_mods=[GeneModFactory()])
+        assert card.version == 3
+        assert card.updated_at > card.created_at
+        card.save()
+        assert card.version == 3
+
+    def test_render(self, db):
+        """Cards are rendered again after they change."""
+        cards = [CardFactory(title=f"Card {i}") for i in range(3)]
+        db.session.commit()
+        hits, misses = counts()
+        fragments = card_fragments.render(cards)
+        assert "Card 0" in fragments[0]
+        assert counts() == (hits, misses + 3)
+
+        cards[1].update(title="Edited")
+        fragments = card_fragments.render(cards)
+        assert "Edited" in fragments[1]
+        assert counts() == (hits + 2, misses + 4)
+        assert card_fragments.render([]) == []
+
+    def test_renamed_annotations(self, db):
+        """Cards are rendered again after one of their annotations changes."""
+        card = CardFactory(gene_mods=[GeneModFactory(label="H2B-GFP")])
+        db.session.commit()
+        card_fragments.render([card])
+        card.project.update(label="Renamed project")
+        assert "Renamed project" in card_fragments.render([card])[0]
+        card.gene_mods[0].update(label="H2B-mCherry")
+        assert "H2B-mCherry" in card_fragments.render([card])[0]
+
+    def test_listing(self, user, testapp, db):
+        """The listings use the cached cards, whose stats are exposed."""
+        CardFactory(user=user, title="Cached card")
+        db.session.commit()
+        log_in(user, testapp)
+        for _ in range(2):
+            assert "Cached card" in testapp.get(url_for("user.cards"))
+        stats = testapp.get(url_for("cards.fragment_stats")).json
+        assert stats["hits"] >= 1
+        assert 0 < stats["hit_rate"] < 1
@@ -3,11 +3,14 @@
 
 See: http://webtest.readthedocs.org/
 """
+import pytest
 from flask import url_for
 
+from cataloger.extensions import passwords
+from cataloger.passwords import hash_rounds
 from cataloger.user.models import User
 
-from .factories import UserFactory
+from .factories import CardFactory, GroupFactory, SampleFactory, UserFactory
 
 
 class TestLoggingIn:
@@ -25,6 +28,14 @@ class TestLoggingIn:
         res = form.submit().follow()
         assert res.status_code == 200
 
+    def test_rehash_password(self, user, testapp, db):
+        """Passwords hashed at another cost are hashed again on login."""
+        user.password = passwords.bcrypt.generate_password_hash("myprecious", 5)
+        db.session.commit()
+        log_in(user, testapp)
+        assert hash_rounds(user.password) == passwords.rounds
+        assert user.check_password("myprecious")
+
     def test_sees_alert_on_log_out(self, user, testapp):
         """Show alert on logout."""
         res = testapp.get("/")
@@ -118,3 +129,117 @@ class TestRegistering:
         res = form.submit()
         # sees error
         assert "Username already registered" in res
+
+
+def log_in(user, testapp):
+    """Logs user in."""
+    res = testapp.get("/")
+    form = res.forms["loginForm"]
+    form["username"] = user.username
+    form["password"] = "myprecious"
+    form.submit().follow()
+
+
+class TestCardsListing:
+    """Cards listing pages."""
+
+    def test_next_pages(self, user, testapp, db):
+        """The cards are listed page by page."""
+        testapp.app.config["CARDS_PER_PAGE"] = 2
+        for _ in range(5):
+            CardFactory(user=user)
+        db.session.commit()
+        log_in(user, testapp)
+
+        res = testapp.get(url_for("user.cards"))
+        assert res.text.count('class="card shadow-sm"') == 2
+        assert "More cards" in res
+
+        titles = []
+        next_url = url_for("cards.cards_page", scope="user", format="json")
+        while next_url:
+            res = testapp.get(next_url)
+            titles.extend(card["title"] for card in res.json["cards"])
+            next_url = res.json["next"]
+        assert len(titles) == len(set(titles)) == 5
+
+    def test_invalid_cursor(self, user, testapp):
+        """Malformed cursors are a bad request."""
+        log_in(user, testapp)
+        url = url_for("cards.cards_page", scope="user", after="yesterday")
+        testapp.get(url, status=400)
+
+
+class TestAnnotationOptions:
+    """Options of the annotation selects."""
+
+    @pytest.fixture
+    def samples(self, user, db):
+        """Samples of the user group, and of another group."""
+        user.group = GroupFactory()
+        samples = [
+            SampleFactory(label=f"cell {i:02d}", group=user.group) for i in range(30)
+        ]
+        SampleFactory(label="cell elsewhere")
+        db.session.commit()
+        return samples
+
+    def test_pages(self, user, testapp, samples):
+        """The group samples are listed page by page, by label."""
+        log_in(user, testapp)
+        labels = []
+        next_url = url_for("cards.options", kind="samples", limit=12)
+        while next_url:
+            res = testapp.get(next_url)
+            labels.extend(option["label"] for option in res.json["options"])
+            next_url = res.json["next"]
+        assert labels == [sample.label for sample in samples]
+
+    def test_search(self, user, testapp, samples):
+        """Options can be filtered by label."""
+        log_in(user, testapp)
+        res = testapp.get(url_for("cards.options", kind="samples", q="Cell 1"))
+        assert [option["label"] for option in res.json["options"]] == [
+            f"cell {i}" for i in range(10, 20)
+        ]
+
+    def test_unknown_kind(self, user, testapp):
+        """Only annotations have options."""
+        log_in(user, testapp)
+        testapp.get(url_for("cards.options", kind="users"), status=404)
+
+    def test_new_card_form(self, user, testapp, samples):
+        """The card form does not embed the annotations."""
+        log_in(user, testapp)
+        res = testapp.get(url_for("cards.new_card"))
+        assert "cell 01" not in res
+        assert url_for("cards.options", kind="samples") in res
+
+
+class TestDownload:
+    """Card annotation file download."""
+
+    def test_download(self, user, testapp, db):
+        """The card is downloaded as is, and revalidated with its ETag."""
+        card = CardFactory(title="Mitosis screen")
+        db.session.commit()
+        owner_id = card.user_id
+        log_in(user, testapp)
+
+        url = url_for("cards.download_card", card_id=card.id)
+        res = testapp.get(url)
+        assert res.text.startswith("# omero annotation file")
+        assert 'title = "Mitosis screen"' in res
+        assert "Mitosis_screen.toml" in res.headers["Content-Disposition"]
+        assert res.etag
+        assert card.user_id == owner_id
+
+        testapp.get(url, headers={"If-None-Match": f'"{res.etag}"'}, status=304)
+        card.update(title="Meiosis screen")
+        res = testapp.get(url, headers={"If-None-Match": f'"{res.etag}"'})
+        assert 'title = "Meiosis screen"' in res
+
+    def test_unknown_card(self, user, testapp):
+        """Unknown cards are not found."""
+        log_in(user, testapp)
+        testapp.get(url_for("cards.download_card", card_id=1000), status=404)
@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+"""Bulk card import tests."""
+import functools
+import io
+import zipfile
+
+import pytest
+from flask import url_for
+
+from cataloger.annotations import views
+from cataloger.annotations.export import iter_archive, iter_cards, select_cards
+from cataloger.annotations.importer import (
+    CardImportError,
+    import_cards,
+    iter_records,
+    parse_csv,
+)
+from cataloger.annotations.models import Card, Gene, GeneMod, Project, Tag
+
+from .factories import CardFactory, GeneModFactory, GroupFactory
+from .test_functional import log_in
+
+
+@pytest.fixture
+def importer(user, db):
+    """A user in a group without annotations."""
+    user.group = GroupFactory(groupname="importers")
+    db.session.commit()
+    return user
+
+
+@pytest.fixture
+def archive(db):
+    """A zip archive of 3 cards with two channels."""
+    gene_mods = [
+        GeneModFactory(label="H2B-GFP", gene__label="H2B", marker__label="GFP"),
+        GeneModFactory(label="Lifeact-mCherry"),
+    ]
+    for i in range(3):
+        CardFactory(title=f"Plate {i}", gene_mods=gene_mods)
+    db.session.commit()
+    return b"".join(iter_archive(iter_cards(select_cards())))
+
+
+@pytest.mark.usefixtures("db")
+class TestImport:
+    """Cards import."""
+
+    def test_round_trip(self, archive, importer):
+        """Exported cards are imported in the user group."""
+        records = iter_records("cards.zip", io.BytesIO(archive))
+        assert import_cards(records, importer, chunk_size=2) == 3
+        imported = Card.query.filter_by(user_id=importer.id).order_by(Card.title)
+        original = Card.query.filter(Card.user_id != importer.id).order_by(Card.title)
+        for card, source in zip(imported, original):
+            assert card.group_id == importer.group_id
+            assert card.as_dict(accessed=False)["kv_pairs"] == (
+                source.as_dict(accessed=False)["kv_pairs"]
+            )
+            assert card.project.label == source.project.label
+            assert card.comment == source.comment
+        assert Tag.query.filter_by(group_id=importer.group_id).count() == 2
+
+    def test_gene_mods(self, archive, importer):
+        """Gene mods are created from their gene and marker labels."""
+        import_cards(iter_records("cards.zip", io.BytesIO(archive)), importer)
+        gene_mod = GeneMod.query.filter_by(
+            group_id=importer.group_id, label="H2B-GFP"
+        ).one()
+        assert gene_mod.gene.label == "H2B"
+        assert gene_mod.marker.label == "GFP"
+
+    def test_no_duplicates(self, archive, importer):
+        """Annotations are only created once."""
+        for _ in range(2):
+            import_cards(iter_records("cards.zip", io.BytesIO(archive)), importer)
+        group_id = importer.group_id
+        assert Card.query.filter_by(group_id=group_id).count() == 6
+        assert Project.query.filter_by(group_id=group_id).count() == 3
+        assert Gene.query.filter_by(group_id=group_id).count() == 2
+        assert GeneMod.query.filter_by(group_id=group_id).count() == 2
+
+    def test_csv(self, db):
+        """CSV cards are parsed."""
+        card = CardFactory(title="Plate", gene_mods=[GeneModFactory(label="H2B-GFP")])
+        db.session.commit()
+        (record,) = parse_csv(card.as_csv())
+        assert record["title"] == "Plate"
+        assert record["project"] == card.project.label
+        assert record["organism"] == card.organism.label
+        assert record["channels"] == ["H2B-GFP"]
+        assert "#mitosis" in record["comment"]
+
+    def test_toml_cards(self):
+        """TOML files may hold an array of cards."""
+        text = '[[cards]]\ntitle = "A"\n\n[[cards]]\ntitle = "B"\n'
+        records = list(iter_records("cards.toml", io.BytesIO(text.encode())))
+        assert [record["title"] for record in records] == ["A", "B"]
+
+    def test_errors(self):
+        """Unreadable files raise a CardImportError."""
+        with pytest.raises(CardImportError):
+            list(iter_records("cards.toml", io.BytesIO(b"title = ")))
+        with pytest.raises(CardImportError):
+            list(iter_records("cards.zip", io.BytesIO(b"not a zip")))
+        with pytest.raises(CardImportError):
+            list(iter_records("cards.pdf", io.BytesIO(b"")))
+
+    def test_partial_import(self, importer, testapp, monkeypatch):
+        """The cards imported before an error are counted."""
+        data = io.BytesIO()
+        with zipfile.ZipFile(data, "w") as zf:
+            zf.writestr(
+                "good.toml", '[[cards]]\ntitle = "A"\n\n[[cards]]\ntitle = "B"\n'
+            )
+            zf.writestr("bad.toml", "title = ")
+        records = iter_records("cards.zip", io.BytesIO(data.getvalue()))
+        with pytest.raises(CardImportError) as excinfo:
+            import_cards(records, importer, chunk_size=1)
+        assert excinfo.value.imported == 2
+
+        monkeypatch.setattr(
+            views.importer,
+            "import_cards",
+            functools.partial(import_cards, chunk_size=1),
+        )
+        log_in(importer, testapp)
+        res = testapp.post(
+            url_for("cards.import_cards"),
+            upload_files=[("files", "cards.zip", data.getvalue())],
+        ).follow()
+        assert "2 cards of cards.zip imported before" in res
+        assert "Imported 2 cards" in res
+        assert Card.query.filter_by(user_id=importer.id).count() == 4
+
+    def test_endpoint(self, archive, importer, testapp):
+        """Cards files can be uploaded."""
+        log_in(importer, testapp)
+        assert "importCardsForm" in testapp.get(url_for("cards.import_cards"))
+        res = testapp.post(
+            url_for("cards.import_cards"),
+            upload_files=[("files", "cards.zip", archive)],
+        ).follow()
+        assert "Imported 3 cards" in res
+        assert Card.query.filter_by(user_id=importer.id).count() == 3
+
+    def test_command(self, archive, importer, app, tmp_path):
+        """Cards files can be imported by the import-cards command."""
+        path = tmp_path / "cards.zip"
+        path.write_bytes(archive)
+        runner = app.test_cli_runner()
+        result = runner.invoke(args=["import-cards", importer.username, str(path)])
+        assert result.exit_code == 0, result.output
+        assert "Imported 3 cards" in result.output
+        result = runner.invoke(args=["import-cards", "nobody", str(path)])
+        assert result.exit_code != 0
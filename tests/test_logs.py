@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+"""Logging configuration tests."""
+import io
+import json
+import logging
+
+import pytest
+
+from cataloger.logs import SamplingFilter, configure_logging, stop_logging
+
+
+def record(msg="Searching for %s", level=logging.INFO, args=("GFP",)):
+    return logging.LogRecord("tests.logs", level, __file__, 1, msg, args, None)
+
+
+@pytest.fixture
+def stream(app):
+    """The output of the logs, configured again by the next app."""
+    stream = io.StringIO()
+    yield stream
+    stop_logging()
+
+
+class TestSampling:
+    """Sampled messages."""
+
+    def test_limit(self, monkeypatch):
+        """Only limit records of a message pass per interval."""
+        now = [0]
+        monkeypatch.setattr("cataloger.logs.time.monotonic", lambda: now[0])
+        sampling = SamplingFilter(limit=2, interval=60)
+        assert [sampling.filter(record()) for _ in range(4)] == [1, 1, 0, 0]
+        assert sampling.filter(record("Other message"))
+        assert sampling.filter(record(level=logging.WARNING))
+
+        now[0] = 61
+        first = record()
+        assert sampling.filter(first)
+        assert first.dropped == 2
+        assert not hasattr(record(), "dropped")
+
+    def test_bounded_windows(self, monkeypatch):
+        """Expired windows are swept, and the least recently used evicted."""
+        now = [0]
+        monkeypatch.setattr("cataloger.logs.time.monotonic", lambda: now[0])
+        sampling = SamplingFilter(limit=1, interval=60, max_windows=3)
+        for index in range(5):
+            sampling.filter(record(f"Message {index}"))
+        assert [msg for _, msg in sampling._windows] == [
+            "Message 2",
+            "Message 3",
+            "Message 4",
+        ]
+
+        assert not sampling.filter(record("Message 4"))
+        now[0] = 61
+        sampling.filter(record("Other message"))
+        assert [msg for _, msg in sampling._windows] == ["Message 4", "Other message"]
+        first = record("Message 4")
+        assert sampling.filter(first)
+        assert first.dropped == 1
+
+    def test_dropping_keeps_window(self, monkeypatch):
+        """The windows of the dropped messages are the last evicted."""
+        now = [0]
+        monkeypatch.setattr("cataloger.logs.time.monotonic", lambda: now[0])
+        sampling = SamplingFilter(limit=1, interval=60, max_windows=2)
+        assert sampling.filter(record("Hot message"))
+        assert sampling.filter(record("Message 1"))
+        assert not sampling.filter(record("Hot message"))
+        assert sampling.filter(record("Message 2"))
+        assert [msg for _, msg in sampling._windows] == ["Hot message", "Message 2"]
+        now[0] = 61
+        first = record("Hot message")
+        assert sampling.filter(first)
+        assert first.dropped == 1
+
+    def test_loggers(self):
+        """Only the records of the given loggers are sampled."""
+        sampling = SamplingFilter(limit=1, loggers=["tests"])
+        assert [sampling.filter(record()) for _ in range(2)] == [1, 0]
+        other = logging.LogRecord("other", logging.INFO, __file__, 1, "Hit", (), None)
+        assert all(sampling.filter(other) for _ in range(3))
+
+    def test_no_limit(self):
+        """All records pass without limit."""
+        sampling = SamplingFilter(limit=0)
+        assert all(sampling.filter(record()) for _ in range(100))
+
+
+class TestConfigureLogging:
+    """Logging setup."""
+
+    def test_levels(self, stream):
+        """Records are written by the listener, at the configured levels."""
+        config = {"LOG_LEVEL": "warning", "LOG_LEVELS": {"tests.logs": "debug"}}
+        configure_logging(config, stream)
+        logging.getLogger("tests.logs").debug("Searching for %s", "GFP")
+        logging.getLogger("tests.other").info("Hidden")
+        stop_logging()
+        output = stream.getvalue()
+        assert "DEBUG tests.logs: Searching for GFP" in output
+        assert "Hidden" not in output
+        logging.getLogger("tests.logs").setLevel(logging.NOTSET)
+
+    def test_json(self, stream):
+        """Records are JSON objects, with their traceback apart."""
+        configure_logging({"LOG_FORMAT": "json"}, stream)
+        try:
+            raise ValueError("Invalid")
+        except ValueError:
+            logging.getLogger("tests.logs").exception("Failed %d times", 3)
+        stop_logging()
+        entry = json.loads(stream.getvalue())
+        assert entry["level"] == "ERROR"
+        assert entry["message"] == "Failed 3 times"
+        assert "ValueError: Invalid" in entry["exception"]
+
+    def test_sampling(self, stream):
+        """Records are only sampled when LOG_SAMPLE_LIMIT is set."""
+        log = logging.getLogger("tests.logs")
+        configure_logging({}, stream)
+        for _ in range(20):
+            log.info("Saved card %d", 1)
+        stop_logging()
+        assert stream.getvalue().count("Saved card 1") == 20
+
+        configure_logging({"LOG_SAMPLE_LIMIT": 2}, stream)
+        for _ in range(20):
+            log.info("Saved card %d", 2)
+        stop_logging()
+        assert stream.getvalue().count("Saved card 2") == 2
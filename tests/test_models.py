@@ -1,12 +1,44 @@
 # -*- coding: utf-8 -*-
 """Model unit tests."""
 import datetime as dt
+from contextlib import contextmanager
 
 import pytest
+from flask import g
+from sqlalchemy import event
 
+from cataloger.annotations.models import (
+    Card,
+    GeneMod,
+    Tag,
+    _insert_ignore,
+    get_gene_mods,
+)
+from cataloger.extensions import passwords
 from cataloger.user.models import Role, User
 
-from .factories import UserFactory
+from .factories import (
+    CardFactory,
+    GeneFactory,
+    GeneModFactory,
+    MarkerFactory,
+    UserFactory,
+)
+
+
+@contextmanager
+def count_statements(db):
+    """Records the SQL statements executed in the block."""
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(db.engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(db.engine, "before_cursor_execute", before_cursor_execute)
 
 
 @pytest.mark.usefixtures("db")
@@ -51,6 +83,15 @@ class TestUser:
         assert user.check_password("foobarbaz123") is True
         assert user.check_password("barfoobaz") is False
 
+    def test_password_needs_rehash(self):
+        """Passwords hashed at another cost need hashing again."""
+        user = User.create(username="foo", email="foo@bar.com", password="foobarbaz123")
+        assert not user.password_needs_rehash
+        user.password = passwords.bcrypt.generate_password_hash("foobarbaz123", 5)
+        assert user.password_needs_rehash
+        assert user.check_password("foobarbaz123") is True
+        assert not User(username="bar").password_needs_rehash
+
     def test_full_name(self):
         """User full name."""
         user = UserFactory(first_name="Foo", last_name="Bar")
@@ -64,3 +105,145 @@ class TestUser:
         user.roles.append(role)
         user.save()
         assert role in user.roles
+
+
+@pytest.mark.usefixtures("db")
+class TestCard:
+    """Card tests."""
+
+    @staticmethod
+    def display(cards):
+        """Access everything shown on the cards."""
+        for card in cards:
+            assert card.project.label
+            assert card.organism.label
+            assert card.sample.label
+            assert card.process.label
+            assert card.method.label
+            assert [gm.label for gm in card.gene_mods]
+
+    def create_cards(self, db, count):
+        """Create cards with two channels."""
+        for _ in range(count):
+            CardFactory(gene_mods=[GeneModFactory(), GeneModFactory()])
+        db.session.commit()
+        db.session.expire_all()
+
+    def test_listing_statements_count(self, db):
+        """Listing cards takes a constant number of statements."""
+        self.create_cards(db, 2)
+        with count_statements(db) as few:
+            self.display(Card.listing())
+
+        self.create_cards(db, 10)
+        with count_statements(db) as many:
+            cards = Card.listing().all()
+            self.display(cards)
+        assert len(cards) == 12
+        assert len(many) == len(few) <= 3
+
+    def test_page(self, db):
+        """Pages go from the most recent card to the oldest, without overlap."""
+        now = dt.datetime.utcnow()
+        # two cards created at the same time
+        created = [now, now] + [now - dt.timedelta(days=i) for i in range(1, 6)]
+        for created_at in created:
+            CardFactory(created_at=created_at)
+        db.session.commit()
+
+        expected = Card.query.order_by(Card.created_at.desc(), Card.id.desc()).all()
+        listed, cursor = Card.page(Card.listing(), per_page=3)
+        assert len(listed) == 3
+        while cursor:
+            cards, cursor = Card.page(Card.listing(), after=cursor, per_page=3)
+            listed.extend(cards)
+        assert listed == expected
+
+    def test_page_invalid_cursor(self, db):
+        """Invalid cursors are rejected."""
+        with pytest.raises(ValueError):
+            Card.page(Card.listing(), after="yesterday")
+
+    def test_html_comment(self, db):
+        """Comments are rendered once, and escaped."""
+        card = CardFactory(comment="Observed Process :\n\n#mitosis <script>")
+        db.session.commit()
+        assert card.comment_html == (
+            '<h5 style="margin-top: 1rem;"> Observed Process : </h5>\n'
+            "\n<b>#mitosis</b> &lt;script&gt;"
+        )
+        card.update(comment="#meiosis")
+        assert card.html_comment == "<b>#meiosis</b>"
+        card.update(title="Unchanged comment", comment_html=None)
+        assert card.comment_html is None
+        assert card.html_comment == "<b>#meiosis</b>"
+
+    def test_tags(self, db):
+        """Cards are linked to the tags of their comment when saved."""
+        card = CardFactory(comment="#mitosis in the #embryo, again #mitosis #")
+        db.session.commit()
+        assert card.tags == ["embryo,", "mitosis"]
+        other = CardFactory(group=card.group, comment="#mitosis")
+        db.session.commit()
+        assert other.hashtags[0] is card.hashtags[1]
+
+        card.update(comment="#meiosis")
+        assert card.tags == ["meiosis"]
+        third = CardFactory(group=card.group, comment="#mitosis")
+        db.session.commit()
+        assert Tag.counts(card.group_id) == [("mitosis", 2), ("meiosis", 1)]
+        tagged = Card.query.filter(Card.hashtags.any(label="mitosis")).all()
+        assert tagged == [other, third]
+
+
+@pytest.mark.usefixtures("db")
+class TestGeneMods:
+    """Gene mods lookup and creation."""
+
+    @pytest.fixture
+    def pairs(self, db):
+        genes = [GeneFactory() for _ in range(8)]
+        markers = [MarkerFactory() for _ in range(8)]
+        db.session.commit()
+        return [(str(gene.id), marker.id) for gene, marker in zip(genes, markers)]
+
+    def test_create(self, pairs):
+        """Missing gene mods are created once."""
+        gene_mods = get_gene_mods(pairs)
+        gene = gene_mods[0].gene
+        assert gene_mods[0].label == f"{gene.label}-{gene_mods[0].marker.label}"
+        g.pop("gene_mods")
+        assert get_gene_mods(pairs) == gene_mods
+        assert GeneMod.query.count() == len(pairs)
+
+    def test_statements(self, db, pairs):
+        """Gene mods are created in a constant number of statements."""
+        with count_statements(db) as few:
+            get_gene_mods(pairs[:1])
+        with count_statements(db) as many:
+            get_gene_mods(pairs[1:])
+        assert len(many) == len(few)
+        with count_statements(db) as memoized:
+            get_gene_mods(pairs)
+        assert not memoized
+
+    def test_half_pairs(self, pairs):
+        """Gene mods may have a gene or a marker only."""
+        gene_id, marker_id = pairs[0]
+        gene_mod, marker_mod, none = get_gene_mods(
+            [(gene_id, "None"), (0, marker_id), (None, None)]
+        )
+        assert gene_mod.marker is None
+        assert marker_mod.gene is None
+        assert none is None
+        g.pop("gene_mods")
+        assert get_gene_mods([(gene_id, 9999)]) == [gene_mod]
+        assert GeneMod.query.count() == 2
+
+    def test_concurrent_insert(self, db, pairs):
+        """Gene mods inserted concurrently are skipped."""
+        (gene_mod,) = get_gene_mods(pairs[:1])
+        row = {"label": "copy", "gene_id": gene_mod.gene_id}
+        row["marker_id"] = gene_mod.marker_id
+        db.session.execute(_insert_ignore(GeneMod.__table__), [row])
+        assert GeneMod.query.count() == 1
@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+"""OMERO login tests."""
+import threading
+
+import pytest
+from flask import Flask
+
+from cataloger.auth import AuthBackend
+from cataloger.omero_login import AuthenticationResponseStatus, OmeroLoginManager
+
+
+class FakeClient:
+    """An omero client accepting a single password."""
+
+    instances = []
+
+    def __init__(self, host, port, password="secret", block=None):
+        self.password = password
+        self.block = block
+        self.closed = False
+        FakeClient.instances.append(self)
+
+    def createSession(self, username, password):  # noqa: N802
+        if self.block is not None:
+            self.block.wait()
+        if password != self.password:
+            raise PermissionError("Password check failed")
+
+    def closeSession(self):  # noqa: N802
+        self.closed = True
+
+
+class FakeObject:
+    def __init__(self, name):
+        self.name = name
+
+    def getName(self):  # noqa: N802
+        return self.name
+
+    def getFullName(self):  # noqa: N802
+        return f"Full {self.name}"
+
+
+class FakeGateway:
+    """A connection to the omero server of a fake client."""
+
+    def __init__(self, client_obj):
+        self.client = client_obj
+
+    def isConnected(self):  # noqa: N802
+        return True
+
+    def close(self):
+        pass
+
+    def getUser(self):  # noqa: N802
+        return FakeObject("jdoe")
+
+    def getGroupFromContext(self):  # noqa: N802
+        return FakeObject("lab")
+
+    def getGroupsMemberOf(self):  # noqa: N802
+        return [FakeObject("lab"), FakeObject("public")]
+
+
+def make_manager(**config):
+    FakeClient.instances = []
+    client_factory = config.pop("client_factory", FakeClient)
+    manager = OmeroLoginManager(
+        client_factory=client_factory, gateway_factory=FakeGateway
+    )
+    manager.init_config(config)
+    return manager
+
+
+class TestOmeroLogin:
+    """Authentication against a fake omero server."""
+
+    def test_authenticate(self):
+        """User info is found, and sessions are closed."""
+        manager = make_manager()
+        result = manager.authenticate("jdoe", "secret")
+        assert result.status == AuthenticationResponseStatus.success
+        assert result.user_info == {
+            "username": "jdoe",
+            "fullname": "Full jdoe",
+            "groupname": "lab",
+            "groups": ["lab", "public"],
+        }
+        result = manager.authenticate("jdoe", "wrong")
+        assert result.status == AuthenticationResponseStatus.fail
+        assert len(FakeClient.instances) == 2
+        assert all(client.closed for client in FakeClient.instances)
+        manager.close()
+
+    def test_user_info_cache(self):
+        """Successful logins are remembered, with their password."""
+        manager = make_manager()
+        for _ in range(3):
+            result = manager.authenticate("jdoe", "secret")
+            assert result.status == AuthenticationResponseStatus.success
+        assert len(FakeClient.instances) == 1
+        result = manager.authenticate("jdoe", "wrong")
+        assert result.status == AuthenticationResponseStatus.fail
+        assert len(FakeClient.instances) == 2
+
+        manager.config["OMERO_USER_INFO_TIMEOUT"] = -1
+        manager.authenticate("other", "secret")
+        manager.authenticate("other", "secret")
+        assert len(FakeClient.instances) == 4
+        manager.close()
+
+    def test_timeout(self):
+        """Logins fail once the server took too long."""
+        block = threading.Event()
+        manager = make_manager(
+            OMERO_AUTH_TIMEOUT=0.1,
+            client_factory=lambda host, port: FakeClient(host, port, block=block),
+        )
+        try:
+            result = manager.authenticate("jdoe", "secret")
+            assert result.status == AuthenticationResponseStatus.fail
+        finally:
+            block.set()
+            manager.close()
+
+    def test_unexpected_error(self):
+        """Errors other than failed logins are raised."""
+
+        def client_factory(host, port):
+            raise ValueError("Invalid port")
+
+        manager = make_manager(client_factory=client_factory)
+        with pytest.raises(ValueError):
+            manager.authenticate("jdoe", "secret")
+        manager.close()
+
+    def test_auth_backend(self):
+        """The OMERO backend is created for its AUTH_METHOD."""
+        backend = AuthBackend()
+        save_user = backend.save_user("OMERO")(lambda user_info: user_info)
+        app = Flask(__name__)
+        app.config["AUTH_METHOD"] = "OMERO"
+        backend.init_app(app)
+        assert isinstance(backend.manager, OmeroLoginManager)
+        assert backend.manager._save_user is save_user
+        backend.manager.client_factory = FakeClient
+        backend.manager.gateway_factory = FakeGateway
+        assert backend.authenticate("jdoe", "secret")
+        assert not backend.authenticate("jdoe", "wrong")
+        backend.manager.close()
+
+        app.config["AUTH_METHOD"] = "LOCAL"
+        backend.init_app(app)
+        assert backend.manager is None
+        assert not backend.authenticate("jdoe", "secret")
@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+"""Local ontology terms index tests."""
+import pytest
+
+from cataloger.annotations import views
+from cataloger.annotations.models import Process
+from cataloger.annotations.terms import (
+    ingest,
+    ingested,
+    parse_obo,
+    parse_owl,
+    search_terms,
+)
+
+OBO = """format-version: 1.2
+
+[Term]
+id: GO:0000001
+name: mitochondrion inheritance
+def: "The distribution of \\"mitochondria\\" into daughter cells." [GOC:mcc]
+synonym: "mitochondrial inheritance" EXACT []
+
+[Term]
+id: GO:0000002
+name: mitochondrial genome maintenance
+is_obsolete: true
+
+[Typedef]
+id: part_of
+name: part of
+"""
+
+OWL = """<?xml version="1.0"?>
+<rdf:RDF xmlns:rdf="http://www.w3.org/1999/02/22-rdf-syntax-ns#"
+         xmlns:rdfs="http://www.w3.org/2000/01/rdf-schema#"
+         xmlns:owl="http://www.w3.org/2002/07/owl#"
+         xmlns:obo="http://purl.obolibrary.org/obo/"
+         xmlns:oboInOwl="http://www.geneontology.org/formats/oboInOwl#">
+  <owl:Class rdf:about="http://purl.obolibrary.org/obo/FBbi_00000246">
+    <rdfs:label>confocal microscopy</rdfs:label>
+    <obo:IAO_0000115>Microscopy with a pinhole.</obo:IAO_0000115>
+    <oboInOwl:hasExactSynonym>CLSM</oboInOwl:hasExactSynonym>
+  </owl:Class>
+</rdf:RDF>
+"""
+
+CSV = """Class ID,Preferred Label,Synonyms,Definitions,Obsolete
+http://purl.obolibrary.org/obo/FBbt_00000126,mesoderm,mesoblast,Middle layer,false
+"""
+
+
+@pytest.fixture
+def obo_file(tmp_path):
+    """An OBO ontology file."""
+    path = tmp_path / "go.obo"
+    path.write_text(OBO)
+    return str(path)
+
+
+class TestParsers:
+    """Ontology files parsing."""
+
+    def test_obo(self, obo_file):
+        """Terms are read from OBO files."""
+        terms = list(parse_obo(obo_file))
+        assert len(terms) == 2
+        assert terms[0]["id"] == "http://purl.obolibrary.org/obo/GO_0000001"
+        assert terms[0]["label"] == "mitochondrion inheritance"
+        assert terms[0]["definition"].startswith('The distribution of "mito')
+        assert terms[0]["synonyms"] == ["mitochondrial inheritance"]
+        assert terms[1]["obsolete"]
+
+    def test_owl(self, tmp_path):
+        """Classes are read from OWL files."""
+        path = tmp_path / "fbbi.owl"
+        path.write_text(OWL)
+        (term,) = parse_owl(str(path))
+        assert term["label"] == "confocal microscopy"
+        assert term["definition"] == "Microscopy with a pinhole."
+        assert term["synonyms"] == ["CLSM"]
+
+
+@pytest.mark.usefixtures("db")
+class TestIndex:
+    """Local ontology search."""
+
+    def test_search(self, obo_file):
+        """Terms are found by prefix of any of their names."""
+        assert ingest("GO", obo_file) == 2
+        found = search_terms("Mitochondrial", ["GO", "MESH"])
+        (term,) = found.values()
+        assert term["prefLabel"] == "mitochondrion inheritance"
+        assert term["links"]["ontology"].endswith("/GO")
+        assert search_terms("mitochondri", ["GO"])
+        assert not search_terms("mitochondri", ["MESH"])
+        assert not search_terms("inheritance", ["GO"])
+        assert ingested(["GO", "MESH"]) == {"GO"}
+
+    def test_bioportal_fallback(self, app, obo_file, monkeypatch):
+        """The ontologies missing from the index are searched in bioportal."""
+        ingest("GO", obo_file)
+        searched = []
+
+        def search_bioportal(search_text, ontologies):
+            searched.append(ontologies)
+            term = {
+                "@id": "MESH/D008928",
+                "prefLabel": "Mitochondria",
+                "links": {"ontology": "http://data.bioontology.org/ontologies/MESH"},
+            }
+            return {term["@id"]: term}
+
+        monkeypatch.setattr(views, "search_bioportal", search_bioportal)
+        with app.test_request_context():
+            suggestions, _ = views.annotation_choices(Process, "mitochondri")
+        assert searched == ["MESH,NCIT"]
+        assert list(suggestions) == [
+            "http://purl.obolibrary.org/obo/GO_0000001",
+            "MESH/D008928",
+        ]
+
+    def test_ingest_csv_replaces_terms(self, tmp_path):
+        """Loading an ontology again replaces its terms."""
+        path = tmp_path / "fb-bt.csv"
+        path.write_text(CSV)
+        ingest("FB-BT", str(path))
+        assert ingest("FB-BT", str(path)) == 2
+        assert len(search_terms("meso", ["FB-BT"])) == 1
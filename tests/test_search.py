@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+"""Card search tests."""
+import pytest
+from flask import url_for
+
+from cataloger.annotations.search import reindex, search_cards
+
+from .factories import CardFactory, GeneModFactory, GroupFactory, ProjectFactory
+from .test_functional import log_in
+
+
+@pytest.fixture
+def cards(db):
+    """Cards of a group, about mitosis or meiosis."""
+    group = GroupFactory()
+    project = ProjectFactory(label="Zebrafish screen")
+    gene_mod = GeneModFactory(label="H2B-GFP")
+    cards = [
+        CardFactory(title="Mitosis timelapse", group=group, comment="#embryo"),
+        CardFactory(title="Embryo", group=group, comment="#mitosis at 28°C"),
+        CardFactory(
+            title="Meiosis",
+            group=group,
+            comment="",
+            project=project,
+            gene_mods=[gene_mod],
+        ),
+        CardFactory(title="Mitosis elsewhere", comment=""),
+    ]
+    db.session.commit()
+    return cards
+
+
+def titles(text, group_id=None):
+    found, _ = search_cards(text, group_id=group_id, all_groups=group_id is None)
+    return [card.title for card in found]
+
+
+@pytest.mark.usefixtures("db")
+class TestSearch:
+    """Full text search."""
+
+    def test_ranking(self, cards):
+        """Cards are found by title and comment, the titles first."""
+        group_id = cards[0].group_id
+        assert titles("mitosis", group_id=group_id) == ["Mitosis timelapse", "Embryo"]
+        assert len(titles("mitosis")) == 3
+        with pytest.raises(ValueError):
+            search_cards("mitosis", group_id=None)
+
+    def test_words(self, cards):
+        """All the words must match, as word prefixes."""
+        assert titles("mito embr") == ["Mitosis timelapse", "Embryo"]
+        assert titles("28") == ["Embryo"]
+        assert titles("") == []
+        assert titles('"*') == []
+
+    def test_annotations(self, cards):
+        """Annotation and channel labels are indexed."""
+        assert titles("zebrafish") == ["Meiosis"]
+        assert titles("gfp") == ["Meiosis"]
+
+    def test_updates(self, db, cards):
+        """The index follows the cards changes."""
+        cards[2].update(title="Meiosis in zebrafish", comment="#oocyte")
+        assert titles("oocyte") == ["Meiosis in zebrafish"]
+        cards[2].update(gene_mods=[])
+        assert titles("gfp") == []
+        cards[2].delete()
+        assert titles("oocyte") == []
+
+    def test_pages(self, db, cards):
+        """Results are paginated."""
+        first, more = search_cards("mitosis", per_page=2, all_groups=True)
+        last, end = search_cards("mitosis", page=2, per_page=2, all_groups=True)
+        assert more and not end
+        assert len(first) == 2 and len(last) == 1
+        assert not set(first) & set(last)
+
+    def test_reindex(self, db, cards):
+        """The index can be rebuilt."""
+        db.session.execute(db.text("DELETE FROM card_search"))
+        assert titles("mitosis") == []
+        assert reindex(batch_size=3) == 4
+        assert len(titles("mitosis")) == 3
+
+    def test_endpoint(self, cards, user, testapp):
+        """Users search the cards of their group."""
+        log_in(user, testapp)
+        # without a group
+        res = testapp.get(url_for("cards.search_cards", q="mitosis"))
+        assert "Mitosis" not in res
+        user.update(group=cards[0].group)
+        res = testapp.get(url_for("cards.search_cards", q="mitosis"))
+        assert "Mitosis timelapse" in res
+        assert "Mitosis elsewhere" not in res
+        res = testapp.get(url_for("cards.search_cards", q="mitosis", partial=1))
+        assert "<html" not in res
+        testapp.get(url_for("cards.search_cards", q="mitosis", page=0), status=400)
@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+"""Users cache tests."""
+import pytest
+from flask import url_for
+from sqlalchemy import event
+
+from cataloger.database import db as _db
+from cataloger.public.views import load_user
+from cataloger.user.cache import CachedUser, user_cache
+
+from .factories import GroupFactory, UserFactory
+from .test_functional import log_in
+
+
+def count_queries(func):
+    statements = []
+
+    def count(*args):
+        statements.append(args)
+
+    event.listen(_db.engine, "before_cursor_execute", count)
+    try:
+        result = func()
+    finally:
+        event.remove(_db.engine, "before_cursor_execute", count)
+    return result, len(statements)
+
+
+@pytest.mark.usefixtures("db")
+class TestUserCache:
+    """Cached users."""
+
+    def test_load_user(self, db):
+        """Users are loaded from the cache after the first time."""
+        user = UserFactory(group=GroupFactory(groupname="lab"))
+        db.session.commit()
+        user_id = str(user.id)
+        cached, count = count_queries(lambda: load_user(user_id))
+        assert isinstance(cached, CachedUser)
+        assert (cached.username, cached.groupname) == (user.username, "lab")
+        assert cached.get_id() == user_id
+        assert count == 1
+        cached, count = count_queries(lambda: load_user(user_id))
+        assert cached.group_id == user.group_id
+        assert count == 0
+        assert load_user("12345") is None
+
+    def test_invalidate(self, db):
+        """Entries are deleted once their user changes."""
+        user = UserFactory()
+        db.session.commit()
+        assert load_user(str(user.id)).groupname is None
+        user.update(group=GroupFactory(groupname="lab"))
+        assert load_user(str(user.id)).groupname == "lab"
+
+        # along with users that are not cached
+        other = UserFactory()
+        db.session.commit()
+        assert load_user(str(other.id)).groupname is None
+        user_cache.invalidate(user.id)
+        user.update(commit=False, first_name="Uncached")
+        other.update(group=user.group)
+        assert load_user(str(other.id)).groupname == "lab"
+
+    def test_edit_user(self, user, testapp, db):
+        """Editing the logged in user refreshes its entry."""
+        user.update(group=GroupFactory())
+        other = GroupFactory(groupname="other")
+        db.session.commit()
+        log_in(user, testapp)
+        res = testapp.get(url_for("user.edit_user", username="me"))
+        form = res.forms["registerForm"]
+        form["firstname"] = "Jane"
+        form["lastname"] = "Doe"
+        form["select_group"] = str(other.id)
+        form.submit()
+        assert load_user(str(user.id)).groupname == "other"